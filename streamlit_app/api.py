@@ -0,0 +1,334 @@
+"""
+Headless HTTP API over the query layer, for internal tools.
+
+Serves the same data as the dashboard pages, through the same connection pool
+and caches as queries.py:
+
+    GET /funds                                  symbols with their first and last price dates
+    GET /funds/<symbol>/profile
+    GET /funds/<symbol>/holdings
+    GET /funds/<symbol>/sectors
+    GET /funds/<symbol>/prices?start=2020-01-01&end=2020-12-31&resolution=monthly&fields=close,volume&format=arrow
+    GET /export?symbols=SPY,QQQ&start=2020-01-01&end=2020-12-31&projection=ohlcv&format=parquet
+
+Every endpoint accepts `fields` (comma separated column names) and
+`fund_type` (etf, the default, or mutual_fund). The prices endpoint also
+accepts a date range, a resolution (daily, weekly, monthly or quarterly
+bars: OHLCV for ETFs, NAV per share for mutual funds), and `format=arrow` to
+stream the series as Arrow IPC record batches instead of JSON. Only the
+requested price fields are read from the database. Exports are streamed as
+they are written, `symbols` can be left out to export every fund.
+
+    python api.py --port 8502
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import re
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from export import EXPORT_FORMATS, write_export
+from queries import (
+    build_fund_prices_query,
+    connect_to_db,
+    get_etf_sectors,
+    get_etf_top_10_holdings,
+    get_fund_prices,
+    get_fund_profile,
+    get_min_max_dates_by_fund,
+    plan_query,
+    FACT_PROJECTIONS,
+    FACT_TABLES,
+    RESOLUTION_PERIODS,
+)
+
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_BATCH_ROWS = 65536
+
+FUND_ROUTE = re.compile(r"^/funds/(?P<symbol>[^/]+)/(?P<resource>[a-z]+)$")
+FUND_RESOURCES = {
+    "profile": get_fund_profile,
+    "holdings": get_etf_top_10_holdings,
+    "sectors": get_etf_sectors,
+}
+# The projection of FACT_PROJECTIONS served by the prices endpoint
+PRICE_PROJECTIONS = {"etf": "ohlcv", "mutual_fund": "nav"}
+
+
+class BadRequest(Exception):
+    """Raised when the query string of a request is invalid."""
+
+
+def select_fields(df: pd.DataFrame, fields: str) -> pd.DataFrame:
+    """Keep only the requested columns of a result.
+
+    Args:
+        df: The query result.
+        fields: Comma separated column names, or None for all columns.
+
+    Returns:
+        The projected DataFrame.
+    """
+    if not fields:
+        return df
+    columns = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [c for c in columns if c not in df.columns]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return df[columns]
+
+
+def parse_fund_type(value: str) -> str:
+    fund_type = value or "etf"
+    if fund_type not in FACT_TABLES:
+        raise BadRequest(f"Unknown fund_type '{fund_type}'")
+    return fund_type
+
+
+def parse_date(value: str):
+    if value is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+def parse_price_fields(fields: str, fund_type: str) -> list:
+    """Resolve the requested fields of the prices endpoint.
+
+    Args:
+        fields: Comma separated column names, or None for every price column.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        The column names, price_date included when requested.
+    """
+    available = FACT_PROJECTIONS[fund_type][PRICE_PROJECTIONS[fund_type]]
+    if not fields:
+        return list(available)
+    columns = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return columns
+
+
+def get_price_series(
+    con,
+    symbol: str,
+    columns,
+    start_date=None,
+    end_date=None,
+    resolution="daily",
+    fund_type="etf",
+) -> pd.DataFrame:
+    """Get the price series of a fund over a date range.
+
+    Args:
+        con: The database connection object.
+        symbol: The fund symbol.
+        columns: The column names, from parse_price_fields. Only these are
+            read from the database.
+        start_date: First day included, None for no lower bound.
+        end_date: Last day included, None for no upper bound.
+        resolution: A key of RESOLUTION_PERIODS. Longer periods are read from
+            the monthly rollup when it is up to date.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        A DataFrame with the columns, one row per day or period.
+    """
+    if resolution not in RESOLUTION_PERIODS:
+        raise BadRequest(f"Unknown resolution '{resolution}'")
+    df_prices = get_fund_prices(
+        con, [symbol], columns, start_date, end_date, resolution, fund_type
+    )
+    return df_prices[columns]
+
+
+def open_price_stream(
+    con,
+    symbol: str,
+    columns,
+    start_date=None,
+    end_date=None,
+    resolution="daily",
+    fund_type="etf",
+):
+    """Open the price series of a fund as a stream of Arrow record batches.
+
+    Same arguments as get_price_series. The rows are fetched from DuckDB
+    batch by batch while they are sent, like exports, not cached.
+
+    Returns:
+        A pyarrow.RecordBatchReader.
+    """
+    if resolution not in RESOLUTION_PERIODS:
+        raise BadRequest(f"Unknown resolution '{resolution}'")
+    value_columns = [c for c in columns if c != "price_date"]
+    plan = plan_query(con, value_columns, resolution, fund_type)
+    prices_query = build_fund_prices_query(plan, value_columns, 1, resolution)
+    query = f"""
+              SELECT {", ".join(columns)}
+              FROM ({prices_query})
+              ORDER BY price_date
+          """
+    params = [symbol, start_date, start_date, end_date, end_date]
+    return con.execute(query, params).fetch_record_batch(ARROW_BATCH_ROWS)
+
+
+class FundsAPIHandler(BaseHTTPRequestHandler):
+    server_version = "USFundsAPI/0.1"
+    response_started = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        con = connect_to_db()
+        try:
+            self.route(con, url.path.rstrip("/"), params)
+        except BadRequest as e:
+            self.send_json({"error": str(e)}, HTTPStatus.BAD_REQUEST)
+        except Exception:
+            logging.exception("Failed to serve %s", self.path)
+            if self.response_started:
+                # Part of the body is sent, the client sees a truncated stream
+                self.close_connection = True
+            else:
+                self.send_json(
+                    {"error": "Internal server error"},
+                    HTTPStatus.INTERNAL_SERVER_ERROR,
+                )
+        finally:
+            con.close()
+
+    def end_headers(self) -> None:
+        self.response_started = True
+        super().end_headers()
+
+    def route(self, con, path: str, params: dict) -> None:
+        fund_type = parse_fund_type(params.get("fund_type"))
+        if path == "/export":
+            return self.send_export(con, params, fund_type)
+        if path == "/funds":
+            df = get_min_max_dates_by_fund(con, fund_type)
+            return self.send_dataframe(select_fields(df, params.get("fields")))
+
+        match = FUND_ROUTE.match(path)
+        if match is None:
+            return self.send_json({"error": "Not found"}, HTTPStatus.NOT_FOUND)
+        symbol, resource = match.group("symbol").upper(), match.group("resource")
+        if resource != "prices" and resource not in FUND_RESOURCES:
+            return self.send_json({"error": "Not found"}, HTTPStatus.NOT_FOUND)
+        if get_fund_profile(con, symbol, fund_type).empty:
+            return self.send_json(
+                {"error": f"Unknown {fund_type} '{symbol}'"}, HTTPStatus.NOT_FOUND
+            )
+
+        if resource == "prices":
+            columns = parse_price_fields(params.get("fields"), fund_type)
+            args = (
+                con,
+                symbol,
+                columns,
+                parse_date(params.get("start")),
+                parse_date(params.get("end")),
+                params.get("resolution", "daily"),
+                fund_type,
+            )
+            if params.get("format") == "arrow":
+                return self.send_arrow(open_price_stream(*args))
+            return self.send_dataframe(get_price_series(*args))
+
+        df = FUND_RESOURCES[resource](con, symbol, fund_type)
+        return self.send_dataframe(select_fields(df, params.get("fields")))
+
+    def send_json(self, payload, status=HTTPStatus.OK) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_dataframe(self, df: pd.DataFrame) -> None:
+        body = df.to_json(orient="records", date_format="iso").encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_arrow(self, reader) -> None:
+        # pyarrow ships with streamlit, only this endpoint needs it
+        import pyarrow as pa
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", ARROW_STREAM_CONTENT_TYPE)
+        # No Content-Length: batches are written as they are produced
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        with pa.ipc.new_stream(self.wfile, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+
+    def send_export(self, con, params: dict, fund_type: str = "etf") -> None:
+        fmt = params.get("format", "parquet")
+        projection = params.get("projection", "ohlcv")
+        if fmt not in EXPORT_FORMATS:
+            raise BadRequest(f"Unknown format '{fmt}'")
+        if projection not in FACT_PROJECTIONS[fund_type]:
+            raise BadRequest(f"Unknown {fund_type} projection '{projection}'")
+        symbols = params.get("symbols")
+        if symbols is not None:
+            symbols = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+            if not symbols:
+                raise BadRequest(
+                    "No symbols given, leave out symbols to export every fund"
+                )
+        start_date = parse_date(params.get("start")) or datetime.date.min
+        end_date = parse_date(params.get("end")) or datetime.date.max
+
+        mime, extension = EXPORT_FORMATS[fmt]
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", mime)
+        self.send_header(
+            "Content-Disposition",
+            f'attachment; filename="us_funds_{projection}.{extension}"',
+        )
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        write_export(
+            con,
+            self.wfile,
+            symbols,
+            start_date,
+            end_date,
+            fmt,
+            projection,
+            fund_type,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), FundsAPIHandler)
+    print(f"Serving the funds API on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
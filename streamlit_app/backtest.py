@@ -0,0 +1,296 @@
+"""
+Backtests of weighted fund baskets with periodic rebalancing.
+
+A basket maps fund symbols (ETFs and mutual funds can be mixed) to target
+weights. The basket is bought at its target weights, its holdings drift with
+prices, and they are reset to the targets on the last trading day of every
+rebalancing period. The equity curve, drawdowns and turnover are computed in
+NumPy over the cached aligned return matrices of returns.py, for a whole
+batch of baskets at once when they hold the same funds:
+
+    python backtest.py baskets.csv --start 2016-01-01 --end 2020-12-31 --rebalance quarterly
+
+The batch file has one row per basket and fund, with the columns basket,
+fund_symbol and weight. One line of statistics per basket is printed, or
+written to --output as CSV.
+"""
+
+import argparse
+import datetime
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from queries import connect_to_db
+from returns import AlignedReturns, get_aligned_returns
+
+REBALANCE_FREQUENCIES = ["none", "weekly", "monthly", "quarterly", "yearly"]
+TRADING_DAYS_PER_YEAR = 252
+
+
+class BacktestResult(NamedTuple):
+    """Daily series of a basket backtest, starting from a value of 1.
+
+    `turnover` is the one-way turnover traded on each day, non-zero only on
+    rebalancing days.
+    """
+
+    dates: np.ndarray
+    equity: np.ndarray
+    drawdown: np.ndarray
+    turnover: np.ndarray
+    stats: dict
+
+
+def normalize_weights(weights: dict) -> dict:
+    """Scale the target weights of a basket so they sum to 1.
+
+    Args:
+        weights: Mapping of fund symbol to weight, in any unit.
+
+    Returns:
+        The normalized weights, without the funds weighted 0.
+    """
+    weights = {s: float(w) for s, w in weights.items() if w}
+    if any(w < 0 for w in weights.values()):
+        raise ValueError("Basket weights must not be negative.")
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("A basket needs at least one fund with a positive weight.")
+    return {s: w / total for s, w in weights.items()}
+
+
+def rebalance_periods(dates: np.ndarray, rebalance: str) -> np.ndarray:
+    """Number the rebalancing period each date falls in.
+
+    Args:
+        dates: Sorted datetime64[D] dates.
+        rebalance: One of REBALANCE_FREQUENCIES.
+
+    Returns:
+        An integer array, non-decreasing along the dates.
+    """
+    if rebalance == "none":
+        return np.zeros(len(dates), dtype=np.int64)
+    if rebalance == "weekly":
+        # Day 0 is a Thursday, shift so that weeks start on Mondays
+        return (dates.astype(np.int64) + 3) // 7
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    if rebalance == "monthly":
+        return months
+    if rebalance == "quarterly":
+        return months // 3
+    if rebalance == "yearly":
+        return months // 12
+    raise ValueError(f"Unknown rebalancing frequency '{rebalance}'.")
+
+
+def simulate(returns: np.ndarray, weights: np.ndarray, periods: np.ndarray):
+    """Simulate baskets holding the same funds under one rebalancing schedule.
+
+    Within a period every fund grows by its cumulated return since the last
+    rebalance, so a basket's value is a weighted sum of those growths. The
+    period growths are then chained from one period to the next.
+
+    Args:
+        returns: Daily returns, one row per day and one column per fund, without NaN.
+        weights: Target weights, one row per basket and one column per fund.
+        periods: Rebalancing period of each day, from `rebalance_periods`.
+
+    Returns:
+        The equity and turnover, one row per day and one column per basket.
+    """
+    n_days = len(returns)
+    new_period = np.ones(n_days, dtype=bool)
+    new_period[1:] = periods[1:] != periods[:-1]
+    starts = np.flatnonzero(new_period)
+    ends = np.append(starts[1:] - 1, n_days - 1)
+    period_of_day = np.cumsum(new_period) - 1
+
+    log_growth = np.cumsum(np.log1p(returns), axis=0)
+    # Cumulated log growth at the close before each period starts
+    log_growth_at_rebalance = np.vstack([np.zeros(returns.shape[1]), log_growth])[
+        starts
+    ]
+    fund_growth = np.exp(log_growth - log_growth_at_rebalance[period_of_day])
+    basket_growth = fund_growth @ weights.T
+
+    period_growth = basket_growth[ends]
+    value_at_rebalance = np.vstack(
+        [np.ones(weights.shape[0]), np.cumprod(period_growth, axis=0)[:-1]]
+    )
+    equity = value_at_rebalance[period_of_day] * basket_growth
+
+    # Weights drifted by the end of each period, traded back to the targets
+    drifted = (
+        fund_growth[ends[:-1], None, :]
+        * weights[None, :, :]
+        / basket_growth[ends[:-1], :, None]
+    )
+    turnover = np.zeros_like(equity)
+    turnover[ends[:-1]] = 0.5 * np.abs(weights[None, :, :] - drifted).sum(axis=2)
+    return equity, turnover
+
+
+def get_drawdown(equity: np.ndarray) -> np.ndarray:
+    """Relative distance of each value below the running peak, starting from 1."""
+    peak = np.maximum(np.maximum.accumulate(equity, axis=0), 1.0)
+    return equity / peak - 1.0
+
+
+def get_stats(
+    equity: np.ndarray, drawdown: np.ndarray, turnover: np.ndarray, rebalances: int
+) -> dict:
+    """Summary statistics of one basket's daily series."""
+    years = len(equity) / TRADING_DAYS_PER_YEAR
+    daily_returns = np.diff(equity, prepend=1.0) / np.append(1.0, equity[:-1])
+    volatility = daily_returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR)
+    return {
+        "total_return": equity[-1] - 1.0,
+        "annual_return": equity[-1] ** (1.0 / years) - 1.0,
+        "annual_volatility": volatility,
+        "sharpe_ratio": (
+            daily_returns.mean() * TRADING_DAYS_PER_YEAR / volatility
+            if volatility > 0
+            else np.nan
+        ),
+        "max_drawdown": drawdown.min(),
+        "rebalances": rebalances,
+        "annual_turnover": turnover.sum() / years,
+    }
+
+
+def backtest_aligned(
+    aligned: AlignedReturns, baskets: list, rebalance: str = "monthly"
+) -> list:
+    """Backtest baskets holding the same funds over an aligned return matrix.
+
+    Args:
+        aligned: Returns of (at least) the funds of the baskets, over the backtest range.
+        baskets: Normalized weights of each basket, all with the same funds.
+        rebalance: One of REBALANCE_FREQUENCIES.
+
+    Returns:
+        One BacktestResult per basket, empty series if the funds have no common history.
+    """
+    symbols = tuple(sorted(baskets[0]))
+    aligned = aligned.select(symbols)
+    weights = np.array([[basket[s] for s in symbols] for basket in baskets])
+    if len(aligned.dates) == 0:
+        empty = np.empty(0)
+        return [BacktestResult(aligned.dates, empty, empty, empty, {}) for _ in baskets]
+
+    periods = rebalance_periods(aligned.dates, rebalance)
+    equity, turnover = simulate(aligned.returns, weights, periods)
+    drawdown = get_drawdown(equity)
+    rebalances = int(np.count_nonzero(np.diff(periods)))
+    return [
+        BacktestResult(
+            aligned.dates,
+            equity[:, b],
+            drawdown[:, b],
+            turnover[:, b],
+            get_stats(equity[:, b], drawdown[:, b], turnover[:, b], rebalances),
+        )
+        for b in range(len(baskets))
+    ]
+
+
+def run_backtest(
+    con, weights: dict, start_date, end_date, rebalance: str = "monthly"
+) -> BacktestResult:
+    """Backtest one basket.
+
+    The backtest starts on the first day all the basket's funds have a price.
+
+    Args:
+        con: The database connection object.
+        weights: Mapping of fund symbol to target weight.
+        start_date: First day of the backtest.
+        end_date: Last day of the backtest.
+        rebalance: One of REBALANCE_FREQUENCIES.
+
+    Returns:
+        The daily series and summary statistics of the basket.
+    """
+    weights = normalize_weights(weights)
+    aligned = get_aligned_returns(con, weights).between(start_date, end_date)
+    return backtest_aligned(aligned, [weights], rebalance)[0]
+
+
+def run_backtests(
+    con, baskets: dict, start_date, end_date, rebalance: str = "monthly"
+) -> pd.DataFrame:
+    """Backtest a batch of baskets.
+
+    The returns of every fund in the batch are loaded once, and the baskets
+    holding the same funds are simulated together.
+
+    Args:
+        con: The database connection object.
+        baskets: Mapping of basket name to its weights.
+        start_date: First day of the backtests.
+        end_date: Last day of the backtests.
+        rebalance: One of REBALANCE_FREQUENCIES.
+
+    Returns:
+        A DataFrame with the summary statistics of each basket.
+    """
+    baskets = {name: normalize_weights(w) for name, w in baskets.items()}
+    universe = set().union(*baskets.values())
+    aligned = get_aligned_returns(con, universe).between(start_date, end_date)
+
+    groups = {}
+    for name, weights in baskets.items():
+        groups.setdefault(tuple(sorted(weights)), []).append(name)
+
+    rows = []
+    for names in groups.values():
+        results = backtest_aligned(aligned, [baskets[n] for n in names], rebalance)
+        for name, result in zip(names, results):
+            first_day = result.dates[0] if len(result.dates) else None
+            rows.append({"basket": name, "first_day": first_day, **result.stats})
+    return pd.DataFrame(rows).set_index("basket").reindex(list(baskets))
+
+
+def read_baskets(path: str) -> dict:
+    """Read a batch of baskets from a CSV file of basket, fund_symbol and weight rows."""
+    df = pd.read_csv(path)
+    df["fund_symbol"] = df["fund_symbol"].str.strip().str.upper()
+    return {
+        name: dict(zip(rows["fund_symbol"], rows["weight"]))
+        for name, rows in df.groupby("basket", sort=False)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baskets", help="CSV file of basket, fund_symbol and weight.")
+    parser.add_argument("--start", type=datetime.date.fromisoformat)
+    parser.add_argument("--end", type=datetime.date.fromisoformat)
+    parser.add_argument("--rebalance", choices=REBALANCE_FREQUENCIES, default="monthly")
+    parser.add_argument("--output", help="Write the statistics to this CSV file.")
+    args = parser.parse_args()
+
+    baskets = read_baskets(args.baskets)
+    con = connect_to_db()
+    start = time.perf_counter()
+    df_stats = run_backtests(
+        con,
+        baskets,
+        args.start or datetime.date.min,
+        args.end or datetime.date.max,
+        args.rebalance,
+    )
+    elapsed = time.perf_counter() - start
+    if args.output:
+        df_stats.to_csv(args.output)
+    else:
+        print(df_stats.to_string())
+    print(f"Backtested {len(baskets)} baskets in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
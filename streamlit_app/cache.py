@@ -0,0 +1,203 @@
+"""
+In-process caches shared by every session of the US funds web application.
+
+Streamlit re-executes the page script on every widget interaction, but imported
+modules stay loaded, so the caches below live for the lifetime of the server
+process and are shared between sessions. In multi-worker mode, query results
+and figures missing from a worker's caches are looked up in the on-disk store
+shared by all the workers (see shared_cache.py) before being computed.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from shared_cache import get_or_create_shared
+
+
+class SizeBoundedCache:
+    """
+    Thread-safe LRU mapping bounded by the total size of its values.
+
+    Every entry is stored together with its size in bytes. When the total goes
+    above `max_bytes`, the least recently used entries are evicted first.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                # An entry larger than the whole budget would evict everything
+                return
+            self._entries[key] = (value, size)
+            self._nbytes += size
+            while self._nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._nbytes -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("US_FUNDS_FIGURE_CACHE_MB", "256")) * 2**20
+
+figure_cache = SizeBoundedCache(FIGURE_CACHE_MAX_BYTES)
+
+
+def figure_key(
+    chart_type: str,
+    symbol: str,
+    date_range=None,
+    resolution: str = "daily",
+    data_version: str = "",
+) -> tuple:
+    """
+    Builds the cache key of a chart.
+
+    Parameters:
+        chart_type (str): Name of the chart, e.g. "candlestick" or "volume".
+        symbol (str): The fund symbol the chart is drawn for.
+        date_range (tuple): (start_date, end_date) shown by the chart, None for charts without a time axis.
+        resolution (str): Resolution of the plotted series.
+        data_version (str): Version of the database the chart was built from.
+
+    Returns:
+        tuple: A hashable key for the figure cache.
+    """
+    if date_range is not None:
+        date_range = tuple(str(d) for d in date_range)
+    return (chart_type, symbol, date_range, resolution, data_version)
+
+
+def get_or_build_figure(key: tuple, build) -> go.Figure:
+    """
+    Returns the cached figure for `key`, building and caching it on a miss.
+
+    Only the figure is kept: Streamlit serializes it on every render anyway.
+    A new figure is serialized once, for its size against the cache budget
+    and, in multi-worker mode, for the on-disk store shared between workers;
+    the JSON is then dropped. Cached figures are shared between sessions and
+    must not be mutated by callers.
+
+    Parameters:
+        key (tuple): Key built with `figure_key`.
+        build (callable): Zero-argument function returning a Plotly figure.
+
+    Returns:
+        go.Figure: The cached or freshly built figure.
+    """
+    fig = figure_cache.get(key)
+    if fig is None:
+
+        def build_entry():
+            fig = build()
+            return (fig, fig.to_json())
+
+        fig, fig_json = get_or_create_shared(
+            key, "json", build_entry, _read_figure_entry, _write_figure_entry
+        )
+        figure_cache.put(key, fig, len(fig_json))
+    return fig
+
+
+def _read_figure_entry(path: str) -> tuple:
+    with open(path, encoding="utf-8") as f:
+        fig_json = f.read()
+    return (pio.from_json(fig_json), fig_json)
+
+
+def _write_figure_entry(entry: tuple, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(entry[1])
+
+
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("US_FUNDS_RESULT_CACHE_MB", "512")) * 2**20
+
+result_cache = SizeBoundedCache(RESULT_CACHE_MAX_BYTES)
+
+
+def get_or_load_result(key: tuple, load) -> pd.DataFrame:
+    """
+    Returns a copy of the cached query result for `key`, running `load` on a miss.
+
+    A copy is returned because the pages add and reformat columns in place.
+
+    Parameters:
+        key (tuple): Hashable key identifying the query, its arguments and the data version.
+        load (callable): Zero-argument function returning a DataFrame.
+
+    Returns:
+        pd.DataFrame: The query result.
+    """
+    df = result_cache.get(key)
+    if df is None:
+        df = get_or_create_shared(
+            key, "pkl", load, pd.read_pickle, lambda df, path: df.to_pickle(path)
+        )
+        result_cache.put(key, df, int(df.memory_usage(deep=True).sum()))
+    return df.copy()
+
+
+ANALYTICS_CACHE_MAX_BYTES = (
+    int(os.environ.get("US_FUNDS_ANALYTICS_CACHE_MB", "512")) * 2**20
+)
+
+analytics_cache = SizeBoundedCache(ANALYTICS_CACHE_MAX_BYTES)
+
+
+def get_or_compute_arrays(key: tuple, compute):
+    """
+    Returns the cached NumPy result for `key`, running `compute` on a miss.
+
+    `compute` returns a tuple (or NamedTuple) whose NumPy array fields are made
+    read-only before caching. Sessions can then share them without copying.
+    Their total `nbytes` counts against the cache budget.
+
+    Parameters:
+        key (tuple): Hashable key identifying the computation and the data version.
+        compute (callable): Zero-argument function returning a tuple of arrays and plain values.
+
+    Returns:
+        The cached or freshly computed tuple.
+    """
+    result = analytics_cache.get(key)
+    if result is None:
+        result = compute()
+        size = 0
+        for value in result:
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+                size += value.nbytes
+        analytics_cache.put(key, result, size)
+    return result
@@ -0,0 +1,289 @@
+"""
+Correlations and covariances of daily fund returns.
+
+Returns are standardized once per universe, window and data version: each
+fund's daily returns over the window, minus their mean, divided by their
+standard deviation and by sqrt(n_days - 1). The correlation of two funds is
+then the dot product of their columns, so:
+
+- the most similar funds to one symbol take a single matrix-vector product
+  over the universe, never the full n x n matrix,
+- full matrices are built block by block with matrix products, writing into
+  one preallocated float32 result and mirroring the upper triangle.
+
+Funds missing more than 1 - MIN_COVERAGE of the window are left out. The few
+missing days of the others count as average days, which slightly shrinks
+their correlations towards 0.
+"""
+
+import datetime
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from cache import get_or_compute_arrays
+from queries import get_data_version
+from returns import build_aligned_returns, load_price_series, price_calendar
+
+MIN_COVERAGE = 0.9
+CORRELATION_BLOCK_SIZE = 512
+TRADING_DAYS_PER_YEAR = 252
+
+
+class ReturnMoments(NamedTuple):
+    """Standardized daily returns of the funds of a universe over a window."""
+
+    symbols: tuple
+    n_days: int
+    mean: np.ndarray
+    std: np.ndarray
+    standardized: np.ndarray
+
+
+class Correlations(NamedTuple):
+    """Correlation matrix of some funds, with their daily return volatilities."""
+
+    symbols: tuple
+    correlation: np.ndarray
+    std: np.ndarray
+
+    def covariance(self, annualized: bool = True) -> np.ndarray:
+        """Covariance matrix of the daily returns, annualized by default."""
+        covariance = self.correlation * np.outer(self.std, self.std)
+        if annualized:
+            covariance *= TRADING_DAYS_PER_YEAR
+        return covariance
+
+
+def get_window_dates(last_date, years) -> tuple:
+    """Dates of a trailing window ending on the last price date.
+
+    Args:
+        last_date: The last price date of the database.
+        years: The window length in years, None for the full history.
+
+    Returns:
+        A tuple (start_date, end_date).
+    """
+    if years is None:
+        return datetime.date.min, last_date
+    return last_date - datetime.timedelta(days=round(365.25 * years)), last_date
+
+
+def build_return_moments(series: list, symbols: tuple, dates) -> ReturnMoments:
+    """Standardize the returns of the funds with enough history in the window.
+
+    The returns are aligned straight from the price series, a block of funds
+    at a time: a first pass computes the moments of every fund, a second one
+    standardizes the kept funds into the float32 result. The float64 scratch
+    space stays at one n_days x CORRELATION_BLOCK_SIZE block whatever the
+    universe size, the full float64 matrix is never built.
+
+    Args:
+        series: The PriceSeries of each fund over the window, None for funds
+            without prices.
+        symbols: The fund of each series.
+        dates: The price dates of the window, see returns.price_calendar.
+
+    Returns:
+        The moments of the kept funds, in the order of `symbols`.
+    """
+
+    def returns_block(columns) -> np.ndarray:
+        aligned = build_aligned_returns(
+            [series[i] for i in columns], tuple(symbols[i] for i in columns), dates
+        )
+        return aligned.returns
+
+    n_days, n_funds = max(len(dates) - 1, 0), len(symbols)
+    mean = np.zeros(n_funds)
+    std = np.zeros(n_funds)
+    kept = np.zeros(n_funds, dtype=bool)
+    if n_days > 1:
+        for start in range(0, n_funds, CORRELATION_BLOCK_SIZE):
+            stop = min(start + CORRELATION_BLOCK_SIZE, n_funds)
+            block = returns_block(range(start, stop))
+            present = ~np.isnan(block)
+            count = present.sum(axis=0)
+            total = np.where(present, block, 0.0).sum(axis=0)
+            block_mean = total / np.maximum(count, 1)
+            squares = np.where(present, block - block_mean, 0.0) ** 2
+            block_std = np.sqrt(squares.sum(axis=0) / np.maximum(count - 1, 1))
+            mean[start:stop], std[start:stop] = block_mean, block_std
+            kept[start:stop] = (count >= MIN_COVERAGE * n_days) & (block_std > 0)
+
+    kept_columns = np.flatnonzero(kept)
+    standardized = np.empty((n_days, len(kept_columns)), dtype=np.float32)
+    scale = std * np.sqrt(max(n_days - 1, 1))
+    for start in range(0, len(kept_columns), CORRELATION_BLOCK_SIZE):
+        columns = kept_columns[start : start + CORRELATION_BLOCK_SIZE]
+        block = (returns_block(columns) - mean[columns]) / scale[columns]
+        standardized[:, start : start + len(columns)] = np.nan_to_num(block, nan=0.0)
+
+    return ReturnMoments(
+        tuple(symbols[i] for i in kept_columns),
+        n_days,
+        mean[kept_columns],
+        std[kept_columns],
+        standardized,
+    )
+
+
+def get_return_moments(con, universe, start_date, end_date) -> ReturnMoments:
+    """Get the cached standardized returns of a universe over a window.
+
+    Args:
+        con: The database connection object.
+        universe: The fund symbols, ETFs and mutual funds can be mixed.
+        start_date: First price date of the window.
+        end_date: Last price date of the window.
+
+    Returns:
+        The moments of the funds with enough history in the window.
+    """
+    universe = tuple(sorted(set(universe)))
+    key = (
+        "return_moments",
+        universe,
+        str(start_date),
+        str(end_date),
+        get_data_version(con),
+    )
+
+    def compute():
+        # The series are views of the memory-mapped price store, only the
+        # float32 standardized returns are allocated for the whole universe
+        series = load_price_series(con, universe, start_date, end_date)
+        return build_return_moments(series, universe, price_calendar(series))
+
+    return get_or_compute_arrays(key, compute)
+
+
+def correlation_matrix(
+    standardized: np.ndarray, block_size: int = CORRELATION_BLOCK_SIZE
+) -> np.ndarray:
+    """Correlation matrix of standardized returns, computed block by block.
+
+    Only the blocks on and above the diagonal are multiplied, the others are
+    mirrored. Scratch memory stays at one block_size x n block.
+
+    Args:
+        standardized: Standardized returns, one column per fund.
+        block_size: Number of funds per block.
+
+    Returns:
+        The n x n float32 correlation matrix.
+    """
+    n = standardized.shape[1]
+    correlation = np.empty((n, n), dtype=np.float32)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = standardized[:, start:stop].T @ standardized[:, start:]
+        correlation[start:stop, start:] = block
+        correlation[start:, start:stop] = block.T
+    np.clip(correlation, -1.0, 1.0, out=correlation)
+    np.fill_diagonal(correlation, 1.0)
+    return correlation
+
+
+def get_correlations(con, universe, start_date, end_date, symbols=None) -> Correlations:
+    """Get the cached correlation matrix of funds of a universe.
+
+    Args:
+        con: The database connection object.
+        universe: The fund symbols the returns are standardized over.
+        start_date: First price date of the window.
+        end_date: Last price date of the window.
+        symbols: The funds of the matrix, in order. None for the whole universe.
+
+    Returns:
+        The correlations of the requested funds that have enough history.
+    """
+    moments = get_return_moments(con, universe, start_date, end_date)
+    if symbols is not None:
+        positions = {s: i for i, s in enumerate(moments.symbols)}
+        symbols = tuple(s for s in symbols if s in positions)
+    key = (
+        "correlations",
+        moments.symbols,
+        str(start_date),
+        str(end_date),
+        symbols,
+        get_data_version(con),
+    )
+
+    def compute():
+        if symbols is None:
+            columns = slice(None)
+        else:
+            columns = [positions[s] for s in symbols]
+        return Correlations(
+            symbols if symbols is not None else moments.symbols,
+            correlation_matrix(moments.standardized[:, columns]),
+            moments.std[columns],
+        )
+
+    return get_or_compute_arrays(key, compute)
+
+
+def get_most_similar_funds(
+    con, symbol: str, universe, start_date, end_date, k: int = 20
+) -> pd.DataFrame:
+    """Get the funds of a universe whose daily returns correlate most with a fund.
+
+    Args:
+        con: The database connection object.
+        symbol: The fund to compare with.
+        universe: The fund symbols to search.
+        start_date: First price date of the window.
+        end_date: Last price date of the window.
+        k: The number of funds to return.
+
+    Returns:
+        A DataFrame of fund_symbol and correlation, most correlated first. Empty
+        if the fund does not have enough history in the window.
+    """
+    moments = get_return_moments(con, universe, start_date, end_date)
+    if symbol not in moments.symbols:
+        return pd.DataFrame({"fund_symbol": [], "correlation": []})
+    position = moments.symbols.index(symbol)
+    correlation = moments.standardized.T @ moments.standardized[:, position]
+    correlation[position] = -np.inf
+
+    k = min(k, len(correlation) - 1)
+    top = np.argpartition(-correlation, k)[:k] if k > 0 else np.empty(0, dtype=int)
+    top = top[np.argsort(-correlation[top], kind="stable")]
+    return pd.DataFrame(
+        {
+            "fund_symbol": [moments.symbols[i] for i in top],
+            "correlation": np.clip(correlation[top], -1.0, 1.0),
+        }
+    )
+
+
+def cluster_order(correlation: np.ndarray) -> np.ndarray:
+    """Order funds so that correlated funds sit next to each other.
+
+    Average-linkage agglomerative clustering on 1 - correlation, meant for the
+    few dozen funds of a heatmap.
+
+    Args:
+        correlation: A square correlation matrix.
+
+    Returns:
+        The permutation of the funds, by cluster.
+    """
+    n = len(correlation)
+    distance = 1.0 - correlation.astype(np.float64)
+    np.fill_diagonal(distance, np.inf)
+    members = {i: [i] for i in range(n)}
+    for _ in range(n - 1):
+        i, j = np.unravel_index(np.argmin(distance), distance.shape)
+        size_i, size_j = len(members[i]), len(members[j])
+        merged = (size_i * distance[i] + size_j * distance[j]) / (size_i + size_j)
+        distance[i], distance[:, i] = merged, merged
+        distance[i, i] = np.inf
+        distance[j], distance[:, j] = np.inf, np.inf
+        members[i] += members.pop(j)
+    return np.array(next(iter(members.values())) if members else [], dtype=int)
@@ -1,37 +1,43 @@
 import streamlit as st
-import os
-import duckdb
 import pandas as pd
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-import datetime
 from utils import (
-    config_menu_footer,
     generate_card,
     generate_long_text,
     generate_investment_profile,
-    create_donut_chart,
-    create_candlestick_chart,
-    create_volume_chart,
-    empty_lines,
-    get_delta,
-    color_highlighter,
+    get_holdings_chart,
+    get_sectors_chart,
+    get_price_charts,
+    get_peer_distribution_chart,
+    display_export,
+    PEER_METRIC_LABELS,
 )
 from queries import (
     connect_to_db,
+    get_data_version,
     get_etf_top_10_holdings,
-    get_min_max_dates_by_fund,
-    get_etf_basic_info,
+    get_fund_profile,
     get_etf_sectors,
     get_etf_facts,
     get_etf_percentage_of_net_assets,
+    get_fund_category_ranks,
+    search_funds,
 )
+from price_store import get_price_store
+from usage import record_symbol_view
+from warmup import start_warmup_watcher
 
 # Streamlit page configuration
 st.set_page_config(layout="wide")
 st.title("📈 US-funds stats | Streamlit")
 
-con = connect_to_db()
+FUND_SEARCH_RESULTS = 50
+
+# The database is opened by the first query, after the layout is sent
+con = connect_to_db(lazy=True)
+# Only when served: import_profile.py runs the page under another name
+if __name__ == "__main__":
+    start_warmup_watcher()
+
 
 def display_fund_selection(con):
     """Display UI elements for fund selection and details.
@@ -39,30 +45,39 @@ def display_fund_selection(con):
     Args:
         con: The database connection object.
     """
-    df_funds_dates = get_min_max_dates_by_fund(con)
-
-    if not df_funds_dates.empty:
+    search_text = st.sidebar.text_input(
+        "Search funds", placeholder="Symbol, name or fund family"
+    )
+    # Only the best matches are sent to the browser, not the whole universe
+    df_matches = search_funds(con, search_text, FUND_SEARCH_RESULTS, "etf")
 
-        sorted_symbols = df_funds_dates["fund_symbol"].sort_values()
+    if not df_matches.empty:
+        fund_names = dict(zip(df_matches["fund_symbol"], df_matches["fund_short_name"]))
 
-        selected_symbol = st.sidebar.selectbox("Fund Symbol", sorted_symbols)
+        selected_symbol = st.sidebar.selectbox(
+            "Fund Symbol",
+            df_matches["fund_symbol"],
+            format_func=lambda symbol: f"{symbol} | {fund_names[symbol]}",
+        )
         if selected_symbol:  # Ensure selected_symbol is not None or empty
-            show_fund_details(con, selected_symbol)
+            # Count a view only when the selection changes, not on every rerun
+            if st.session_state.get("last_viewed_symbol") != selected_symbol:
+                st.session_state["last_viewed_symbol"] = selected_symbol
+                record_symbol_view(selected_symbol)
+            show_fund_details(con, selected_symbol, df_matches["fund_symbol"])
     else:
         st.write("No funds found.")
 
 
-def show_fund_details(con, selected_symbol: str):
-    # Fetch the min and max dates for the selected symbol directly within this function
-    df_funds_dates = get_min_max_dates_by_fund(con)
-    selected_fund_data = df_funds_dates[
-        df_funds_dates["fund_symbol"] == selected_symbol
-    ]
+def show_fund_details(con, selected_symbol: str, matched_symbols):
+    # The header and the date range come from one row of the fund profile,
+    # precomputed by dbt, without scanning the price history
+    df_profile = get_fund_profile(con, selected_symbol, "etf")
 
-    if not selected_fund_data.empty:
+    if not df_profile.empty and pd.notna(df_profile["first_price_date"].iloc[0]):
         min_date, max_date = pd.to_datetime(
-            selected_fund_data["min_date"].iloc[0]
-        ), pd.to_datetime(selected_fund_data["max_date"].iloc[0])
+            df_profile["first_price_date"].iloc[0]
+        ), pd.to_datetime(df_profile["last_price_date"].iloc[0])
 
         # Use a try-except block or check the length of the returned value to handle the case where an end date isn't specified
         date_selection = st.sidebar.date_input(
@@ -81,58 +96,24 @@ def show_fund_details(con, selected_symbol: str):
             st.error("Please select a valid date range.")
             return  # Exit the function early
 
-        # Fetch and display ETF basic info
-        df_dim_etf = get_etf_basic_info(con, selected_symbol)
+        display_export(con, selected_symbol, matched_symbols, start_date, end_date)
+
         df_top_10_holdings = get_etf_top_10_holdings(con, selected_symbol)
         df_sectors = get_etf_sectors(con, selected_symbol)
         df_percentage_of_net_assets = get_etf_percentage_of_net_assets(
             con, selected_symbol
         )
-        df_fact_etf = get_etf_facts(con, selected_symbol)
-        df_fact_etf["total_net_assets"] = df_fact_etf["total_net_assets"].apply(
-            lambda x: "${:,.2f}".format(x)
-        )
-        df_fact_etf["inception_date"] = pd.to_datetime(
-            df_fact_etf["inception_date"]
-        ).dt.date
-        df_fact_etf["price_date"] = pd.to_datetime(df_fact_etf["price_date"])
-        df_valuation_ratios = df_fact_etf[
-            [
-                "fund_price_book_ratio",
-                "fund_price_cashflow_ratio",
-                "fund_price_earning_ratio",
-                "fund_price_sales_ratio",
-            ]
-        ]
+        # Charts read views of the shared price store, not per-session copies
+        price_store = get_price_store(con)
+        data_version = get_data_version(con)
+        df_valuation_ratios = get_etf_facts(con, selected_symbol, "valuation")
         df_valuation_ratios = df_valuation_ratios.drop_duplicates()
-        df_risk_metrics = df_fact_etf[
-            [
-                "fund_alpha_3years",
-                "fund_beta_3years",
-                "fund_mean_annual_return_3years",
-                "fund_r_squared_3years",
-                "fund_stdev_3years",
-                "fund_sharpe_ratio_3years",
-                "fund_treynor_ratio_3years",
-                "fund_alpha_5years",
-                "fund_beta_5years",
-                "fund_mean_annual_return_5years",
-                "fund_r_squared_5years",
-                "fund_stdev_5years",
-                "fund_sharpe_ratio_5years",
-                "fund_treynor_ratio_5years",
-                "fund_alpha_10years",
-                "fund_beta_10years",
-                "fund_mean_annual_return_10years",
-                "fund_r_squared_10years",
-                "fund_stdev_10years",
-                "fund_sharpe_ratio_10years",
-                "fund_treynor_ratio_10years",
-            ]
-        ]
+        df_risk_metrics = get_etf_facts(con, selected_symbol, "risk")
         df_risk_metrics = df_risk_metrics.drop_duplicates()
         df_risk_metrics = df_risk_metrics.melt(var_name="Metric", value_name="Value")
-        if not df_dim_etf.empty:
+        # Ranks are precomputed by dbt, not computed over the category here
+        df_peer_ranks = get_fund_category_ranks(con, selected_symbol, "etf")
+        if not df_profile.empty:
             st.subheader("Selected Fund")
             generate_card(f"{selected_symbol}")
             st.text(
@@ -142,22 +123,21 @@ def show_fund_details(con, selected_symbol: str):
             ##         Profile and Investment
             st.header("Profile and Investment")
 
+            profile = df_profile.iloc[0]
             generate_investment_profile(
-                fund_long_name=f"{df_dim_etf['fund_long_name'].iloc[0]}",
-                fund_category=f"{df_dim_etf['fund_category'].iloc[0]}",
-                fund_family=f"{df_dim_etf['fund_family'].iloc[0]}",
-                currency=f"{df_dim_etf['currency'].iloc[0]}",
-                exchange_name=f"{df_dim_etf['exchange_name'].iloc[0]}",
-                exchange_code=f"{df_dim_etf['exchange_code'].iloc[0]}",
+                fund_long_name=f"{profile['display_name']}",
+                fund_category=f"{profile['fund_category']}",
+                fund_family=f"{profile['fund_family']}",
+                currency=f"{profile['currency']}",
+                exchange_name=f"{profile['exchange_name']}",
+                exchange_code=f"{profile['exchange_code']}",
                 region=f"US",
-                inception_date=f"{df_fact_etf['inception_date'].iloc[0]}",
-                total_net_assets=f"{df_fact_etf['total_net_assets'].iloc[0]}",
+                inception_date=f"{profile['inception_date_display']}",
+                total_net_assets=f"{profile['total_net_assets_display']}",
             )
             ###         Investment strategy
             st.subheader("Investment strategy")
-            generate_long_text(
-                f"Investment Strategy: {df_dim_etf['investment_strategy'].iloc[0]}"
-            )
+            generate_long_text(f"Investment Strategy: {profile['investment_strategy']}")
 
             st.header("Valuation and Quality Metrics")
             col1, col2 = st.columns(2)
@@ -167,11 +147,11 @@ def show_fund_details(con, selected_symbol: str):
 
             with col2:
                 st.subheader("Portfolio Weight by Company")
-                fig = create_donut_chart(
-                    labels=df_top_10_holdings["Company"],
-                    values=df_top_10_holdings["Portfolio Weight in %"],
-                    hole_size=0.4,  # Example of customizing the hole size
-                    title_text=f"Top 10 holdings as % of portfolio : {df_percentage_of_net_assets['% Net assets'].iloc[0]} % Net assets",
+                fig = get_holdings_chart(
+                    df_top_10_holdings,
+                    df_percentage_of_net_assets,
+                    selected_symbol,
+                    data_version,
                 )
 
                 # Display donut chart
@@ -195,12 +175,7 @@ def show_fund_details(con, selected_symbol: str):
                 st.dataframe(df_sectors, hide_index=True)
 
             with col2:
-                fig = create_donut_chart(
-                    labels=df_sectors["sector"],
-                    values=df_sectors["Weight in %"],
-                    hole_size=0.4,  # Example of customizing the hole size
-                    title_text=f"",
-                )
+                fig = get_sectors_chart(df_sectors, selected_symbol, data_version)
                 # Display donut chart
                 st.plotly_chart(fig)
 
@@ -233,13 +208,52 @@ def show_fund_details(con, selected_symbol: str):
                 hide_index=True,
                 height=780,
             )
+            st.header("Category Peers")
+            if not df_peer_ranks.empty:
+                fund_category = df_peer_ranks["fund_category"].iloc[0]
+                df_peer_table = pd.DataFrame(
+                    {
+                        "Metric": df_peer_ranks["metric"].map(PEER_METRIC_LABELS),
+                        "Value": df_peer_ranks["metric_value"],
+                        "Rank": df_peer_ranks["category_rank"].astype(str)
+                        + " / "
+                        + df_peer_ranks["category_size"].astype(str),
+                        "In Category": "Top "
+                        + df_peer_ranks["category_top_percent"].astype(str)
+                        + "%",
+                        "Category Median": df_peer_ranks["median_value"],
+                    }
+                )
+                st.text(f"Compared with the other {fund_category} ETFs")
+                st.dataframe(df_peer_table, hide_index=True)
+                peer_metric = st.selectbox(
+                    "Peer distribution of",
+                    df_peer_ranks["metric"],
+                    format_func=PEER_METRIC_LABELS.get,
+                )
+                peer_ranks = df_peer_ranks.set_index("metric", drop=False).loc[
+                    peer_metric
+                ]
+                fig = get_peer_distribution_chart(
+                    peer_ranks,
+                    selected_symbol,
+                    PEER_METRIC_LABELS[peer_metric],
+                    data_version,
+                )
+                st.plotly_chart(fig)
+            else:
+                st.write("No category peers found for the selected ETF.")
             st.header("Price & Volume data")
-            # Generate and display the candlestick chart
-            fig = create_candlestick_chart(df_fact_etf)
-            st.plotly_chart(fig)
-            # Generate and display the volume chart
-            volume_fig = create_volume_chart(df_fact_etf)
-            st.plotly_chart(volume_fig)
+            if price_store.get_series(selected_symbol, "etfs") is not None:
+                fig, volume_fig = get_price_charts(
+                    price_store, selected_symbol, start_date, end_date, data_version
+                )
+                # Display the candlestick chart
+                st.plotly_chart(fig)
+                # Display the volume chart
+                st.plotly_chart(volume_fig)
+            else:
+                st.write("No price data found for the selected ETF.")
 
         else:
             st.write("No basic information found for the selected ETF.")
@@ -0,0 +1,175 @@
+"""
+Streaming export of fund data to Parquet, CSV or Excel.
+
+Results are read from DuckDB as Arrow record batches and written batch by
+batch to the output, so memory use stays flat however many funds and days
+are exported. Excel exports continue on a new sheet every EXCEL_MAX_ROWS
+rows, the size limit of a worksheet.
+"""
+
+import importlib.util
+
+from queries import FACT_PROJECTIONS, FACT_TABLES
+
+EXPORT_BATCH_ROWS = 100_000
+
+# Rows of an Excel worksheet, header included. Longer exports continue on a
+# new sheet.
+EXCEL_MAX_ROWS = 1_048_576
+
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "csv": ("text/csv", "csv"),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+}
+
+
+def get_available_formats() -> list:
+    """List the export formats usable in this environment.
+
+    Excel export needs the optional openpyxl package.
+
+    Returns:
+        A list of keys of EXPORT_FORMATS.
+    """
+    formats = ["parquet", "csv"]
+    if importlib.util.find_spec("openpyxl") is not None:
+        formats.append("xlsx")
+    return formats
+
+
+class ExportTooLarge(Exception):
+    """Raised when an export outgrows the size allowed for it."""
+
+
+class _SizeLimitedSink:
+    """Write to a sink, raising ExportTooLarge past a number of bytes."""
+
+    def __init__(self, sink, max_bytes: int):
+        self.sink = sink
+        self.max_bytes = max_bytes
+        self.written = 0
+
+    def write(self, data) -> int:
+        self.written += len(data)
+        if self.written > self.max_bytes:
+            raise ExportTooLarge(f"The export is larger than {self.max_bytes} bytes.")
+        return self.sink.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+
+def build_export_query(
+    symbols, projection: str = "ohlcv", fund_type: str = "etf"
+) -> str:
+    """Build the query exporting a projection of a fact table.
+
+    Args:
+        symbols: The fund symbols to export, bound as parameters. None exports every fund.
+        projection: A projection name from FACT_PROJECTIONS[fund_type].
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        The query, with one parameter per symbol followed by the start and end dates.
+
+    Raises:
+        ValueError: If symbols is an empty list.
+    """
+    if symbols is not None and not symbols:
+        raise ValueError("No fund to export.")
+    columns = FACT_PROJECTIONS[fund_type][projection]
+    if "price_date" in columns:
+        distinct, order_by = "", "fund_symbol, price_date"
+    else:
+        # Fund-level metrics repeat on every price row, keep one row per fund
+        distinct, order_by = "DISTINCT", "fund_symbol"
+    symbol_filter = ""
+    if symbols is not None:
+        placeholders = ", ".join("?" for _ in symbols)
+        symbol_filter = f"fund_symbol IN ({placeholders}) AND"
+    select_list = ",\n                ".join(["fund_symbol", *columns])
+    return f"""
+              SELECT {distinct}
+                {select_list}
+              FROM "us-funds-project".{FACT_TABLES[fund_type]}
+              WHERE {symbol_filter} price_date BETWEEN ? AND ?
+              ORDER BY {order_by}
+          """
+
+
+def write_export(
+    con,
+    sink,
+    symbols,
+    start_date,
+    end_date,
+    fmt: str,
+    projection="ohlcv",
+    fund_type="etf",
+    max_bytes=None,
+) -> None:
+    """Write a fund data export to a binary file-like object.
+
+    Args:
+        con: The database connection object.
+        sink: A writable binary file-like object (file, socket, ...).
+        symbols: The fund symbols to export, None for every fund.
+        start_date: First price date exported.
+        end_date: Last price date exported.
+        fmt: A key of EXPORT_FORMATS.
+        projection: A projection name from FACT_PROJECTIONS[fund_type].
+        fund_type: "etf" or "mutual_fund".
+        max_bytes: Size above which the export is abandoned, None for no limit.
+
+    Raises:
+        ValueError: If an argument is invalid, or symbols is an empty list.
+        ExportTooLarge: If the export outgrows max_bytes. The sink then holds
+            a truncated file.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'.")
+    if fund_type not in FACT_PROJECTIONS:
+        raise ValueError(f"Unknown fund type '{fund_type}'.")
+    if projection not in FACT_PROJECTIONS[fund_type]:
+        raise ValueError(f"Unknown projection '{projection}'.")
+
+    query = build_export_query(symbols, projection, fund_type)
+    params = [*(symbols or []), start_date, end_date]
+    reader = con.execute(query, params).fetch_record_batch(EXPORT_BATCH_ROWS)
+    if max_bytes is not None:
+        sink = _SizeLimitedSink(sink, max_bytes)
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    elif fmt == "csv":
+        import pyarrow.csv as pa_csv
+
+        with pa_csv.CSVWriter(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    else:
+        from openpyxl import Workbook
+
+        # Write-only workbooks keep rows on disk, not in memory
+        workbook = Workbook(write_only=True)
+        sheets, sheet_rows = 0, EXCEL_MAX_ROWS
+        for batch in reader:
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                if sheet_rows == EXCEL_MAX_ROWS:
+                    sheets += 1
+                    sheet = workbook.create_sheet(f"export_{sheets}")
+                    sheet.append(reader.schema.names)
+                    sheet_rows = 1
+                sheet.append(row)
+                sheet_rows += 1
+        if sheets == 0:
+            workbook.create_sheet("export_1").append(reader.schema.names)
+        workbook.save(sink)
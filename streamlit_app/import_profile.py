@@ -0,0 +1,130 @@
+"""
+Import-time profile of the Streamlit entry points.
+
+Each entry point's module code (not its __main__ block) is run in a fresh
+interpreter under `python -X importtime`, after importing what the Streamlit
+server has already loaded when it runs a page. The report therefore shows
+what a page adds to a cold start: the total import time, the slowest
+imports, and which of the known heavy modules got loaded.
+
+    python import_profile.py
+    python import_profile.py etf_app.py pages/fund_correlations.py --top 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = ["etf_app.py", "mutual_fund_app.py"]
+
+# Modules worth keeping off the startup path, when a page does not need them
+HEAVY_MODULES = ["matplotlib", "scipy", "openpyxl", "sklearn"]
+
+# Loaded by `streamlit run` before the page script starts
+SERVER_PRELUDE = "import streamlit.web.bootstrap"
+PROFILE_MARKER = "import-profile: page starts"
+
+# The page runs as __import_profile__, not __main__, so it neither renders nor
+# starts its background threads (e.g. the cache warm-up). Exits without
+# interpreter teardown, which would race any daemon thread left by an import
+PROFILE_SCRIPT = f"""
+import os, runpy, sys, time
+{SERVER_PRELUDE}
+print({PROFILE_MARKER!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+runpy.run_path(sys.argv[1], run_name="__import_profile__")
+print(f"{{(time.perf_counter() - start) * 1e3:.0f}}", flush=True)
+sys.stderr.flush()
+os._exit(0)
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    Parses the `-X importtime` lines printed after the page started.
+
+    Parameters:
+        stderr (str): The standard error of the profiled interpreter.
+
+    Returns:
+        list: (module, self_ms, cumulative_ms, depth) tuples, in import order.
+    """
+    _, _, page_stderr = stderr.partition(PROFILE_MARKER)
+    imports = []
+    for line in page_stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append(
+            (name.strip(), int(self_us) / 1e3, int(cumulative_us) / 1e3, depth)
+        )
+    return imports
+
+
+def profile_entry_point(path: str) -> dict:
+    """
+    Runs the module code of an entry point and collects its import times.
+
+    Parameters:
+        path (str): The page script, relative to the app directory.
+
+    Returns:
+        dict: The imports, total import time and module run time in ms.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROFILE_SCRIPT, path],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{path} failed:\n{result.stderr[-2000:]}")
+    imports = parse_importtime(result.stderr)
+    return {
+        "imports": imports,
+        "import_ms": sum(
+            cumulative for _, _, cumulative, depth in imports if depth == 0
+        ),
+        "run_ms": float(result.stdout.strip().splitlines()[-1]),
+    }
+
+
+def print_report(path: str, profile: dict, top: int) -> None:
+    """
+    Prints the import profile of one entry point.
+    """
+    imports = profile["imports"]
+    print(f"== {path}")
+    print(
+        f"module run time {profile['run_ms']:.0f} ms, of which imports "
+        f"{profile['import_ms']:.0f} ms ({len(imports)} modules)"
+    )
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    slowest = sorted(
+        (i for i in imports if i[3] == 0), key=lambda i: i[2], reverse=True
+    )
+    for name, self_ms, cumulative_ms, _ in slowest[:top]:
+        print(f"{cumulative_ms:14.1f} {self_ms:8.1f}  {name}")
+    loaded = {name.split(".")[0] for name, _, _, _ in imports}
+    heavy = [m for m in HEAVY_MODULES if m in loaded]
+    print(f"heavy modules loaded: {', '.join(heavy) if heavy else 'none'}")
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("entry_points", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument(
+        "--top", type=int, default=15, help="Number of top-level imports to list."
+    )
+    args = parser.parse_args()
+
+    for path in args.entry_points:
+        print_report(path, profile_entry_point(path), args.top)
+
+
+if __name__ == "__main__":
+    main()
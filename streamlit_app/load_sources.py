@@ -0,0 +1,241 @@
+"""
+Bulk loader for the raw Yahoo Finance dumps into the dbt source tables.
+
+Loads CSV or Parquet files (globs allowed) into the `main` schema tables that
+us_funds_dbt/models/staging/sources.yml reads, using DuckDB's parallel readers:
+
+    python load_sources.py etfs_prices "raw/ETF prices*.csv"
+    python load_sources.py mutual_fund_prices raw/mutual_fund_prices/*.parquet
+    python load_sources.py etfs raw/ETFs.csv --database path/to/us-funds-project.db
+
+The database must be given: the file the app serves is held open by its
+workers, load it with `python snapshots.py load` instead, which loads into a
+new snapshot, rebuilds it with dbt and publishes it.
+
+Price tables are append-only: rows are deduplicated on (fund_symbol, price_date)
+within the files and against what is already loaded, so re-running a load or
+loading overlapping dumps only inserts the new days. Fund tables hold one
+snapshot row per fund, and loading replaces the rows of the funds in the files.
+When the files repeat a key, the first row by file name, then by position in
+the file (by content in CSV files), is kept, so a load is reproducible.
+"""
+
+import argparse
+import time
+
+import duckdb
+
+PRICE_COLUMNS = {
+    "etfs_prices": {
+        "fund_symbol": "VARCHAR",
+        "price_date": "DATE",
+        "open": "DOUBLE",
+        "high": "DOUBLE",
+        "low": "DOUBLE",
+        "close": "DOUBLE",
+        "adj_close": "DOUBLE",
+        "volume": "BIGINT",
+    },
+    "mutual_fund_prices": {
+        "fund_symbol": "VARCHAR",
+        "price_date": "DATE",
+        "nav_per_share": "DOUBLE",
+    },
+}
+
+# Fund tables have a few hundred columns: the key, text and date columns are
+# typed explicitly and the numeric metrics are detected by the reader.
+FUND_COLUMN_TYPES = {
+    "etfs": {
+        "fund_symbol": "VARCHAR",
+        "fund_short_name": "VARCHAR",
+        "fund_long_name": "VARCHAR",
+        "top10_holdings": "VARCHAR",
+        "inception_date": "DATE",
+        "returns_as_of_date": "DATE",
+    },
+    "mutual_funds": {
+        "fund_symbol": "VARCHAR",
+        "fund_short_name": "VARCHAR",
+        "fund_long_name": "VARCHAR",
+        "top10_holdings": "VARCHAR",
+        "management_bio": "VARCHAR",
+        "inception_date": "DATE",
+        "returns_as_of_date": "DATE",
+        "management_start_date": "DATE",
+    },
+}
+
+SOURCE_TABLES = list(PRICE_COLUMNS) + list(FUND_COLUMN_TYPES)
+
+
+def _sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _is_parquet(paths: list) -> bool:
+    return all(p.lower().endswith(".parquet") for p in paths)
+
+
+def _reader(paths: list, types: dict) -> str:
+    """Build the DuckDB table function reading the given files, aliased `source`.
+
+    The rows carry the columns of _source_columns, for _source_order.
+    """
+    files = "[" + ", ".join(_sql_string(p) for p in paths) + "]"
+    if _is_parquet(paths):
+        return (
+            f"read_parquet({files}, union_by_name = true, filename = true, "
+            "file_row_number = true) as source"
+        )
+    types_struct = (
+        "{"
+        + ", ".join(f"{_sql_string(c)}: {_sql_string(t)}" for c, t in types.items())
+        + "}"
+    )
+    return (
+        f"read_csv({files}, header = true, union_by_name = true, "
+        f"types = {types_struct}, filename = true) as source"
+    )
+
+
+def _source_columns(paths: list) -> str:
+    """The columns _reader adds to the rows of the files."""
+    if _is_parquet(paths):
+        return "filename, file_row_number"
+    return "filename"
+
+
+def _source_order(paths: list) -> str:
+    """A deterministic order of the rows read, to keep the first of duplicates.
+
+    By file name, then by position in the file. DuckDB's CSV reader has no
+    row number, so the rows of a CSV file are ordered by their content.
+    """
+    if _is_parquet(paths):
+        return "filename, file_row_number"
+    return "filename, source::varchar"
+
+
+def load_prices(con, table: str, paths: list) -> int:
+    """Append the new rows of price files to a price table.
+
+    Args:
+        con: A writable database connection object.
+        table: "etfs_prices" or "mutual_fund_prices".
+        paths: The CSV or Parquet files (or globs) to load.
+
+    Returns:
+        The number of inserted rows.
+    """
+    columns = PRICE_COLUMNS[table]
+    column_defs = ", ".join(f"{c} {t}" for c, t in columns.items())
+    casts = ", ".join(f"cast({c} as {t}) as {c}" for c, t in columns.items())
+    con.execute(f"create table if not exists main.{table} ({column_defs})")
+    inserted = con.execute(
+        f"""
+        insert into main.{table} by name
+        with incoming as (
+            select {casts}
+            from {_reader(paths, columns)}
+            where fund_symbol is not null and price_date is not null
+            qualify row_number() over (
+                partition by fund_symbol, price_date order by {_source_order(paths)}
+            ) = 1
+        )
+        select incoming.*
+        from incoming
+        anti join main.{table} as loaded
+            using (fund_symbol, price_date)
+        """
+    ).fetchone()[0]
+    return inserted
+
+
+def load_funds(con, table: str, paths: list) -> int:
+    """Replace the snapshot rows of the funds found in the files.
+
+    Args:
+        con: A writable database connection object.
+        table: "etfs" or "mutual_funds".
+        paths: The CSV or Parquet files (or globs) to load.
+
+    Returns:
+        The number of loaded funds.
+    """
+    con.execute(
+        f"""
+        create or replace temp table incoming_funds as
+        select * exclude ({_source_columns(paths)})
+        from {_reader(paths, FUND_COLUMN_TYPES[table])}
+        where fund_symbol is not null
+        qualify row_number() over (
+            partition by fund_symbol order by {_source_order(paths)}
+        ) = 1
+        """
+    )
+    table_exists = con.execute(
+        "select count(*) from duckdb_tables() where schema_name = 'main' and table_name = ?",
+        (table,),
+    ).fetchone()[0]
+    if table_exists:
+        con.execute(
+            f"delete from main.{table} where fund_symbol in (select fund_symbol from incoming_funds)"
+        )
+        con.execute(f"insert into main.{table} by name select * from incoming_funds")
+    else:
+        con.execute(f"create table main.{table} as select * from incoming_funds")
+    loaded = con.execute("select count(*) from incoming_funds").fetchone()[0]
+    con.execute("drop table incoming_funds")
+    return loaded
+
+
+def load_source(database: str, table: str, paths: list) -> int:
+    """Load files into one source table in a single transaction.
+
+    Args:
+        database: The DuckDB database file to load into.
+        table: One of SOURCE_TABLES.
+        paths: The CSV or Parquet files (or globs) to load.
+
+    Returns:
+        The number of inserted price rows, or of loaded funds.
+    """
+    con = duckdb.connect(database=database)
+    try:
+        con.execute("begin transaction")
+        if table in PRICE_COLUMNS:
+            count = load_prices(con, table, paths)
+        else:
+            count = load_funds(con, table, paths)
+        con.execute("commit")
+    except Exception:
+        con.execute("rollback")
+        raise
+    finally:
+        con.close()
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("table", choices=SOURCE_TABLES)
+    parser.add_argument("paths", nargs="+", help="CSV or Parquet files, globs allowed.")
+    parser.add_argument(
+        "--database",
+        required=True,
+        help="Database file to load into, not the one the app serves.",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = load_source(args.database, args.table, args.paths)
+    unit = "rows" if args.table in PRICE_COLUMNS else "funds"
+    print(
+        f"Loaded {count} {unit} into main.{args.table} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+Load test of a fund page with concurrent simulated browser sessions.
+
+    python loadtest.py --sessions 20 --views 5
+    python loadtest.py --sessions 50 --views 3 --think-time 0
+    python loadtest.py --url ws://localhost:8501 --sessions 100
+
+The sessions talk to a real `streamlit run` server over its websocket, like
+browsers, so the numbers are those of one app container: its caches,
+connection pool and price store are shared by the sessions as in production.
+Unless --url is given, the server is started here on --port, with the usage
+log disabled so simulated views do not steer the cache warm-up.
+
+A session loads the page, then views --views funds: it types a symbol in the
+search box, which selects it, and picks a date range in the fund's history.
+Symbols are drawn with a Zipf law over the ETFs, so a few funds get most of
+the views as in the usage log. Date ranges come from the presets users pick
+most (full history, 5 years, 1 year, year to date, 3 months). Between
+interactions a session waits a random think time.
+
+The report gives the p50/p95/p99 latency of each kind of interaction, from
+the widget change to the end of the rerun, the throughput of the whole run,
+and the server's resident memory added per session, which includes what the
+sessions added to the shared caches. To see what the caches are worth,
+compare with a run where they are disabled:
+
+    US_FUNDS_RESULT_CACHE_MB=0 US_FUNDS_FIGURE_CACHE_MB=0 python loadtest.py
+
+The websocket client needs the websockets package (`pip install websockets`).
+"""
+
+import argparse
+import asyncio
+import datetime
+import importlib.util
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetStates
+
+from queries import connect_to_db, get_fund_universe
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_START_TIMEOUT_SECONDS = 60
+RERUN_TIMEOUT_SECONDS = 120
+PERCENTILES = [50, 95, 99]
+
+SEARCH_LABEL = "Search funds"
+DATE_RANGE_LABEL = "Select Date Range"
+
+# Date ranges users pick, with their relative frequency
+DATE_RANGE_PRESETS = {
+    "full": 0.35,
+    "5 years": 0.15,
+    "1 year": 0.25,
+    "year to date": 0.15,
+    "3 months": 0.10,
+}
+
+
+def get_rss_bytes(pid: int):
+    """
+    Returns the resident memory of a process, or None where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def get_date_range(preset: str, first_date, last_date) -> tuple:
+    """
+    Returns the (start, end) dates of a date range preset within a fund's history.
+
+    Parameters:
+        preset (str): A key of DATE_RANGE_PRESETS.
+        first_date (datetime.date): The fund's first price date.
+        last_date (datetime.date): The fund's last price date.
+
+    Returns:
+        tuple: The start and end dates.
+    """
+    if preset == "full":
+        start = first_date
+    elif preset == "year to date":
+        start = datetime.date(last_date.year, 1, 1)
+    else:
+        count, unit = preset.split()
+        days = int(count) * (365 if unit == "years" else 30)
+        start = last_date - datetime.timedelta(days=days)
+    return max(start, first_date), last_date
+
+
+class BrowserSession:
+    """
+    One simulated browser tab connected to the app server.
+
+    Widget values are kept by label and sent with the ids of the last rerun,
+    because the id of a widget changes with its parameters (e.g. the bounds
+    of the date range when another fund is selected).
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.widgets = {}
+        self.values = {}
+
+    def get_widget_states(self) -> WidgetStates:
+        """
+        Returns the widget values to send, for the widgets of the last rerun.
+        """
+        states = WidgetStates()
+        for label, (field, value) in self.values.items():
+            if label not in self.widgets:
+                continue
+            state = states.widgets.add(id=self.widgets[label].id)
+            if field == "string_array_value":
+                state.string_array_value.data.extend(value)
+            else:
+                setattr(state, field, value)
+        return states
+
+    async def rerun(self) -> bool:
+        """
+        Sends the widget values and waits for the end of the rerun.
+
+        Returns:
+            bool: True if the page raised an exception.
+        """
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.widget_states.CopyFrom(self.get_widget_states())
+        await self.websocket.send(message.SerializeToString())
+
+        self.widgets = {}
+        failed = False
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "script_finished":
+                return failed
+            if kind != "delta" or forward.delta.WhichOneof("type") != "new_element":
+                continue
+            element = forward.delta.new_element
+            element_type = element.WhichOneof("type")
+            if element_type == "exception":
+                failed = True
+            elif element_type in ("text_input", "date_input"):
+                widget = getattr(element, element_type)
+                self.widgets[widget.label] = widget
+
+    def search(self, symbol: str) -> None:
+        """
+        Types a symbol in the search box, which selects the fund.
+        """
+        self.values[SEARCH_LABEL] = ("string_value", symbol)
+        # The date range of the previous fund does not apply to the new one
+        self.values.pop(DATE_RANGE_LABEL, None)
+
+    def select_date_range(self, rng: random.Random) -> bool:
+        """
+        Picks a date range preset within the bounds of the date range widget.
+
+        Returns:
+            bool: False if the page shows no date range.
+        """
+        date_input = self.widgets.get(DATE_RANGE_LABEL)
+        if date_input is None or not date_input.min or not date_input.max:
+            return False
+        # Older Streamlit versions send the dates as YYYY/MM/DD
+        date_format = "%Y/%m/%d" if "/" in date_input.min else "%Y-%m-%d"
+        first_date, last_date = (
+            datetime.datetime.strptime(d, date_format).date()
+            for d in (date_input.min, date_input.max)
+        )
+        preset = rng.choices(
+            list(DATE_RANGE_PRESETS), weights=list(DATE_RANGE_PRESETS.values())
+        )[0]
+        self.values[DATE_RANGE_LABEL] = (
+            "string_array_value",
+            [
+                d.strftime(date_format)
+                for d in get_date_range(preset, first_date, last_date)
+            ],
+        )
+        return True
+
+
+async def timed_rerun(session: BrowserSession, timings: list, kind: str) -> None:
+    """
+    Reruns the page of a session and records its latency.
+
+    Parameters:
+        session (BrowserSession): The session, with its new widget values set.
+        timings (list): The (kind, seconds, failed) tuples of the run.
+        kind (str): The name of the interaction in the report.
+    """
+    start = time.perf_counter()
+    failed = await asyncio.wait_for(session.rerun(), RERUN_TIMEOUT_SECONDS)
+    timings.append((kind, time.perf_counter() - start, failed))
+
+
+async def run_session(url: str, scenario: dict, seed: int, timings: list) -> None:
+    """
+    Runs one simulated session, then stays connected until every session is done.
+
+    The open sessions keep their server-side state, so the memory measured at
+    the end of the run includes it.
+
+    Parameters:
+        url (str): The websocket URL of the app server.
+        scenario (dict): The symbols and weights to draw from, the views, the
+            think time, and the events coordinating the sessions.
+        seed (int): Seed of the session's random choices.
+        timings (list): The (kind, seconds, failed) tuples of the run.
+    """
+    import websockets
+
+    rng = random.Random(seed)
+
+    async def think():
+        if scenario["think_time"]:
+            await asyncio.sleep(rng.expovariate(1 / scenario["think_time"]))
+
+    async with websockets.connect(f"{url}/_stcore/stream", max_size=None) as ws:
+        session = BrowserSession(ws)
+        try:
+            await timed_rerun(session, timings, "page load")
+            for _ in range(scenario["views"]):
+                await think()
+                symbol = rng.choices(scenario["symbols"], scenario["weights"])[0]
+                session.search(symbol)
+                await timed_rerun(session, timings, "search")
+                await think()
+                if session.select_date_range(rng):
+                    await timed_rerun(session, timings, "date range")
+        finally:
+            scenario["on_session_done"]()
+        await scenario["closing"].wait()
+
+
+async def run_sessions(url: str, symbols: list, args, server_pid) -> tuple:
+    """
+    Runs the simulated sessions concurrently.
+
+    Returns:
+        tuple: The timings, the wall time in seconds, and the server's
+        resident memory before and after the sessions (None if unknown).
+    """
+    # Zipf weights over a shuffled universe, the popular funds are arbitrary
+    symbols = list(symbols)
+    random.Random(args.seed).shuffle(symbols)
+    sessions_left = [args.sessions]
+    all_done = asyncio.Event()
+
+    def on_session_done():
+        sessions_left[0] -= 1
+        if sessions_left[0] == 0:
+            all_done.set()
+
+    scenario = {
+        "symbols": symbols,
+        "weights": list(1 / np.arange(1, len(symbols) + 1)),
+        "views": args.views,
+        "think_time": args.think_time,
+        "on_session_done": on_session_done,
+        "closing": asyncio.Event(),
+    }
+    timings = []
+    rss_before = get_rss_bytes(server_pid) if server_pid else None
+    start = time.perf_counter()
+    tasks = [
+        asyncio.create_task(run_session(url, scenario, args.seed + i, timings))
+        for i in range(args.sessions)
+    ]
+    # A session failing to connect must not leave the others waiting
+    await asyncio.wait(
+        [asyncio.create_task(all_done.wait()), *tasks],
+        return_when=asyncio.FIRST_COMPLETED,
+    )
+    elapsed = time.perf_counter() - start
+    rss_after = get_rss_bytes(server_pid) if server_pid else None
+    scenario["closing"].set()
+    await asyncio.gather(*tasks)
+    return timings, elapsed, (rss_before, rss_after)
+
+
+def start_server(app: str, port: int) -> subprocess.Popen:
+    """
+    Starts the app server on a localhost port and waits until it is healthy.
+
+    The server gets one page load before the run, so the modules the page
+    imports are not counted as session memory.
+    """
+    env = dict(os.environ, US_FUNDS_USAGE_LOG=os.devnull)
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "streamlit",
+            "run",
+            os.path.join(APP_DIR, app),
+            "--server.address=127.0.0.1",
+            f"--server.port={port}",
+            "--server.headless=true",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+    while True:
+        try:
+            with urllib.request.urlopen(
+                f"http://127.0.0.1:{port}/_stcore/health"
+            ) as response:
+                if response.status == 200:
+                    break
+        except OSError:
+            pass
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            raise RuntimeError(f"The app server did not start on port {port}.")
+        time.sleep(0.5)
+    asyncio.run(warm_up_server(f"ws://127.0.0.1:{port}"))
+    return server
+
+
+async def warm_up_server(url: str) -> None:
+    """
+    Loads the page once, outside of the measured run.
+    """
+    import websockets
+
+    async with websockets.connect(f"{url}/_stcore/stream", max_size=None) as ws:
+        await asyncio.wait_for(BrowserSession(ws).rerun(), RERUN_TIMEOUT_SECONDS)
+
+
+def print_report(timings: list, elapsed: float, sessions: int, memory: tuple) -> None:
+    """
+    Prints the latency percentiles, throughput and memory of a run.
+
+    Parameters:
+        timings (list): The (kind, seconds, failed) tuples of every session.
+        elapsed (float): The wall time of the run in seconds.
+        sessions (int): The number of sessions.
+        memory (tuple): The server's resident memory before and after the run,
+            in bytes, or None when it is not known.
+    """
+    by_kind = defaultdict(list)
+    for kind, seconds, _ in timings:
+        by_kind[kind].append(seconds)
+    by_kind["all"] = [seconds for _, seconds, _ in timings]
+    header = "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES)
+    print(f"{'interaction':<14}{'count':>7}{header}")
+    for kind, seconds in by_kind.items():
+        values = np.percentile(seconds, PERCENTILES) * 1e3
+        print(f"{kind:<14}{len(seconds):>7}" + "".join(f"{v:10.0f}" for v in values))
+    failed = sum(1 for _, _, f in timings if f)
+    print()
+    print(
+        f"{sessions} sessions, {len(timings)} interactions in {elapsed:.1f} s: "
+        f"{len(timings) / elapsed:.1f} interactions/s, {failed} with exceptions"
+    )
+    rss_before, rss_after = memory
+    if rss_before is None or rss_after is None:
+        print("server memory: unknown (only measured for a local server on Linux)")
+        return
+    print(
+        f"server memory {rss_before / 2**20:.0f} MB -> {rss_after / 2**20:.0f} MB, "
+        f"{(rss_after - rss_before) / sessions / 2**20:.1f} MB per session"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument(
+        "--views", type=int, default=5, help="Funds viewed by each session."
+    )
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=1.0,
+        help="Mean seconds between the interactions of a session, 0 for none.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app", default="etf_app.py")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument(
+        "--url", help="Websocket URL of a running server, e.g. ws://localhost:8501."
+    )
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("websockets") is None:
+        parser.error("The sessions need the websockets package, install it first.")
+    con = connect_to_db()
+    symbols = get_fund_universe(con, "etf")["fund_symbol"].tolist()
+    con.close()
+    if not symbols:
+        parser.error("The database has no ETF to view.")
+
+    server = None if args.url else start_server(args.app, args.port)
+    url = args.url or f"ws://127.0.0.1:{args.port}"
+    try:
+        timings, elapsed, memory = asyncio.run(
+            run_sessions(url, symbols, args, server.pid if server else None)
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print_report(timings, elapsed, args.sessions, memory)
+
+
+if __name__ == "__main__":
+    main()
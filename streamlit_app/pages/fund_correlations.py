@@ -0,0 +1,116 @@
+import streamlit as st
+import pandas as pd
+from utils import create_heatmap_chart
+from queries import (
+    connect_to_db,
+    get_fund_universe,
+    get_price_date_range,
+    search_funds,
+)
+from correlations import (
+    cluster_order,
+    get_correlations,
+    get_most_similar_funds,
+    get_window_dates,
+)
+
+# Streamlit page configuration
+st.set_page_config(layout="wide")
+st.title("📈 US-funds stats | Fund correlations")
+
+FUND_SEARCH_RESULTS = 50
+MOST_SIMILAR_FUNDS = 20
+HEATMAP_FUNDS = 30
+
+UNIVERSES = {"ETFs": "etf", "Mutual funds": "mutual_fund", "All funds": None}
+WINDOWS = {"1 year": 1, "3 years": 3, "5 years": 5, "Full history": None}
+
+con = connect_to_db(lazy=True)
+
+
+def display_correlations(con):
+    """Display the most similar funds and the correlation heatmap of a fund.
+
+    Args:
+        con: The database connection object.
+    """
+    universe_name = st.sidebar.selectbox("Universe", list(UNIVERSES))
+    fund_type = UNIVERSES[universe_name]
+    window = st.sidebar.selectbox("Window", list(WINDOWS), index=1)
+
+    search_text = st.sidebar.text_input(
+        "Search funds", placeholder="Symbol, name or fund family"
+    )
+    df_matches = search_funds(con, search_text, FUND_SEARCH_RESULTS, fund_type)
+    if df_matches.empty:
+        st.write("No funds found.")
+        return
+    fund_names = dict(zip(df_matches["fund_symbol"], df_matches["fund_short_name"]))
+    selected_symbol = st.sidebar.selectbox(
+        "Fund Symbol",
+        df_matches["fund_symbol"],
+        format_func=lambda symbol: f"{symbol} | {fund_names[symbol]}",
+    )
+
+    df_universe = get_fund_universe(con, fund_type)
+    last_date = pd.to_datetime(get_price_date_range(con)["max_date"].iloc[0]).date()
+    start_date, end_date = get_window_dates(last_date, WINDOWS[window])
+    universe = tuple(df_universe["fund_symbol"])
+
+    df_similar = get_most_similar_funds(
+        con, selected_symbol, universe, start_date, end_date, MOST_SIMILAR_FUNDS
+    )
+    if df_similar.empty:
+        st.write(
+            f"{selected_symbol} does not have enough price history over the window."
+        )
+        return
+
+    st.write(
+        f"Daily return correlations of {universe_name.lower()} "
+        f"between {start_date if WINDOWS[window] else 'the first price date'} and {end_date}"
+    )
+    st.header("Most Similar Funds")
+    st.dataframe(
+        df_similar.merge(
+            df_universe[["fund_symbol", "fund_short_name"]], on="fund_symbol"
+        ),
+        column_config={
+            "fund_symbol": "Fund Symbol",
+            "fund_short_name": "Fund Name",
+            "correlation": st.column_config.ProgressColumn(
+                "Correlation", format="%.3f", min_value=-1, max_value=1
+            ),
+        },
+        column_order=["fund_symbol", "fund_short_name", "correlation"],
+        hide_index=True,
+    )
+
+    st.header("Correlation Heatmap")
+    heatmap_symbols = [selected_symbol] + df_similar["fund_symbol"].tolist()[
+        : HEATMAP_FUNDS - 1
+    ]
+    correlations = get_correlations(
+        con, universe, start_date, end_date, heatmap_symbols
+    )
+    order = cluster_order(correlations.correlation)
+    labels = [correlations.symbols[i] for i in order]
+    st.plotly_chart(
+        create_heatmap_chart(
+            correlations.correlation[order][:, order],
+            labels,
+            f"{selected_symbol} and its most similar funds, clustered",
+        )
+    )
+
+    with st.expander("Annualized covariance"):
+        st.dataframe(
+            pd.DataFrame(
+                correlations.covariance()[order][:, order],
+                index=labels,
+                columns=labels,
+            )
+        )
+
+
+display_correlations(con)
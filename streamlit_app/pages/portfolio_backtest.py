@@ -0,0 +1,187 @@
+import streamlit as st
+import datetime
+import numpy as np
+import pandas as pd
+from utils import create_line_chart
+from queries import connect_to_db, search_funds
+from backtest import (
+    REBALANCE_FREQUENCIES,
+    read_baskets,
+    run_backtest,
+    run_backtests,
+)
+from returns import get_aligned_returns
+
+# Streamlit page configuration
+st.set_page_config(layout="wide")
+st.title("📈 US-funds stats | Portfolio backtest")
+
+FUND_SEARCH_RESULTS = 50
+
+STAT_LABELS = {
+    "total_return": "Total return",
+    "annual_return": "Annual return",
+    "annual_volatility": "Annual volatility",
+    "sharpe_ratio": "Sharpe ratio",
+    "max_drawdown": "Max drawdown",
+    "rebalances": "Rebalances",
+    "annual_turnover": "Annual turnover",
+}
+
+con = connect_to_db(lazy=True)
+
+
+def select_basket(con) -> dict:
+    """Display the sidebar basket builder.
+
+    Args:
+        con: The database connection object.
+
+    Returns:
+        The target weights of the basket, in percent.
+    """
+    search_text = st.sidebar.text_input(
+        "Search funds", placeholder="Symbol, name or fund family"
+    )
+    df_matches = search_funds(con, search_text, FUND_SEARCH_RESULTS)
+    # Keep the funds already in the basket selectable whatever the search
+    options = list(
+        dict.fromkeys(
+            st.session_state.get("basket_symbols", [])
+            + df_matches["fund_symbol"].tolist()
+        )
+    )
+    symbols = st.sidebar.multiselect("Funds", options, key="basket_symbols")
+
+    weights = {}
+    for symbol in symbols:
+        # The default weight is seeded in the session state, not passed as
+        # `value`: the widget's ID includes its value, so a default depending
+        # on the number of funds would reset every typed weight when a fund
+        # is added
+        key = f"basket_weight_{symbol}"
+        st.session_state.setdefault(key, round(100 / len(symbols), 2))
+        weights[symbol] = st.sidebar.number_input(
+            f"{symbol} weight (%)",
+            min_value=0.0,
+            max_value=100.0,
+            step=1.0,
+            key=key,
+        )
+    return weights
+
+
+def display_backtest(con, weights: dict):
+    """Display the equity curve, drawdowns and statistics of a basket.
+
+    Args:
+        con: The database connection object.
+        weights: The target weights of the basket.
+    """
+    aligned = get_aligned_returns(con, weights).select(sorted(weights))
+    if len(aligned.dates) == 0:
+        st.write("The selected funds have no price history in common.")
+        return
+    min_date, max_date = aligned.dates[[0, -1]].astype(object)
+
+    date_selection = st.sidebar.date_input(
+        "Select Date Range",
+        value=(min_date, max_date),
+        min_value=min_date,
+        max_value=max_date,
+    )
+    if not (isinstance(date_selection, tuple) and len(date_selection) == 2):
+        st.error("Please select a valid date range.")
+        return
+    start_date, end_date = date_selection
+    rebalance = st.sidebar.selectbox(
+        "Rebalancing",
+        REBALANCE_FREQUENCIES,
+        index=REBALANCE_FREQUENCIES.index("monthly"),
+    )
+
+    try:
+        result = run_backtest(con, weights, start_date, end_date, rebalance)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if len(result.dates) == 0:
+        st.write("No prices in the selected date range.")
+        return
+
+    st.write(f"Selected Date Range: {start_date} - {end_date}")
+    cols = st.columns(len(STAT_LABELS))
+    for col, (stat, label) in zip(cols, STAT_LABELS.items()):
+        value = result.stats[stat]
+        if stat == "rebalances":
+            col.metric(label, value)
+        elif stat == "sharpe_ratio":
+            col.metric(label, f"{value:.2f}")
+        else:
+            col.metric(label, f"{value:.2%}")
+
+    dates = result.dates.astype("datetime64[ns]")
+    st.plotly_chart(
+        create_line_chart(
+            dates, {"Basket": result.equity}, "Equity Curve", "Value of 1 invested"
+        )
+    )
+    st.plotly_chart(
+        create_line_chart(
+            dates, {"Basket": result.drawdown}, "Drawdown", "Drawdown", ".0%"
+        )
+    )
+    rebalance_days = np.flatnonzero(result.turnover)
+    if len(rebalance_days):
+        st.subheader("Turnover by Rebalance")
+        st.dataframe(
+            pd.DataFrame(
+                {
+                    "Date": dates[rebalance_days],
+                    "Turnover": result.turnover[rebalance_days],
+                }
+            ),
+            column_config={"Turnover": st.column_config.NumberColumn(format="%.4f")},
+            hide_index=True,
+        )
+
+
+def display_batch(con):
+    """Display the batch backtest of baskets uploaded as CSV.
+
+    Args:
+        con: The database connection object.
+    """
+    st.header("Batch Backtest")
+    st.text("Upload a CSV file with the columns basket, fund_symbol and weight.")
+    uploaded = st.file_uploader("Baskets", type="csv")
+    rebalance = st.selectbox(
+        "Batch rebalancing",
+        REBALANCE_FREQUENCIES,
+        index=REBALANCE_FREQUENCIES.index("monthly"),
+    )
+    if uploaded is None:
+        return
+    try:
+        baskets = read_baskets(uploaded)
+        df_stats = run_backtests(
+            con, baskets, datetime.date.min, datetime.date.max, rebalance
+        )
+    except (KeyError, ValueError) as e:
+        st.error(f"Invalid baskets file: {e}")
+        return
+    st.dataframe(df_stats.rename(columns=STAT_LABELS))
+    st.download_button(
+        "Download",
+        df_stats.to_csv().encode(),
+        file_name="backtests.csv",
+        mime="text/csv",
+    )
+
+
+weights = select_basket(con)
+if weights:
+    display_backtest(con, weights)
+else:
+    st.write("Select funds in the sidebar to backtest a basket.")
+display_batch(con)
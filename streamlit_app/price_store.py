@@ -0,0 +1,413 @@
+"""
+Shared, memory-mapped store of the fund prices.
+
+Each data version's price tables are written once to .npy files: one
+contiguous array per column, rows sorted by fund symbol then date, plus the
+offsets of each fund's rows. The files are then memory-mapped read-only, so
+every session, and every process on the host, reads the same pages from the
+OS page cache, and a fund's series is a view of the arrays:
+
+    price_store/<data version>.v<layout>/etfs/{symbols,offsets,price_date,open,...}.npy
+    price_store/<data version>.v<layout>/etfs_weekly/...
+    price_store/<data version>.v<layout>/etfs_monthly/...
+    price_store/<data version>.v<layout>/etfs_quarterly/...
+    price_store/<data version>.v<layout>/mutual_funds/{symbols,offsets,price_date,nav_per_share}.npy
+
+The weekly, monthly and quarterly tables are OHLCV tiles of the ETF prices,
+labelled by the first day of the period, so a chart over decades reads a few
+hundred rows instead of every day. Date ranges are cut with a binary search
+on the fund's dates, without copying. Stores are written when a snapshot is
+built (see snapshots.py), or on first use otherwise.
+
+    python price_store.py build
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+
+import duckdb
+import numpy as np
+
+from queries import connect_to_db, get_data_version
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRICE_STORE_DIR = os.environ.get(
+    "US_FUNDS_PRICE_STORE_DIR", os.path.join(REPO_ROOT, "price_store")
+)
+PRICE_STORE_BATCH_ROWS = 1_000_000
+# Bumped when the tables or files of a store change, so older stores are rebuilt
+PRICE_STORE_LAYOUT = 2
+
+ETF_PRICE_COLUMNS = ["open", "high", "low", "close", "adj_close", "volume"]
+
+# Periods of the ETF price tiles, and DuckDB's name for them
+TILE_RESOLUTIONS = {"weekly": "week", "monthly": "month", "quarterly": "quarter"}
+
+# Average number of calendar days per point at each chart resolution
+RESOLUTION_DAYS = {
+    "daily": 365.25 / 252,
+    "weekly": 7,
+    "monthly": 365.25 / 12,
+    "quarterly": 365.25 / 4,
+}
+MAX_CHART_POINTS = int(os.environ.get("US_FUNDS_MAX_CHART_POINTS", "1000"))
+
+
+def _daily_prices(table: str, columns: list) -> str:
+    return f"""
+        SELECT fund_symbol, price_date, {", ".join(columns)}
+        FROM "us-funds-project".{table}
+        WHERE fund_symbol IS NOT NULL AND price_date IS NOT NULL
+    """
+
+
+def _price_tiles(period: str) -> str:
+    return f"""
+        SELECT
+            fund_symbol,
+            date_trunc('{period}', price_date)::date AS price_date,
+            arg_min(open, price_date) AS open,
+            max(high) AS high,
+            min(low) AS low,
+            arg_max(close, price_date) AS close,
+            arg_max(adj_close, price_date) AS adj_close,
+            sum(volume) AS volume
+        FROM "us-funds-project".main_etfs.fact_etfs
+        WHERE fund_symbol IS NOT NULL AND price_date IS NOT NULL
+        GROUP BY ALL
+    """
+
+
+# Query and value columns of each table of the store
+PRICE_TABLES = {
+    "etfs": (
+        _daily_prices("main_etfs.fact_etfs", ETF_PRICE_COLUMNS),
+        ETF_PRICE_COLUMNS,
+    ),
+    **{
+        f"etfs_{resolution}": (_price_tiles(period), ETF_PRICE_COLUMNS)
+        for resolution, period in TILE_RESOLUTIONS.items()
+    },
+    "mutual_funds": (
+        _daily_prices("main_mutual_funds.fact_mutual_funds", ["nav_per_share"]),
+        ["nav_per_share"],
+    ),
+}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class PriceSeries:
+    """
+    Daily prices of one fund, as read-only views of the store's arrays.
+
+    Columns are read with `series["close"]`, like DataFrame columns, so the
+    chart builders accept a series or a DataFrame.
+    """
+
+    def __init__(self, symbol: str, columns: dict):
+        self.symbol = symbol
+        self.columns = columns
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def __len__(self) -> int:
+        return len(self.columns["price_date"])
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    def adjusted_price(self) -> np.ndarray:
+        """
+        Returns the adjusted close of an ETF, or the NAV per share of a mutual fund.
+        """
+        if "adj_close" in self.columns:
+            return self.columns["adj_close"]
+        return self.columns["nav_per_share"]
+
+    def between(self, start_date, end_date) -> "PriceSeries":
+        """
+        Returns the rows between two dates (both included), without copying.
+        """
+        dates = self.columns["price_date"]
+        start = np.searchsorted(dates, np.datetime64(start_date, "D"), "left")
+        stop = np.searchsorted(dates, np.datetime64(end_date, "D"), "right")
+        return PriceSeries(
+            self.symbol, {c: v[start:stop] for c, v in self.columns.items()}
+        )
+
+
+class PriceTable:
+    """Memory-mapped columns of one price table, indexed by fund symbol."""
+
+    def __init__(self, directory: str, columns: list):
+        self.symbols = np.load(os.path.join(directory, "symbols.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        # Empty files cannot be memory-mapped
+        mmap_mode = "r" if self.offsets[-1] else None
+        self.columns = {
+            c: np.load(os.path.join(directory, f"{c}.npy"), mmap_mode=mmap_mode)
+            for c in ["price_date", *columns]
+        }
+
+    def get_series(self, symbol: str):
+        """
+        Returns the price series of a fund, or None if the table has no rows for it.
+        """
+        position = np.searchsorted(self.symbols, symbol)
+        if position == len(self.symbols) or self.symbols[position] != symbol:
+            return None
+        start, stop = self.offsets[position], self.offsets[position + 1]
+        return PriceSeries(symbol, {c: v[start:stop] for c, v in self.columns.items()})
+
+
+class PriceStore:
+    """The price tables of one data version."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.tables = {
+            kind: PriceTable(os.path.join(directory, kind), columns)
+            for kind, (_, columns) in PRICE_TABLES.items()
+        }
+
+    def get_series(self, symbol: str, kind: str = None):
+        """
+        Returns the price series of a fund.
+
+        Parameters:
+            symbol (str): The fund symbol.
+            kind (str): "etfs" or "mutual_funds", None to look in both.
+
+        Returns:
+            PriceSeries: The fund's prices, or None for an unknown fund.
+        """
+        for table_kind in ("etfs", "mutual_funds"):
+            if kind in (None, table_kind):
+                table = self.tables[table_kind]
+                series = table.get_series(symbol)
+                if series is not None:
+                    return series
+        return None
+
+    def get_tile(self, symbol: str, start_date, end_date, resolution: str = "daily"):
+        """
+        Returns the ETF prices over a date range at a resolution, without copying.
+
+        Parameters:
+            symbol (str): The ETF symbol.
+            start_date: First day of the range.
+            end_date: Last day of the range.
+            resolution (str): "daily" or one of TILE_RESOLUTIONS.
+
+        Returns:
+            PriceSeries: The daily prices, or the periods overlapping the range. None for an unknown fund.
+        """
+        kind = "etfs" if resolution == "daily" else f"etfs_{resolution}"
+        series = self.tables[kind].get_series(symbol)
+        if series is None:
+            return None
+        if resolution != "daily":
+            # Periods are labelled by their first day, keep the one containing start_date
+            dates = series["price_date"]
+            first = np.searchsorted(dates, np.datetime64(start_date, "D"), "right") - 1
+            if first >= 0:
+                start_date = dates[first]
+        return series.between(start_date, end_date)
+
+
+def choose_resolution(start_date, end_date) -> str:
+    """
+    Returns the finest chart resolution showing a date range in at most MAX_CHART_POINTS points.
+    """
+    days = (end_date - start_date).days + 1
+    for resolution, period_days in RESOLUTION_DAYS.items():
+        if days / period_days <= MAX_CHART_POINTS:
+            return resolution
+    return "quarterly"
+
+
+def write_price_table(con, directory: str, query: str, columns: list) -> None:
+    """
+    Writes one price table to .npy files, streaming it in record batches.
+
+    Parameters:
+        con: The database connection object.
+        directory (str): Directory to write the files to.
+        query (str): Query of fund_symbol, price_date and the value columns.
+        columns (list): The value columns to store.
+    """
+    os.makedirs(directory)
+    source = f"({query})"
+    df_counts = con.execute(
+        f"""
+        SELECT fund_symbol, count(*) AS n_rows
+        FROM {source}
+        GROUP BY fund_symbol
+        ORDER BY fund_symbol
+        """
+    ).df()
+    np.save(
+        os.path.join(directory, "symbols.npy"),
+        df_counts["fund_symbol"].to_numpy(dtype=str),
+    )
+    offsets = np.concatenate(
+        [[0], np.cumsum(df_counts["n_rows"].to_numpy(dtype=np.int64))]
+    )
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+
+    reader = con.execute(
+        f"""
+        SELECT price_date, {", ".join(columns)}
+        FROM {source}
+        ORDER BY fund_symbol, price_date
+        """
+    ).fetch_record_batch(PRICE_STORE_BATCH_ROWS)
+    arrays = {}
+    for column in reader.schema.names:
+        dtype = "datetime64[D]" if column == "price_date" else np.float64
+        path = os.path.join(directory, f"{column}.npy")
+        if offsets[-1]:
+            arrays[column] = np.lib.format.open_memmap(
+                path, mode="w+", dtype=dtype, shape=(int(offsets[-1]),)
+            )
+        else:
+            np.save(path, np.empty(0, dtype=dtype))
+    position = 0
+    for batch in reader:
+        for column, values in zip(batch.schema.names, batch.columns):
+            values = values.to_numpy(zero_copy_only=False)
+            if column != "price_date":
+                values = values.astype(np.float64)
+            arrays[column][position : position + len(batch)] = values
+        position += len(batch)
+    for array in arrays.values():
+        array.flush()
+
+
+def build_price_store(con, directory: str) -> None:
+    """
+    Writes the price tables of a database to a store directory.
+
+    The store is written to a temporary directory renamed into place, so a
+    store directory that exists is always complete. If another process built
+    the same store meanwhile, its copy is kept.
+
+    Parameters:
+        con: The database connection object.
+        directory (str): The store directory of the data version.
+    """
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    building = tempfile.mkdtemp(prefix=".building-", dir=parent)
+    try:
+        for kind, (query, columns) in PRICE_TABLES.items():
+            write_price_table(con, os.path.join(building, kind), query, columns)
+        os.rename(building, directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+    finally:
+        shutil.rmtree(building, ignore_errors=True)
+
+
+def get_store_directory(data_version: str) -> str:
+    """
+    Returns the directory of the price store of a data version.
+    """
+    return os.path.join(PRICE_STORE_DIR, f"{data_version}.v{PRICE_STORE_LAYOUT}")
+
+
+def prune_price_stores(keep: list) -> None:
+    """
+    Deletes the stores of data versions older than the kept ones.
+
+    Stores written after the kept ones, e.g. by a snapshot build that is not
+    published yet, are left alone. Sessions still reading a deleted store keep
+    their memory maps, the files are only freed once they are closed.
+
+    Parameters:
+        keep (list): The data versions to keep.
+    """
+    if not os.path.isdir(PRICE_STORE_DIR):
+        return
+    kept = [get_store_directory(v) for v in keep]
+    kept_since = min(
+        (os.path.getmtime(d) for d in kept if os.path.isdir(d)), default=0.0
+    )
+    for name in os.listdir(PRICE_STORE_DIR):
+        path = os.path.join(PRICE_STORE_DIR, name)
+        if (
+            path not in kept
+            and not name.startswith(".building-")
+            and os.path.getmtime(path) < kept_since
+        ):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build_price_store_of_database(db_path: str, data_version: str) -> str:
+    """
+    Writes the price store of a database file, unless it already exists.
+
+    Parameters:
+        db_path (str): The DuckDB database file.
+        data_version (str): The data version the app will see for this file.
+
+    Returns:
+        str: The store directory.
+    """
+    directory = get_store_directory(data_version)
+    if not os.path.isdir(directory):
+        con = duckdb.connect(database=db_path, read_only=True)
+        try:
+            build_price_store(con, directory)
+        finally:
+            con.close()
+    return directory
+
+
+def get_price_store(con) -> PriceStore:
+    """
+    Returns the price store of the connection's data version, building it on first use.
+
+    Parameters:
+        con: The database connection object.
+
+    Returns:
+        PriceStore: The memory-mapped price tables.
+    """
+    data_version = get_data_version(con)
+    with _stores_lock:
+        store = _stores.get(data_version)
+        if store is None:
+            directory = get_store_directory(data_version)
+            if not os.path.isdir(directory):
+                build_price_store(con, directory)
+            store = PriceStore(directory)
+            # Keep the previous version only, for sessions still reading it
+            for version in list(_stores)[:-1]:
+                del _stores[version]
+            _stores[data_version] = store
+            prune_price_stores(list(_stores))
+    return store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="Write the store of the served database.")
+    parser.parse_args()
+
+    con = connect_to_db()
+    store = get_price_store(con)
+    print(f"Price store of data version {get_data_version(con)}: {store.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,143 +1,386 @@
 import os
+import functools
+import inspect
+import threading
 import duckdb
 import pandas as pd
+from typing import NamedTuple
+from cache import get_or_load_result
+from snapshots import get_snapshot_of_path, resolve_db_path
 
+# One read-only connection per database file. Sessions get their own cursor,
+# which keeps the file open until the session releases it, so replacing the
+# pooled connection when a new snapshot is published lets the old one drain.
+_pool = {}
+_pool_lock = threading.Lock()
 
-def connect_to_db():
-    # Get the current script directory
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # Construct the path to the database file relative to the current script
-    db_path = os.path.join(current_dir, "..", "us-funds-project.db")
-    return duckdb.connect(database=db_path, read_only=True)
 
+def get_db_path() -> str:
+    return resolve_db_path()
 
-def get_etf_facts(con, selected_symbol: str) -> pd.DataFrame:
+
+def connect_to_db(lazy: bool = False):
+    """Get a cursor on the pooled read-only connection of the served database.
+
+    Args:
+        lazy: Return a `LazyConnection` instead, which only connects when it
+            is first used. Pages use it to render their layout before the
+            database file is opened.
+
+    Returns:
+        A DuckDB cursor, or a LazyConnection standing in for one.
+    """
+    if lazy:
+        return LazyConnection()
+    db_path = get_db_path()
+    with _pool_lock:
+        if db_path not in _pool:
+            _pool.clear()
+            _pool[db_path] = duckdb.connect(database=db_path, read_only=True)
+        return _pool[db_path].cursor()
+
+
+class LazyConnection:
+    """Stand-in for a database cursor that connects on its first use.
+
+    Every attribute (execute, sql, fetchone...) is looked up on the cursor,
+    which is opened with `connect_to_db` the first time one is needed.
+    """
+
+    def __init__(self):
+        self._cursor = None
+
+    def __getattr__(self, name):
+        if self._cursor is None:
+            self._cursor = connect_to_db()
+        return getattr(self._cursor, name)
+
+
+def get_data_version(con=None) -> str:
+    """Get an identifier of the database build.
+
+    The identifier changes with every published snapshot (or every time dbt
+    rewrites the legacy database file), so it can be used in cache keys to
+    drop results computed from an older build.
+
+    Args:
+        con: The database connection object. When given, the version of the
+            database this connection reads from, otherwise the version new
+            connections will open.
+
+    Returns:
+        The snapshot name, or the file's modification time and size.
+    """
+    if con is None:
+        db_path = get_db_path()
+    else:
+        db_path = con.execute(
+            "select path from duckdb_databases() where database_name = 'us-funds-project'"
+        ).fetchone()[0]
+    snapshot = get_snapshot_of_path(db_path)
+    if snapshot is not None:
+        return snapshot
+    stat = os.stat(db_path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def cached_query(func):
+    """Cache the DataFrame returned by a query function for the current database build.
+
+    The key is the function name, its arguments (the connection excluded) and
+    the data version, so results from an older build are never served.
+    Arguments are bound to the parameters with their defaults applied, so a
+    call passing a default explicitly, by position or by name, shares the
+    entry of a call leaving it out.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(con, *args, **kwargs):
+        bound = signature.bind(con, *args, **kwargs)
+        bound.apply_defaults()
+        # Lists of columns are turned into tuples to be hashable
+        key_args = tuple(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in list(bound.arguments.items())[1:]
+        )
+        key = (func.__name__, key_args, get_data_version(con))
+        return get_or_load_result(key, lambda: func(con, *args, **kwargs))
+
+    return wrapper
+
+
+ETF_FACT_COLUMNS = [
+    "fund_symbol",
+    "price_date",
+    "open",
+    "high",
+    "low",
+    "close",
+    "adj_close",
+    "volume",
+    "avg_vol_3month",
+    "avg_vol_10day",
+    "total_net_assets",
+    "day50_moving_average",
+    "day200_moving_average",
+    "week52_high_low_change",
+    "week52_high_low_change_perc",
+    "week52_high",
+    "week52_high_change",
+    "week52_high_change_perc",
+    "week52_low",
+    "week52_low_change",
+    "week52_low_change_perc",
+    "fund_yield",
+    "inception_date",
+    "annual_holdings_turnover",
+    "fund_annual_report_net_expense_ratio",
+    "category_annual_report_net_expense_ratio",
+    "asset_stocks",
+    "asset_bonds",
+    "fund_sector_basic_materials",
+    "fund_sector_communication_services",
+    "fund_sector_consumer_cyclical",
+    "fund_sector_consumer_defensive",
+    "fund_sector_energy",
+    "fund_sector_financial_services",
+    "fund_sector_healthcare",
+    "fund_sector_industrials",
+    "fund_sector_real_estate",
+    "fund_sector_technology",
+    "fund_sector_utilities",
+    "fund_price_book_ratio",
+    "fund_price_cashflow_ratio",
+    "fund_price_earning_ratio",
+    "fund_price_sales_ratio",
+    "fund_bond_maturity",
+    "fund_bond_duration",
+    "fund_bonds_us_government",
+    "fund_bonds_aaa",
+    "fund_bonds_aa",
+    "fund_bonds_a",
+    "fund_bonds_bbb",
+    "fund_bonds_bb",
+    "fund_bonds_b",
+    "fund_bonds_below_b",
+    "fund_bonds_others",
+    "top10_holdings_total_assets",
+    "returns_as_of_date",
+    "fund_return_ytd",
+    "category_return_ytd",
+    "fund_return_1month",
+    "category_return_1month",
+    "fund_return_3months",
+    "category_return_3months",
+    "fund_return_1year",
+    "category_return_1year",
+    "fund_return_3years",
+    "category_return_3years",
+    "fund_return_5years",
+    "category_return_5years",
+    "fund_return_10years",
+    "category_return_10years",
+    "years_up",
+    "years_down",
+    "fund_alpha_3years",
+    "fund_beta_3years",
+    "fund_mean_annual_return_3years",
+    "fund_r_squared_3years",
+    "fund_stdev_3years",
+    "fund_sharpe_ratio_3years",
+    "fund_treynor_ratio_3years",
+    "fund_alpha_5years",
+    "fund_beta_5years",
+    "fund_mean_annual_return_5years",
+    "fund_r_squared_5years",
+    "fund_stdev_5years",
+    "fund_sharpe_ratio_5years",
+    "fund_treynor_ratio_5years",
+    "fund_alpha_10years",
+    "fund_beta_10years",
+    "fund_mean_annual_return_10years",
+    "fund_r_squared_10years",
+    "fund_stdev_10years",
+    "fund_sharpe_ratio_10years",
+    "fund_treynor_ratio_10years",
+]
+
+# Named column sets of the ETF fact table, so callers only read the column
+# segments they use.
+ETF_FACT_PROJECTIONS = {
+    "ohlcv": [
+        "price_date",
+        "open",
+        "high",
+        "low",
+        "close",
+        "adj_close",
+        "volume",
+    ],
+    "summary": [
+        "total_net_assets",
+        "inception_date",
+    ],
+    "valuation": [
+        "fund_price_book_ratio",
+        "fund_price_cashflow_ratio",
+        "fund_price_earning_ratio",
+        "fund_price_sales_ratio",
+    ],
+    "risk": [
+        "fund_alpha_3years",
+        "fund_beta_3years",
+        "fund_mean_annual_return_3years",
+        "fund_r_squared_3years",
+        "fund_stdev_3years",
+        "fund_sharpe_ratio_3years",
+        "fund_treynor_ratio_3years",
+        "fund_alpha_5years",
+        "fund_beta_5years",
+        "fund_mean_annual_return_5years",
+        "fund_r_squared_5years",
+        "fund_stdev_5years",
+        "fund_sharpe_ratio_5years",
+        "fund_treynor_ratio_5years",
+        "fund_alpha_10years",
+        "fund_beta_10years",
+        "fund_mean_annual_return_10years",
+        "fund_r_squared_10years",
+        "fund_stdev_10years",
+        "fund_sharpe_ratio_10years",
+        "fund_treynor_ratio_10years",
+    ],
+    "returns": [
+        "returns_as_of_date",
+        "fund_return_ytd",
+        "category_return_ytd",
+        "fund_return_1month",
+        "category_return_1month",
+        "fund_return_3months",
+        "category_return_3months",
+        "fund_return_1year",
+        "category_return_1year",
+        "fund_return_3years",
+        "category_return_3years",
+        "fund_return_5years",
+        "category_return_5years",
+        "fund_return_10years",
+        "category_return_10years",
+        "years_up",
+        "years_down",
+    ],
+    "bonds": [
+        "fund_bond_maturity",
+        "fund_bond_duration",
+        "fund_bonds_us_government",
+        "fund_bonds_aaa",
+        "fund_bonds_aa",
+        "fund_bonds_a",
+        "fund_bonds_bbb",
+        "fund_bonds_bb",
+        "fund_bonds_b",
+        "fund_bonds_below_b",
+        "fund_bonds_others",
+    ],
+}
+
+# The mutual fund fact table has the same fund-level columns, and its prices
+# are the net asset value per share
+MUTUAL_FUND_FACT_PROJECTIONS = {
+    "nav": ["price_date", "nav_per_share"],
+    **{name: cols for name, cols in ETF_FACT_PROJECTIONS.items() if name != "ohlcv"},
+}
+
+FACT_PROJECTIONS = {
+    "etf": ETF_FACT_PROJECTIONS,
+    "mutual_fund": MUTUAL_FUND_FACT_PROJECTIONS,
+}
+
+
+@cached_query
+def get_etf_facts(con, selected_symbol: str, columns=None) -> pd.DataFrame:
     """Get fact table info about the selected ETF.
 
+    The fact table has one row per price date, and the fund-level metrics are
+    repeated on every row. Projections without price_date therefore return a
+    single row, read from the cheapest up-to-date source (see `plan_query`).
+
     Args:
         con: The database connection object.
         selected_symbol: The symbol for the ETF.
+        columns: A projection name from ETF_FACT_PROJECTIONS, or a tuple of
+            column names. All columns when None.
 
     Returns:
-        A DataFrame with the ETF's basic information.
+        A DataFrame with the requested ETF facts.
     """
-    etf_fact_table_query = """
-              SELECT
-                fund_symbol,
-                price_date,
-                open,
-                high,
-                low,
-                close,
-                adj_close,
-                volume,
-                avg_vol_3month,
-                avg_vol_10day,
-                total_net_assets,
-                day50_moving_average,
-                day200_moving_average,
-                week52_high_low_change,
-                week52_high_low_change_perc,
-                week52_high,
-                week52_high_change,
-                week52_high_change_perc,
-                week52_low,
-                week52_low_change,
-                week52_low_change_perc,
-                fund_yield,
-                inception_date,
-                annual_holdings_turnover,
-                fund_annual_report_net_expense_ratio,
-                category_annual_report_net_expense_ratio,
-                asset_stocks,
-                asset_bonds,
-                fund_sector_basic_materials,
-                fund_sector_communication_services,
-                fund_sector_consumer_cyclical,
-                fund_sector_consumer_defensive,
-                fund_sector_energy,
-                fund_sector_financial_services,
-                fund_sector_healthcare,
-                fund_sector_industrials,
-                fund_sector_real_estate,
-                fund_sector_technology,
-                fund_sector_utilities,
-                fund_price_book_ratio,
-                fund_price_cashflow_ratio,
-                fund_price_earning_ratio,
-                fund_price_sales_ratio,
-                fund_bond_maturity,
-                fund_bond_duration,
-                fund_bonds_us_government,
-                fund_bonds_aaa,
-                fund_bonds_aa,
-                fund_bonds_a,
-                fund_bonds_bbb,
-                fund_bonds_bb,
-                fund_bonds_b,
-                fund_bonds_below_b,
-                fund_bonds_others,
-                top10_holdings_total_assets,
-                returns_as_of_date,
-                fund_return_ytd,
-                category_return_ytd,
-                fund_return_1month,
-                category_return_1month,
-                fund_return_3months,
-                category_return_3months,
-                fund_return_1year,
-                category_return_1year,
-                fund_return_3years,
-                category_return_3years,
-                fund_return_5years,
-                category_return_5years,
-                fund_return_10years,
-                category_return_10years,
-                years_up,
-                years_down,
-                fund_alpha_3years,
-                fund_beta_3years,
-                fund_mean_annual_return_3years,
-                fund_r_squared_3years,
-                fund_stdev_3years,
-                fund_sharpe_ratio_3years,
-                fund_treynor_ratio_3years,
-                fund_alpha_5years,
-                fund_beta_5years,
-                fund_mean_annual_return_5years,
-                fund_r_squared_5years,
-                fund_stdev_5years,
-                fund_sharpe_ratio_5years,
-                fund_treynor_ratio_5years,
-                fund_alpha_10years,
-                fund_beta_10years,
-                fund_mean_annual_return_10years,
-                fund_r_squared_10years,
-                fund_stdev_10years,
-                fund_sharpe_ratio_10years,
-                fund_treynor_ratio_10years
+    if columns is None:
+        columns = ETF_FACT_COLUMNS
+    elif isinstance(columns, str):
+        if columns not in ETF_FACT_PROJECTIONS:
+            raise ValueError(f"Unknown projection '{columns}'.")
+        columns = ETF_FACT_PROJECTIONS[columns]
+    unknown = [c for c in columns if c not in ETF_FACT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fact columns: {', '.join(unknown)}.")
+
+    if "price_date" not in columns and "fund_symbol" not in columns:
+        # Fund-level columns may be read from a one-row-per-fund materialization
+        plan = plan_query(con, columns, "fund", "etf")
+        query = build_fund_fields_query(plan, columns, 1)
+        return con.execute(query, (selected_symbol,)).df().drop(columns="fund_symbol")
+
+    distinct = "" if "price_date" in columns else "DISTINCT"
+    select_list = ",\n                ".join(columns)
+    etf_fact_table_query = f"""
+              SELECT {distinct}
+                {select_list}
               FROM "us-funds-project".main_etfs.fact_etfs
               WHERE fund_symbol=?
           """
     return con.execute(etf_fact_table_query, (selected_symbol,)).df()
 
 
-def get_etf_top_10_holdings(con, selected_symbol: str) -> pd.DataFrame:
+# Mutual funds have no sector table: their sector weights are fact columns
+SECTOR_LABELS = {
+    "fund_sector_basic_materials": "Basic Materials",
+    "fund_sector_communication_services": "Communication Services",
+    "fund_sector_consumer_cyclical": "Consumer Cyclical",
+    "fund_sector_consumer_defensive": "Consumer Defensive",
+    "fund_sector_energy": "Energy",
+    "fund_sector_financial_services": "Financial Services",
+    "fund_sector_healthcare": "Healthcare",
+    "fund_sector_industrials": "Industrials",
+    "fund_sector_real_estate": "Real Estate",
+    "fund_sector_technology": "Technology",
+    "fund_sector_utilities": "Utilities",
+}
+
+HOLDINGS_TABLES = {
+    "etf": "main_etfs.dim_holdings",
+    "mutual_fund": "main_mutual_funds.dim_mutual_funds_holdings",
+}
+
+
+@cached_query
+def get_etf_top_10_holdings(con, selected_symbol: str, fund_type="etf") -> pd.DataFrame:
     """
-    Get top 10 holdings about the selected ETF.
+    Get top 10 holdings about the selected fund.
 
     Args:
         con: The database connection object.
-        selected_symbol: The symbol for the ETF.
+        selected_symbol: The symbol for the fund.
+        fund_type: "etf" or "mutual_fund".
 
     Returns:
-        A DataFrame with the ETF's basic information.
+        A DataFrame with the fund's holdings and their weights.
     """
-    etf_top_10_holdings_query = """
+    etf_top_10_holdings_query = f"""
             select
                 holding_name as Company,
                 (holding_weight * 100) as 'Portfolio Weight in %'
-            from "us-funds-project".main_etfs.dim_holdings
+            from "us-funds-project".{HOLDINGS_TABLES[fund_type]}
             where fund_symbol=?
             order by holding_weight desc
           """
@@ -145,22 +388,26 @@ def get_etf_top_10_holdings(con, selected_symbol: str) -> pd.DataFrame:
     return con.execute(etf_top_10_holdings_query, (selected_symbol,)).df()
 
 
-def get_etf_percentage_of_net_assets(con, selected_symbol: str) -> pd.DataFrame:
+@cached_query
+def get_etf_percentage_of_net_assets(
+    con, selected_symbol: str, fund_type="etf"
+) -> pd.DataFrame:
     """
-    Get top 10 holdings about the selected ETF.
+    Get the share of net assets held by the top 10 holdings of the selected fund.
 
     Args:
         con: The database connection object.
-        selected_symbol: The symbol for the ETF.
+        selected_symbol: The symbol for the fund.
+        fund_type: "etf" or "mutual_fund".
 
     Returns:
-        A DataFrame with the ETF's basic information.
+        A DataFrame with the share of net assets in %.
     """
-    etf_perc_net_assets_query = """
+    etf_perc_net_assets_query = f"""
             select
                 fund_symbol,
                 round((sum(holding_weight) * 100),2) as '% Net assets'
-            from "us-funds-project".main_etfs.dim_holdings
+            from "us-funds-project".{HOLDINGS_TABLES[fund_type]}
             where fund_symbol=?
             group by fund_symbol
           """
@@ -168,17 +415,30 @@ def get_etf_percentage_of_net_assets(con, selected_symbol: str) -> pd.DataFrame:
     return con.execute(etf_perc_net_assets_query, (selected_symbol,)).df()
 
 
-def get_etf_sectors(con, selected_symbol: str) -> pd.DataFrame:
+@cached_query
+def get_etf_sectors(con, selected_symbol: str, fund_type="etf") -> pd.DataFrame:
     """
-    Get sectors about the selected ETF.
+    Get sectors about the selected fund.
 
     Args:
         con: The database connection object.
-        selected_symbol: The symbol for the ETF.
+        selected_symbol: The symbol for the fund.
+        fund_type: "etf" or "mutual_fund".
 
     Returns:
-        A DataFrame with the ETF's basic information.
+        A DataFrame with one row per sector and its weight in %.
     """
+    if fund_type == "mutual_fund":
+        df_fields = get_fund_fields(
+            con, [selected_symbol], list(SECTOR_LABELS), "mutual_fund"
+        )
+        df_sectors = df_fields.drop(columns="fund_symbol").melt(
+            var_name="sector", value_name="Weight in %"
+        )
+        df_sectors["sector"] = df_sectors["sector"].map(SECTOR_LABELS)
+        df_sectors["Weight in %"] = df_sectors["Weight in %"] * 100
+        return df_sectors.sort_values("Weight in %", ascending=False)
+
     etf_sectors_query = """
             select
                 sector,
@@ -191,6 +451,7 @@ def get_etf_sectors(con, selected_symbol: str) -> pd.DataFrame:
     return con.execute(etf_sectors_query, (selected_symbol,)).df()
 
 
+@cached_query
 def get_etf_basic_info(con, selected_symbol: str) -> pd.DataFrame:
     """Get basic info about the selected ETF.
 
@@ -220,22 +481,785 @@ def get_etf_basic_info(con, selected_symbol: str) -> pd.DataFrame:
     return con.execute(etf_basic_info_query, (selected_symbol,)).df()
 
 
-def get_min_max_dates_by_fund(con) -> pd.DataFrame:
+@cached_query
+def get_min_max_dates_by_fund(con, fund_type="etf") -> pd.DataFrame:
     """Get minimum and maximum dates for each fund symbol.
 
     Args:
         con: The database connection object.
+        fund_type: "etf" or "mutual_fund".
 
     Returns:
         A DataFrame with the minimum and maximum dates for each fund symbol.
     """
-    get_dates_by_fund_query = """
+    get_dates_by_fund_query = f"""
                 SELECT 
                     fund_symbol,
                     min(price_date) as min_date,
                     max(price_date) as max_date
-                FROM "us-funds-project".main_etfs.fact_etfs
+                FROM "us-funds-project".{FACT_TABLES[fund_type]}
                 GROUP BY fund_symbol
                 order by fund_symbol
            """
     return con.execute(get_dates_by_fund_query).df()
+
+
+@cached_query
+def get_fund_profile(con, selected_symbol: str, fund_type="etf") -> pd.DataFrame:
+    """Get the page header fields of a fund, already formatted for display.
+
+    A point lookup in main_profiles.fund_profile, built by dbt with one row
+    per fund, so the header never scans the price history.
+
+    Args:
+        con: The database connection object.
+        selected_symbol: The fund symbol.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        A one-row DataFrame, empty for an unknown fund.
+    """
+    fund_profile_query = """
+              SELECT
+                  fund_symbol,
+                  display_name,
+                  fund_short_name,
+                  fund_long_name,
+                  fund_category,
+                  fund_family,
+                  currency,
+                  exchange_code,
+                  exchange_name,
+                  region,
+                  investment_strategy,
+                  inception_date_display,
+                  total_net_assets_display,
+                  first_price_date,
+                  last_price_date
+              FROM "us-funds-project".main_profiles.fund_profile
+              WHERE fund_symbol = ? AND fund_type = ?
+          """
+    return con.execute(fund_profile_query, (selected_symbol, fund_type)).df()
+
+
+@cached_query
+def search_funds(con, search_text: str, k: int = 20, fund_type=None) -> pd.DataFrame:
+    """Search funds by symbol, name or family, tolerating typos.
+
+    Uses the trigram index built by dbt (main_search): funds are ranked by an
+    exact or prefix symbol match first, then by the number of trigrams they
+    share with the search text.
+
+    Args:
+        con: The database connection object.
+        search_text: The text typed by the user.
+        k: The maximum number of funds to return.
+        fund_type: "etf" or "mutual_fund" to search only one kind of fund.
+
+    Returns:
+        A DataFrame with the symbol, short name and type of the best matches.
+    """
+    search_text = search_text.strip()
+    if not search_text:
+        first_funds_query = """
+                SELECT
+                    fund_symbol,
+                    fund_short_name,
+                    fund_type
+                FROM "us-funds-project".main_search.fund_search
+                WHERE (?::varchar IS NULL OR fund_type = ?)
+                ORDER BY fund_symbol
+                LIMIT ?
+           """
+        return con.execute(first_funds_query, (fund_type, fund_type, k)).df()
+
+    search_funds_query = """
+                WITH __query AS (
+                    SELECT '  ' || lower(?) AS padded_text
+                ),
+
+                __query_trigrams AS (
+                    SELECT DISTINCT substring(padded_text, t.i, 3) AS trigram
+                    FROM __query, range(1, length(padded_text) - 1) AS t (i)
+                ),
+
+                __scores AS (
+                    SELECT
+                        fund_symbol,
+                        fund_type,
+                        count(*) AS shared_trigrams
+                    FROM "us-funds-project".main_search.fund_search_trigrams
+                    JOIN __query_trigrams USING (trigram)
+                    WHERE (?::varchar IS NULL OR fund_type = ?)
+                    GROUP BY fund_symbol, fund_type
+                )
+
+                SELECT
+                    fund_symbol,
+                    fs.fund_short_name,
+                    fund_type
+                FROM __scores
+                JOIN "us-funds-project".main_search.fund_search AS fs
+                    USING (fund_symbol, fund_type)
+                ORDER BY
+                    fund_symbol = upper(?) DESC,
+                    starts_with(fund_symbol, upper(?)) DESC,
+                    shared_trigrams DESC,
+                    fund_symbol
+                LIMIT ?
+           """
+    params = (search_text, fund_type, fund_type, search_text, search_text, k)
+    return con.execute(search_funds_query, params).df()
+
+
+@cached_query
+def get_fund_universe(con, fund_type=None) -> pd.DataFrame:
+    """List the funds of the database.
+
+    Args:
+        con: The database connection object.
+        fund_type: "etf" or "mutual_fund" to list only one kind of fund.
+
+    Returns:
+        A DataFrame with the symbol, short name and type of each fund.
+    """
+    fund_universe_query = """
+                SELECT
+                    fund_symbol,
+                    fund_short_name,
+                    fund_type
+                FROM "us-funds-project".main_search.fund_search
+                WHERE (?::varchar IS NULL OR fund_type = ?)
+                ORDER BY fund_symbol
+           """
+    return con.execute(fund_universe_query, (fund_type, fund_type)).df()
+
+
+@cached_query
+def get_price_date_range(con) -> pd.DataFrame:
+    """Get the first and last price dates across ETFs and mutual funds.
+
+    Args:
+        con: The database connection object.
+
+    Returns:
+        A DataFrame with one row of min_date and max_date.
+    """
+    price_date_range_query = """
+                SELECT
+                    min(min_date) AS min_date,
+                    max(max_date) AS max_date
+                FROM (
+                    SELECT min(price_date) AS min_date, max(price_date) AS max_date
+                    FROM "us-funds-project".main_etfs.fact_etfs
+                    UNION ALL
+                    SELECT min(price_date), max(price_date)
+                    FROM "us-funds-project".main_mutual_funds.fact_mutual_funds
+                )
+           """
+    return con.execute(price_date_range_query).df()
+
+
+@cached_query
+def get_fund_category_ranks(con, selected_symbol: str, fund_type="etf") -> pd.DataFrame:
+    """Get the rank of a fund in its category for each metric, with the peer distribution.
+
+    Ranks are precomputed by dbt (main_peers): this is a point lookup.
+
+    Args:
+        con: The database connection object.
+        selected_symbol: The fund symbol.
+        fund_type: "etf" or "mutual_fund", the peers are funds of the same type.
+
+    Returns:
+        A DataFrame with one row per metric the fund has a value for.
+    """
+    category_ranks_query = """
+                SELECT
+                    r.metric,
+                    r.fund_category,
+                    r.metric_value,
+                    r.higher_is_better,
+                    r.category_rank,
+                    r.category_size,
+                    r.category_top_percent,
+                    r.category_percentile,
+                    d.min_value,
+                    d.p10_value,
+                    d.p25_value,
+                    d.median_value,
+                    d.p75_value,
+                    d.p90_value,
+                    d.max_value
+                FROM "us-funds-project".main_peers.fund_category_ranks AS r
+                JOIN "us-funds-project".main_peers.fund_category_distributions AS d
+                    USING (fund_type, fund_category, metric)
+                WHERE r.fund_symbol = ? AND r.fund_type = ?
+                ORDER BY r.metric_order
+           """
+    return con.execute(category_ranks_query, (selected_symbol, fund_type)).df()
+
+
+FUND_METRIC_HISTORY_COLUMNS = [
+    "fund_category",
+    "total_net_assets",
+    "fund_yield",
+    "fund_annual_report_net_expense_ratio",
+    "category_annual_report_net_expense_ratio",
+    "annual_holdings_turnover",
+    "asset_stocks",
+    "asset_bonds",
+    "fund_sector_basic_materials",
+    "fund_sector_communication_services",
+    "fund_sector_consumer_cyclical",
+    "fund_sector_consumer_defensive",
+    "fund_sector_energy",
+    "fund_sector_financial_services",
+    "fund_sector_healthcare",
+    "fund_sector_industrials",
+    "fund_sector_real_estate",
+    "fund_sector_technology",
+    "fund_sector_utilities",
+    "top10_holdings",
+    "top10_holdings_total_assets",
+    "fund_price_book_ratio",
+    "fund_price_cashflow_ratio",
+    "fund_price_earning_ratio",
+    "fund_price_sales_ratio",
+    "fund_bond_maturity",
+    "fund_bond_duration",
+    "returns_as_of_date",
+    "fund_return_ytd",
+    "fund_return_1year",
+    "fund_return_3years",
+    "fund_return_5years",
+    "fund_return_10years",
+    "fund_alpha_3years",
+    "fund_beta_3years",
+    "fund_r_squared_3years",
+    "fund_stdev_3years",
+    "fund_sharpe_ratio_3years",
+    "fund_treynor_ratio_3years",
+    "fund_alpha_5years",
+    "fund_beta_5years",
+    "fund_r_squared_5years",
+    "fund_stdev_5years",
+    "fund_sharpe_ratio_5years",
+    "fund_treynor_ratio_5years",
+    "fund_alpha_10years",
+    "fund_beta_10years",
+    "fund_r_squared_10years",
+    "fund_stdev_10years",
+    "fund_sharpe_ratio_10years",
+    "fund_treynor_ratio_10years",
+]
+
+
+def get_metric_history_columns(columns) -> list:
+    """Check the columns requested from the fund metrics snapshot.
+
+    Args:
+        columns: Column names from FUND_METRIC_HISTORY_COLUMNS, all when None.
+
+    Returns:
+        The list of columns.
+    """
+    if columns is None:
+        return FUND_METRIC_HISTORY_COLUMNS
+    unknown = [c for c in columns if c not in FUND_METRIC_HISTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown snapshot columns: {', '.join(unknown)}.")
+    return list(columns)
+
+
+@cached_query
+def get_fund_metrics_as_of(
+    con, selected_symbol: str, as_of, fund_type="etf", columns=None
+) -> pd.DataFrame:
+    """Get the metrics of a fund as they were at the end of a day.
+
+    Reads the SCD-2 snapshot built by `dbt snapshot` (snapshots.fund_metrics_snapshot).
+
+    Args:
+        con: The database connection object.
+        selected_symbol: The fund symbol.
+        as_of: The date, a datetime.date or an ISO string.
+        fund_type: "etf" or "mutual_fund".
+        columns: Column names from FUND_METRIC_HISTORY_COLUMNS, all when None.
+
+    Returns:
+        A DataFrame with the valid_from and valid_to of the version in effect
+        and the requested columns. Empty if the fund was not snapshotted yet.
+    """
+    select_list = ",\n                ".join(get_metric_history_columns(columns))
+    metrics_as_of_query = f"""
+              SELECT
+                dbt_valid_from AS valid_from,
+                dbt_valid_to AS valid_to,
+                {select_list}
+              FROM "us-funds-project".snapshots.fund_metrics_snapshot
+              WHERE fund_symbol = ?
+                AND fund_type = ?
+                AND dbt_valid_from < CAST(? AS DATE) + INTERVAL 1 DAY
+                AND coalesce(dbt_valid_to >= CAST(? AS DATE) + INTERVAL 1 DAY, true)
+          """
+    as_of = str(as_of)
+    return con.execute(
+        metrics_as_of_query, (selected_symbol, fund_type, as_of, as_of)
+    ).df()
+
+
+def build_metrics_history_query(columns) -> str:
+    """Build the query of the changes of some columns of the fund metrics snapshot.
+
+    Snapshot versions where none of the columns changed are merged. The query
+    takes the fund symbol and fund type as parameters.
+
+    Args:
+        columns: Column names from FUND_METRIC_HISTORY_COLUMNS.
+
+    Returns:
+        The SQL query, returning valid_from, valid_to and the columns.
+    """
+    column_list = ", ".join(get_metric_history_columns(columns))
+    return f"""
+              WITH __versions AS (
+                SELECT
+                  dbt_valid_from,
+                  {column_list},
+                  last_value(dbt_valid_to) OVER (
+                    ORDER BY dbt_valid_from
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                  ) AS __last_valid_to,
+                  row({column_list}) IS DISTINCT FROM
+                    lag(row({column_list})) OVER (ORDER BY dbt_valid_from)
+                    AS __changed
+                FROM "us-funds-project".snapshots.fund_metrics_snapshot
+                WHERE fund_symbol = ? AND fund_type = ?
+              ),
+
+              __changes AS (
+                SELECT * FROM __versions WHERE __changed
+              )
+
+              SELECT
+                dbt_valid_from AS valid_from,
+                coalesce(
+                  lead(dbt_valid_from) OVER (ORDER BY dbt_valid_from),
+                  __last_valid_to
+                ) AS valid_to,
+                {column_list}
+              FROM __changes
+          """
+
+
+@cached_query
+def get_fund_metrics_history(
+    con, selected_symbol: str, columns, fund_type="etf"
+) -> pd.DataFrame:
+    """Get the time series of some metrics of a fund.
+
+    Args:
+        con: The database connection object.
+        selected_symbol: The fund symbol.
+        columns: Column names from FUND_METRIC_HISTORY_COLUMNS.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        A DataFrame of valid_from, valid_to (NaT for the current values) and
+        the columns, with one row per change of the columns.
+    """
+    metrics_history_query = f"""
+              {build_metrics_history_query(columns)}
+              ORDER BY valid_from
+          """
+    return con.execute(metrics_history_query, (selected_symbol, fund_type)).df()
+
+
+@cached_query
+def get_fund_holdings_history(
+    con, selected_symbol: str, fund_type="etf"
+) -> pd.DataFrame:
+    """Get the top 10 holdings of a fund at each change, in long format.
+
+    The holdings are parsed like in the holdings dimensions, so the weights
+    of different versions can be charted against each other.
+
+    Args:
+        con: The database connection object.
+        selected_symbol: The fund symbol.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        A DataFrame of valid_from, valid_to, holding_name and holding_weight.
+    """
+    holdings_history_query = f"""
+              WITH __history AS (
+                {build_metrics_history_query(["top10_holdings"])}
+              ),
+
+              __unnesting AS (
+                SELECT
+                  valid_from,
+                  valid_to,
+                  TRIM(REPLACE(TRIM(SPLIT_PART(holding, ':', 1)), '"', '')) AS holding_name,
+                  TRY_CAST(TRIM(SPLIT_PART(holding, ':', 2)) AS DOUBLE) AS holding_weight
+                FROM __history, UNNEST(SPLIT(__history.top10_holdings, ',')) AS t (holding)
+              )
+
+              SELECT * FROM __unnesting
+              WHERE holding_name <> '' AND holding_weight IS NOT NULL
+              ORDER BY valid_from, holding_weight DESC
+          """
+    return con.execute(holdings_history_query, (selected_symbol, fund_type)).df()
+
+
+# Query routing. Some facts are also materialized at a coarser grain: one row
+# per fund (the fund profile, the current rows of the metrics snapshot) or one
+# row per fund and month (the monthly price rollup). Routed queries are
+# answered by the materialization holding the requested columns at the
+# requested grain with the fewest rows, among those up to date with the fact
+# table, and by the fact table otherwise.
+
+
+class Materialization(NamedTuple):
+    """A relation that can answer queries on the facts of a fund type.
+
+    Attributes:
+        relation: The relation, as schema.table.
+        kind: "rollup", "snapshot" or "fact".
+        grain: "fund" for one row per fund, otherwise the price resolution
+            of its rows.
+        where: SQL condition keeping its rows of the fund type.
+        watermark: The relation it was built from, and a SQL aggregate over
+            the rows of both, equal while the materialization is up to date
+            with it. None for facts.
+    """
+
+    relation: str
+    kind: str
+    grain: str
+    where: str = "true"
+    watermark: tuple = None
+
+
+FACT_TABLES = {
+    "etf": "main_etfs.fact_etfs",
+    "mutual_fund": "main_mutual_funds.fact_mutual_funds",
+}
+
+# DuckDB's period of each price resolution
+RESOLUTION_PERIODS = {
+    "daily": "day",
+    "weekly": "week",
+    "monthly": "month",
+    "quarterly": "quarter",
+}
+# The length of each period, as a DuckDB interval: duckdb 0.10 does not
+# parse `INTERVAL 1 quarter`
+PERIOD_INTERVALS = {
+    "day": "INTERVAL 1 day",
+    "week": "INTERVAL 1 week",
+    "month": "INTERVAL 1 month",
+    "quarter": "INTERVAL 3 month",
+}
+
+# The grains each grain of rows can be aggregated to
+GRAIN_ANSWERS = {
+    "fund": ["fund"],
+    "daily": ["fund", "daily", "weekly", "monthly", "quarterly"],
+    "monthly": ["monthly", "quarterly"],
+}
+
+# How price columns are aggregated into longer periods, the last value of the
+# period for the others
+PRICE_AGGREGATES = {
+    "open": "arg_min({column}, price_date)",
+    "high": "max({column})",
+    "low": "min({column})",
+    "volume": "sum({column})",
+    "trading_days": "sum({column})",
+    "first_price_date": "min({column})",
+    "last_price_date": "max({column})",
+}
+
+# The tables rebuilt from the facts store the id of the dbt invocation that
+# built them. The metrics snapshot, taken by a separate invocation, is
+# compared by content with the metrics hashes of the fund profile.
+BUILD_WATERMARK = "max(build_id)"
+METRICS_WATERMARK = (
+    "md5(string_agg(fund_symbol || metrics_hash, ',' ORDER BY fund_symbol))"
+)
+
+
+def _fund_materializations(fund_type: str) -> list:
+    # The one-row-per-fund relations hold both fund types
+    return [
+        Materialization(
+            "main_profiles.fund_profile",
+            "snapshot",
+            "fund",
+            f"fund_type = '{fund_type}'",
+            (FACT_TABLES[fund_type], BUILD_WATERMARK),
+        ),
+        Materialization(
+            "snapshots.fund_metrics_snapshot",
+            "snapshot",
+            "fund",
+            f"fund_type = '{fund_type}' AND dbt_valid_to IS NULL",
+            ("main_profiles.fund_profile", METRICS_WATERMARK),
+        ),
+    ]
+
+
+# Listed after the relation each one was built from
+MATERIALIZATIONS = {
+    "etf": [
+        Materialization(FACT_TABLES["etf"], "fact", "daily"),
+        *_fund_materializations("etf"),
+        Materialization(
+            "main_rollups.etf_prices_monthly",
+            "rollup",
+            "monthly",
+            watermark=(FACT_TABLES["etf"], BUILD_WATERMARK),
+        ),
+    ],
+    "mutual_fund": [
+        Materialization(FACT_TABLES["mutual_fund"], "fact", "daily"),
+        *_fund_materializations("mutual_fund"),
+    ],
+}
+
+
+@cached_query
+def get_materialization_status(con, fund_type="etf") -> pd.DataFrame:
+    """Check which materializations of a fund type can be used, and their cost.
+
+    Computed once per database build: the watermarks compare each
+    materialization with the relation it was built from, which must be up to
+    date itself. The cost is the exact count of the rows of the fund type,
+    not DuckDB's storage estimate, which still counts the rows deleted by
+    the incremental models.
+
+    Args:
+        con: The database connection object.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        A DataFrame with one row per materialization: relation, kind, grain,
+        row_count, columns, usable and reason ("missing", "stale" or
+        "up to date").
+    """
+    catalog_query = """
+              SELECT
+                schema_name || '.' || table_name AS relation,
+                list(column_name)
+              FROM duckdb_columns()
+              JOIN duckdb_tables() USING (database_name, schema_name, table_name)
+              WHERE database_name = 'us-funds-project'
+              GROUP BY ALL
+          """
+    catalog = dict(con.execute(catalog_query).fetchall())
+    materializations = MATERIALIZATIONS[fund_type]
+    by_relation = {m.relation: m for m in materializations}
+    aggregates = {}
+
+    def aggregate(m: Materialization, expression: str):
+        # The fact table is scanned once for the materializations built from it
+        if (m.relation, expression) not in aggregates:
+            try:
+                aggregates[m.relation, expression] = con.execute(
+                    f"""
+                      SELECT {expression}
+                      FROM "us-funds-project".{m.relation}
+                      WHERE {m.where}
+                  """
+                ).fetchone()[0]
+            except duckdb.Error:
+                # e.g. a table built before it had a watermark column
+                aggregates[m.relation, expression] = None
+        return aggregates[m.relation, expression]
+
+    reasons = {}
+    rows = []
+    for m in materializations:
+        columns, row_count = catalog.get(m.relation, []), None
+        if m.relation not in catalog:
+            reason = "missing"
+        elif m.watermark is None:
+            reason = "up to date"
+        else:
+            source_relation, expression = m.watermark
+            source = by_relation[source_relation]
+            value = aggregate(m, expression)
+            fresh = (
+                reasons.get(source_relation) == "up to date"
+                and value is not None
+                and value == aggregate(source, expression)
+            )
+            reason = "up to date" if fresh else "stale"
+        if reason == "up to date":
+            row_count = aggregate(m, "count(*)")
+        reasons[m.relation] = reason
+        rows.append(
+            {
+                "relation": m.relation,
+                "kind": m.kind,
+                "grain": m.grain,
+                "row_count": row_count,
+                "columns": columns,
+                "usable": reason == "up to date",
+                "reason": reason,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def plan_query(con, columns, grain: str = "fund", fund_type="etf") -> Materialization:
+    """Choose the relation answering a query.
+
+    Args:
+        con: The database connection object.
+        columns: The column names the query reads.
+        grain: "fund" for one row per fund, or a key of RESOLUTION_PERIODS.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        The usable materialization with the fewest rows having the columns at
+        a grain that can be aggregated to the requested one.
+
+    Raises:
+        ValueError: If no materialization, the fact table included, can
+            answer the query.
+    """
+    status = get_materialization_status(con, fund_type)
+    candidates = [
+        (row.row_count, position)
+        for position, row in enumerate(status.itertuples())
+        if row.usable
+        and grain in GRAIN_ANSWERS[row.grain]
+        and all(c in row.columns for c in columns)
+    ]
+    if not candidates:
+        raise ValueError(
+            f"No {fund_type} table has the columns {', '.join(columns)} "
+            f"at the {grain} grain."
+        )
+    _, position = min(candidates)
+    return MATERIALIZATIONS[fund_type][position]
+
+
+def build_fund_fields_query(plan: Materialization, columns, n_symbols: int) -> str:
+    """Build the query of fund-level columns on the chosen materialization.
+
+    The query takes the fund symbols as parameters. Fact tables repeat the
+    fund-level columns on every price date, so their rows are deduplicated.
+    """
+    distinct = "DISTINCT" if plan.kind == "fact" else ""
+    select_list = ",\n                ".join(["fund_symbol", *columns])
+    placeholders = ", ".join("?" for _ in range(n_symbols))
+    return f"""
+              SELECT {distinct}
+                {select_list}
+              FROM "us-funds-project".{plan.relation}
+              WHERE {plan.where}
+                AND fund_symbol IN ({placeholders})
+              ORDER BY fund_symbol
+          """
+
+
+@cached_query
+def get_fund_fields(con, symbols, columns, fund_type="etf") -> pd.DataFrame:
+    """Get fund-level columns of some funds from the cheapest up-to-date source.
+
+    Args:
+        con: The database connection object.
+        symbols: The fund symbols.
+        columns: The column names.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        A DataFrame with the fund_symbol and the columns, one row per fund.
+    """
+    plan = plan_query(con, columns, "fund", fund_type)
+    query = build_fund_fields_query(plan, columns, len(symbols))
+    return con.execute(query, list(symbols)).df()
+
+
+def build_fund_prices_query(
+    plan: Materialization, columns, n_symbols: int, resolution: str
+) -> str:
+    """Build the query of price columns at a resolution on the chosen materialization.
+
+    The query takes the fund symbols, then the start date twice and the end
+    date twice, as parameters. Sources at a finer grain than the resolution
+    are aggregated to it.
+    """
+    period = RESOLUTION_PERIODS[resolution]
+    if plan.grain == resolution:
+        date_column = "price_date"
+        select_list = columns
+        group_by = ""
+    else:
+        date_column = f"date_trunc('{period}', price_date)::DATE"
+        select_list = [
+            PRICE_AGGREGATES.get(c, "arg_max({column}, price_date)").format(column=c)
+            + f" AS {c}"
+            for c in columns
+        ]
+        group_by = "GROUP BY ALL"
+    select_list = ",\n                ".join(
+        ["fund_symbol", f"{date_column} AS price_date", *select_list]
+    )
+    placeholders = ", ".join("?" for _ in range(n_symbols))
+    return f"""
+              SELECT
+                {select_list}
+              FROM "us-funds-project".{plan.relation}
+              WHERE {plan.where}
+                AND fund_symbol IN ({placeholders})
+                AND (?::DATE IS NULL OR price_date >= date_trunc('{period}', ?::DATE))
+                AND (?::DATE IS NULL
+                     OR price_date < date_trunc('{period}', ?::DATE) + {PERIOD_INTERVALS[period]})
+              {group_by}
+              ORDER BY fund_symbol, price_date
+          """
+
+
+@cached_query
+def get_fund_prices(
+    con,
+    symbols,
+    columns,
+    start_date=None,
+    end_date=None,
+    resolution: str = "daily",
+    fund_type="etf",
+) -> pd.DataFrame:
+    """Get price columns of some funds at a resolution, from the cheapest up-to-date source.
+
+    Weekly, monthly and quarterly rows are whole periods labelled by their
+    first day, like the tiles of the price store: every period overlapping the
+    date range is returned complete, whichever source answered.
+
+    Args:
+        con: The database connection object.
+        symbols: The fund symbols.
+        columns: The column names, e.g. ["close", "volume"].
+        start_date: First day of the range, None for no lower bound.
+        end_date: Last day of the range, None for no upper bound.
+        resolution: A key of RESOLUTION_PERIODS.
+        fund_type: "etf" or "mutual_fund".
+
+    Returns:
+        A DataFrame with the fund_symbol, price_date and the columns, ordered
+        by fund and date.
+    """
+    if resolution not in RESOLUTION_PERIODS:
+        raise ValueError(f"Unknown resolution '{resolution}'.")
+    columns = [c for c in columns if c not in ("fund_symbol", "price_date")]
+    plan = plan_query(con, columns, resolution, fund_type)
+    query = build_fund_prices_query(plan, columns, len(symbols), resolution)
+    return con.execute(
+        query, [*symbols, start_date, start_date, end_date, end_date]
+    ).df()
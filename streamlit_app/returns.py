@@ -0,0 +1,176 @@
+"""
+Aligned daily return matrices for portfolio analytics.
+
+Prices of ETFs (adjusted close) and mutual funds (NAV per share) are put on a
+common calendar: one row per trading day, one column per fund. The matrices
+are cached per universe, date range and data version and shared read-only
+between sessions, so every backtest over the same funds reuses one load.
+"""
+
+import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+from cache import get_or_compute_arrays
+from price_store import get_price_store
+from queries import get_data_version
+
+
+class AlignedReturns(NamedTuple):
+    """Daily simple returns of a fund universe on a common calendar.
+
+    `returns[t, i]` is the return of `symbols[i]` from the previous row's date
+    to `dates[t]`, NaN while the fund has no price yet. Gaps in one fund's
+    calendar (e.g. mutual fund holidays) are forward filled, so they show up
+    as a zero return followed by the full move.
+    """
+
+    dates: np.ndarray
+    symbols: tuple
+    returns: np.ndarray
+
+    def select(self, symbols) -> "AlignedReturns":
+        """Restrict the matrix to some of its funds, dropping the rows where any of them has no return."""
+        positions = [self.symbols.index(s) for s in symbols]
+        returns = self.returns[:, positions]
+        complete = ~np.isnan(returns).any(axis=1)
+        return AlignedReturns(self.dates[complete], tuple(symbols), returns[complete])
+
+    def between(self, start_date, end_date) -> "AlignedReturns":
+        """Restrict the matrix to a date range, without copying the returns."""
+        start = np.searchsorted(self.dates, np.datetime64(start_date, "D"), "left")
+        end = np.searchsorted(self.dates, np.datetime64(end_date, "D"), "right")
+        return AlignedReturns(
+            self.dates[start:end], self.symbols, self.returns[start:end]
+        )
+
+
+CALENDAR_BLOCK_SIZE = 512
+
+
+def price_calendar(series: list) -> np.ndarray:
+    """Sorted union of the price dates of funds.
+
+    The dates are merged CALENDAR_BLOCK_SIZE funds at a time, so the scratch
+    space does not grow with the number of funds.
+
+    Args:
+        series: PriceSeries, None for funds without prices.
+
+    Returns:
+        The datetime64[D] price dates.
+    """
+    dates = np.empty(0, dtype="datetime64[D]")
+    found = [s for s in series if s is not None]
+    for start in range(0, len(found), CALENDAR_BLOCK_SIZE):
+        block = found[start : start + CALENDAR_BLOCK_SIZE]
+        dates = np.union1d(dates, np.concatenate([s["price_date"] for s in block]))
+    return dates
+
+
+def build_aligned_returns(series: list, symbols: tuple, dates=None) -> AlignedReturns:
+    """Align the price series of funds into a return matrix.
+
+    Args:
+        series: The PriceSeries of each fund over the date range, None for funds without prices.
+        symbols: The fund of each series, the column order of the matrix.
+        dates: The calendar of the matrix, sorted and holding every price date
+            of the series. The union of their dates by default. A fund's
+            column only depends on its series and the calendar, so funds can
+            be aligned a few at a time on a shared calendar.
+
+    Returns:
+        The aligned returns, one row less than the number of price dates.
+    """
+    if dates is None:
+        dates = price_calendar(series)
+    prices = np.full((len(dates), len(symbols)), np.nan)
+    for column, fund_series in enumerate(series):
+        if fund_series is not None:
+            rows = np.searchsorted(dates, fund_series["price_date"])
+            prices[rows, column] = fund_series.adjusted_price()
+    # Non-positive prices are bad data, not a total loss
+    prices[prices <= 0] = np.nan
+
+    # Forward fill each fund from its last known price
+    last_known = np.where(np.isnan(prices), 0, np.arange(len(dates))[:, None])
+    np.maximum.accumulate(last_known, axis=0, out=last_known)
+    prices = prices[last_known, np.arange(len(symbols))]
+
+    with np.errstate(invalid="ignore"):
+        returns = prices[1:] / prices[:-1] - 1.0
+    return AlignedReturns(dates[1:], tuple(symbols), np.ascontiguousarray(returns))
+
+
+def load_price_series(con, symbols, start_date, end_date) -> list:
+    """Get the price series of funds over a date range from the shared price store.
+
+    The series are views of the memory-mapped store, nothing is copied.
+
+    Args:
+        con: The database connection object.
+        symbols: The fund symbols, ETFs and mutual funds can be mixed.
+        start_date: First price date used.
+        end_date: Last price date used.
+
+    Returns:
+        The PriceSeries of each symbol, None for funds without prices.
+    """
+    store = get_price_store(con)
+    series = []
+    for symbol in symbols:
+        fund_series = store.get_series(symbol)
+        if fund_series is not None:
+            fund_series = fund_series.between(start_date, end_date)
+        series.append(fund_series)
+    return series
+
+
+def load_aligned_returns(
+    con, symbols, start_date=datetime.date.min, end_date=datetime.date.max
+) -> AlignedReturns:
+    """Build the aligned return matrix of a fund universe, without caching it.
+
+    The prices are read from the shared price store.
+
+    Args:
+        con: The database connection object.
+        symbols: The fund symbols, ETFs and mutual funds can be mixed.
+        start_date: First price date used, the full history by default.
+        end_date: Last price date used.
+
+    Returns:
+        The aligned returns, with the symbols in sorted order.
+    """
+    symbols = tuple(sorted(set(symbols)))
+    return build_aligned_returns(
+        load_price_series(con, symbols, start_date, end_date), symbols
+    )
+
+
+def get_aligned_returns(
+    con, symbols, start_date=datetime.date.min, end_date=datetime.date.max
+) -> AlignedReturns:
+    """Get the cached aligned return matrix of a fund universe.
+
+    Args:
+        con: The database connection object.
+        symbols: The fund symbols, ETFs and mutual funds can be mixed.
+        start_date: First price date used, the full history by default.
+        end_date: Last price date used.
+
+    Returns:
+        The aligned returns, with the symbols in sorted order.
+    """
+    symbols = tuple(sorted(set(symbols)))
+    key = (
+        "aligned_returns",
+        symbols,
+        str(start_date),
+        str(end_date),
+        get_data_version(con),
+    )
+    return get_or_compute_arrays(
+        key, lambda: load_aligned_returns(con, symbols, start_date, end_date)
+    )
@@ -0,0 +1,144 @@
+"""
+On-disk cache shared by the app workers of a host.
+
+In multi-worker mode (see workers.py) several Streamlit processes serve the
+app behind a load balancer. Each one keeps its in-process caches (cache.py),
+and their misses fall back to this store before computing anything, so a
+query result or a figure is computed once per data version for all the
+workers, not once per worker:
+
+    shared_cache/<data version>/<sha1 of the key>.<kind>
+
+Entries are written to a temporary file renamed into place, so readers never
+see a partial entry. A worker about to compute an entry holds an exclusive
+lock on it (a .lock file removed once the entry is written), and the workers
+missing the same entry meanwhile wait for the lock and read the result
+instead of computing it again. Only the directories of the last
+SHARED_CACHE_VERSIONS data versions are kept. A worker still serving a
+pruned version computes its misses without storing them.
+
+The store is enabled by setting US_FUNDS_SHARED_CACHE_DIR, which workers.py
+does for its workers. Without it, every call computes directly.
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+
+SHARED_CACHE_DIR = os.environ.get("US_FUNDS_SHARED_CACHE_DIR") or None
+SHARED_CACHE_VERSIONS = 2
+
+
+def get_entry_path(key: tuple, kind: str) -> str:
+    """
+    Returns the file of a cache entry.
+
+    The last item of the key is its data version, as in the keys of cache.py.
+
+    Parameters:
+        key (tuple): Key of the entry, made of strings, numbers, dates and tuples.
+        kind (str): File extension of the entry, e.g. "pkl" or "json".
+
+    Returns:
+        str: Path of the entry under the directory of its data version.
+    """
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()
+    return os.path.join(SHARED_CACHE_DIR, str(key[-1]), f"{digest}.{kind}")
+
+
+def prune_shared_cache(keep: int = SHARED_CACHE_VERSIONS) -> None:
+    """
+    Deletes the data version directories, except the `keep` last written ones.
+    """
+    if not os.path.isdir(SHARED_CACHE_DIR):
+        return
+    paths = [
+        os.path.join(SHARED_CACHE_DIR, name)
+        for name in os.listdir(SHARED_CACHE_DIR)
+        if not name.startswith(".")
+    ]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def read_shared(key: tuple, kind: str, read):
+    """
+    Returns a shared entry, or None if it is not cached or the store is disabled.
+
+    Parameters:
+        key (tuple): Key of the entry.
+        kind (str): File extension of the entry.
+        read (callable): Function reading the entry from its path.
+    """
+    if SHARED_CACHE_DIR is None:
+        return None
+    try:
+        return read(get_entry_path(key, kind))
+    except FileNotFoundError:
+        return None
+
+
+def get_or_create_shared(key: tuple, kind: str, create, read, write):
+    """
+    Returns the shared entry for `key`, creating it on a miss.
+
+    Parameters:
+        key (tuple): Key of the entry.
+        kind (str): File extension of the entry.
+        create (callable): Zero-argument function computing the value.
+        read (callable): Function reading a value from a path.
+        write (callable): Function writing a value to a path, as write(value, path).
+
+    Returns:
+        The value read from the store, or computed by this worker.
+    """
+    if SHARED_CACHE_DIR is None:
+        return create()
+    value = read_shared(key, kind, read)
+    if value is not None:
+        return value
+
+    path = get_entry_path(key, kind)
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+        # A new data version is being served
+        prune_shared_cache()
+        os.makedirs(directory, exist_ok=True)
+    try:
+        lock_file = open(f"{path}.lock", "a")
+    except FileNotFoundError:
+        # The directory of an older data version was pruned meanwhile
+        return create()
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Another worker may have created the entry while we waited
+            value = read_shared(key, kind, read)
+            if value is not None:
+                return value
+            value = create()
+            try:
+                fd, temporary_path = tempfile.mkstemp(prefix=".writing-", dir=directory)
+            except OSError:
+                # The directory was pruned meanwhile, or the disk is read-only
+                return value
+            os.close(fd)
+            try:
+                write(value, temporary_path)
+                os.replace(temporary_path, path)
+                # Workers already waiting on the lock read the entry once
+                # they get it, later ones find the entry before locking
+                os.remove(f"{path}.lock")
+            except OSError:
+                # A full or read-only disk only costs the other workers a miss
+                pass
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+            return value
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,229 @@
+"""
+Versioned database snapshots, so dbt rebuilds never block the dashboard.
+
+Every build writes a new copy of the database into its own directory:
+
+    db_snapshots/
+        CURRENT                          <- name of the published snapshot
+        20240326T094339/us-funds-project.db
+        20240327T094512/us-funds-project.db
+
+The file keeps its usual name because the DuckDB catalog ("us-funds-project")
+is derived from it. Publishing a snapshot rewrites CURRENT atomically. The app
+opens new connections on the published snapshot, connections still reading
+an older one drain on their own, and old snapshots are pruned afterwards.
+
+    python snapshots.py build [dbt command]   # e.g. build run --select etfs
+    python snapshots.py load etfs_prices "raw/ETF prices*.csv"
+    python snapshots.py current
+    python snapshots.py prune --keep 2
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DB_FILE_NAME = "us-funds-project.db"
+LEGACY_DB_PATH = os.path.join(PROJECT_ROOT, DB_FILE_NAME)
+SNAPSHOT_ROOT = os.environ.get(
+    "US_FUNDS_SNAPSHOT_DIR", os.path.join(PROJECT_ROOT, "db_snapshots")
+)
+CURRENT_POINTER = os.path.join(SNAPSHOT_ROOT, "CURRENT")
+DBT_PROJECT_DIR = os.path.join(PROJECT_ROOT, "us_funds_dbt")
+DBT_PROFILES_DIR = os.path.join(PROJECT_ROOT, ".dbt")
+
+
+def get_current_snapshot():
+    """Get the name of the published snapshot.
+
+    Returns:
+        The snapshot name, or None when no snapshot has been published yet.
+    """
+    try:
+        with open(CURRENT_POINTER) as pointer:
+            return pointer.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def get_snapshot_path(snapshot: str) -> str:
+    """Get the database file of a snapshot."""
+    return os.path.join(SNAPSHOT_ROOT, snapshot, DB_FILE_NAME)
+
+
+def resolve_db_path() -> str:
+    """Get the database file new connections should open.
+
+    Returns:
+        The published snapshot, or the legacy database at the project root
+        when snapshots are not in use.
+    """
+    snapshot = get_current_snapshot()
+    if snapshot is None:
+        return LEGACY_DB_PATH
+    return get_snapshot_path(snapshot)
+
+
+def get_snapshot_of_path(db_path: str):
+    """Get the snapshot name a database file belongs to, or None if it is not a snapshot."""
+    snapshot_dir = os.path.dirname(os.path.abspath(db_path))
+    if os.path.dirname(snapshot_dir) != os.path.abspath(SNAPSHOT_ROOT):
+        return None
+    return os.path.basename(snapshot_dir)
+
+
+def list_snapshots() -> list:
+    """List the snapshot names, oldest first."""
+    if not os.path.isdir(SNAPSHOT_ROOT):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(SNAPSHOT_ROOT)
+        if os.path.isfile(get_snapshot_path(name))
+    )
+
+
+def create_snapshot() -> str:
+    """Create a new snapshot as a copy of the database currently served.
+
+    The copy carries the raw source tables, so dbt can rebuild the models in
+    it without touching the file the app is reading.
+
+    Returns:
+        The name of the new, not yet published, snapshot.
+    """
+    snapshot = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    os.makedirs(os.path.join(SNAPSHOT_ROOT, snapshot))
+    source_path = resolve_db_path()
+    if os.path.exists(source_path):
+        shutil.copyfile(source_path, get_snapshot_path(snapshot))
+    return snapshot
+
+
+def publish_snapshot(snapshot: str) -> None:
+    """Atomically make `snapshot` the database served to new connections."""
+    if not os.path.isfile(get_snapshot_path(snapshot)):
+        raise FileNotFoundError(f"Snapshot '{snapshot}' has no database file.")
+    tmp_pointer = f"{CURRENT_POINTER}.{os.getpid()}.tmp"
+    with open(tmp_pointer, "w") as pointer:
+        pointer.write(snapshot)
+        pointer.flush()
+        os.fsync(pointer.fileno())
+    os.replace(tmp_pointer, CURRENT_POINTER)
+
+
+def discard_snapshot(snapshot: str) -> None:
+    """Delete a snapshot directory."""
+    shutil.rmtree(os.path.join(SNAPSHOT_ROOT, snapshot), ignore_errors=True)
+
+
+def prune_snapshots(keep: int = 2) -> list:
+    """Delete old snapshots, keeping the published one and the `keep` most recent.
+
+    Connections still reading a deleted file keep working until they are
+    released, since the file is only unlinked.
+
+    Args:
+        keep: The number of most recent snapshots to keep.
+
+    Returns:
+        The names of the deleted snapshots.
+    """
+    current = get_current_snapshot()
+    snapshots = list_snapshots()
+    if current in snapshots:
+        # Snapshots newer than the published one may be builds in progress
+        snapshots = snapshots[: snapshots.index(current) + 1]
+    to_delete = [s for s in snapshots[:-keep] if s != current] if keep else []
+    for snapshot in to_delete:
+        discard_snapshot(snapshot)
+    return to_delete
+
+
+def build_snapshot(dbt_args: list, keep: int = 2, sources=()) -> str:
+    """Run dbt into a new snapshot and publish it when the build succeeds.
+
+    Args:
+        dbt_args: The dbt command and its arguments, "build" when no command is given.
+        keep: The number of snapshots kept by the pruning that follows.
+        sources: (table, paths) pairs loaded into the snapshot with
+            load_sources.py before dbt runs.
+
+    Returns:
+        The name of the published snapshot.
+    """
+    snapshot = create_snapshot()
+    if sources:
+        # Imported here, only loads need DuckDB's file readers
+        from load_sources import load_source
+
+        for table, paths in sources:
+            try:
+                load_source(get_snapshot_path(snapshot), table, paths)
+            except Exception as e:
+                discard_snapshot(snapshot)
+                raise RuntimeError(f"Loading {table} failed: {e}") from e
+    env = dict(os.environ, US_FUNDS_DB_PATH=get_snapshot_path(snapshot))
+    if not dbt_args or dbt_args[0].startswith("-"):
+        dbt_args = ["build", *dbt_args]
+    command = ["dbt", *dbt_args]
+    if "--profiles-dir" not in command:
+        command += ["--profiles-dir", DBT_PROFILES_DIR]
+    result = subprocess.run(command, cwd=DBT_PROJECT_DIR, env=env)
+    if result.returncode != 0:
+        discard_snapshot(snapshot)
+        raise RuntimeError(f"dbt failed with exit code {result.returncode}.")
+    # Imported here, price_store depends on this module through queries.py
+    from price_store import build_price_store_of_database
+
+    # Write the price store and chart tiles before publishing, so the first
+    # sessions on the new snapshot do not wait for them
+    build_price_store_of_database(get_snapshot_path(snapshot), snapshot)
+    publish_snapshot(snapshot)
+    prune_snapshots(keep)
+    return snapshot
+
+
+def main() -> None:
+    from load_sources import SOURCE_TABLES
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser(
+        "build", help="Build and publish a new snapshot."
+    )
+    build_parser.add_argument("--keep", type=int, default=2)
+    load_parser = subparsers.add_parser(
+        "load",
+        help="Load raw files into a new snapshot, build and publish it.",
+    )
+    load_parser.add_argument("table", choices=SOURCE_TABLES)
+    load_parser.add_argument(
+        "paths", nargs="+", help="CSV or Parquet files, globs allowed."
+    )
+    load_parser.add_argument("--keep", type=int, default=2)
+    subparsers.add_parser("current", help="Print the published snapshot.")
+    prune_parser = subparsers.add_parser("prune", help="Delete old snapshots.")
+    prune_parser.add_argument("--keep", type=int, default=2)
+    args, dbt_args = parser.parse_known_args()
+
+    if args.command in ("build", "load"):
+        sources = [(args.table, args.paths)] if args.command == "load" else []
+        try:
+            snapshot = build_snapshot(dbt_args, args.keep, sources)
+        except RuntimeError as e:
+            sys.exit(str(e))
+        print(f"Published snapshot {snapshot}")
+    elif args.command == "current":
+        print(resolve_db_path())
+    elif args.command == "prune":
+        for snapshot in prune_snapshots(args.keep):
+            print(f"Deleted snapshot {snapshot}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Tests of the portfolio backtest page, run without a database:
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import queries  # noqa: E402
+import returns  # noqa: E402
+
+PAGE = os.path.join(APP_DIR, "pages", "portfolio_backtest.py")
+
+
+def fake_search_funds(con, search_text, k=20, fund_type=None):
+    return pd.DataFrame({"fund_symbol": ["AAA", "BBB"]})
+
+
+def fake_aligned_returns(con, symbols, *args):
+    # No common history: the page stops before running a backtest
+    symbols = tuple(sorted(symbols))
+    return returns.AlignedReturns(
+        np.empty(0, dtype="datetime64[D]"),
+        symbols,
+        np.empty((0, len(symbols))),
+    )
+
+
+class SelectBasketTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(queries, "search_funds", fake_search_funds),
+            mock.patch.object(returns, "get_aligned_returns", fake_aligned_returns),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_adding_a_fund_keeps_the_typed_weights(self):
+        at = AppTest.from_file(PAGE, default_timeout=30).run()
+        at.multiselect(key="basket_symbols").select("AAA").run()
+        self.assertEqual(at.number_input(key="basket_weight_AAA").value, 100.0)
+
+        at.number_input(key="basket_weight_AAA").set_value(70.0).run()
+        at.multiselect(key="basket_symbols").select("BBB").run()
+
+        self.assertFalse(at.exception)
+        self.assertEqual(at.number_input(key="basket_weight_AAA").value, 70.0)
+        self.assertEqual(at.number_input(key="basket_weight_BBB").value, 50.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Lightweight usage instrumentation: which fund symbols the users look at.
+
+Every view is appended as one line to a log file, which keeps writes cheap and
+safe when several app processes share the file. Once the log grows past
+USAGE_LOG_MAX_KB, reading it compacts it into one `symbol<TAB>count` line per
+symbol, so it stays bounded by the number of symbols and the views recorded
+since the last compaction.
+"""
+
+import fcntl
+import os
+from collections import Counter
+
+USAGE_LOG_PATH = os.environ.get(
+    "US_FUNDS_USAGE_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "symbol_views.log"),
+)
+USAGE_LOG_MAX_BYTES = int(os.environ.get("US_FUNDS_USAGE_LOG_MAX_KB", "1024")) * 2**10
+
+
+def record_symbol_view(symbol: str) -> None:
+    """
+    Records one view of a fund page.
+
+    Parameters:
+        symbol (str): The fund symbol that was viewed.
+    """
+    try:
+        with open(USAGE_LOG_PATH, "a") as log:
+            # Not appended while the log is being compacted
+            fcntl.flock(log, fcntl.LOCK_EX)
+            log.write(f"{symbol}\n")
+    except OSError:
+        # Instrumentation must never break the page
+        pass
+
+
+def get_most_viewed_symbols(n: int) -> list:
+    """
+    Returns the most viewed fund symbols, compacting the log when it is too large.
+
+    Parameters:
+        n (int): The number of symbols to return.
+
+    Returns:
+        list: Up to `n` symbols, most viewed first.
+    """
+    try:
+        log = open(USAGE_LOG_PATH, "r+")
+    except FileNotFoundError:
+        return []
+    with log:
+        fcntl.flock(log, fcntl.LOCK_EX)
+        counts = Counter()
+        for line in log:
+            # A single view, or the count of a compacted log
+            symbol, _, count = line.strip().partition("\t")
+            if symbol:
+                counts[symbol] += int(count or 1)
+        if os.fstat(log.fileno()).st_size > USAGE_LOG_MAX_BYTES:
+            # Rewritten in place, so the views waiting on the lock are
+            # appended to the compacted log
+            log.seek(0)
+            log.truncate()
+            log.writelines(f"{s}\t{c}\n" for s, c in counts.most_common())
+    return [symbol for symbol, _ in counts.most_common(n)]
@@ -3,9 +3,38 @@ Utility functions for the US funds analysis web application.
 """
 
 # Import necessary libraries
+import os
+import tempfile
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+from cache import figure_key, get_or_build_figure
+from export import EXPORT_FORMATS, ExportTooLarge, get_available_formats, write_export
+from price_store import choose_resolution
+from queries import FACT_PROJECTIONS
+
+# Streamlit holds a download in memory while it serves it, larger exports are
+# left to the /export endpoint of api.py
+EXPORT_MAX_MB = int(os.environ.get("US_FUNDS_EXPORT_MAX_MB", "100"))
+
+# Shared by the ETF page and the cache warm-up, which draw the same peer charts
+PEER_METRIC_LABELS = {
+    "fund_return_ytd": "Return YTD",
+    "fund_return_1month": "Return 1month",
+    "fund_return_3months": "Return 3months",
+    "fund_return_1year": "Return 1year",
+    "fund_return_3years": "Return 3years",
+    "fund_return_5years": "Return 5years",
+    "fund_return_10years": "Return 10years",
+    "fund_sharpe_ratio_3years": "Sharpe Ratio 3years",
+    "fund_sharpe_ratio_5years": "Sharpe Ratio 5years",
+    "fund_sharpe_ratio_10years": "Sharpe Ratio 10years",
+    "fund_stdev_3years": "Standard Deviation 3years",
+    "fund_stdev_5years": "Standard Deviation 5years",
+    "fund_stdev_10years": "Standard Deviation 10years",
+    "fund_yield": "Yield",
+    "fund_annual_report_net_expense_ratio": "Net Expense Ratio",
+}
 
 
 def config_menu_footer() -> None:
@@ -292,3 +321,251 @@ def create_volume_chart(df_fact_etf):
     )
     fig.update_layout(title="Trading Volume", xaxis_title="Date", yaxis_title="Volume")
     return fig
+
+
+def create_line_chart(x, series: dict, title: str, yaxis_title: str, tickformat=None):
+    """
+    Creates a line chart with one line per series.
+
+    Parameters:
+        x: Values of the x axis, shared by every series.
+        series (dict): Mapping of line name to its y values.
+        title (str): Title of the chart.
+        yaxis_title (str): Title of the y axis.
+        tickformat (str): d3 format of the y axis ticks, e.g. ".0%".
+
+    Returns:
+        go.Figure: The line chart.
+    """
+    fig = go.Figure(
+        data=[
+            go.Scatter(x=x, y=y, mode="lines", name=name) for name, y in series.items()
+        ]
+    )
+    fig.update_layout(title=title, xaxis_title="Date", yaxis_title=yaxis_title)
+    if tickformat:
+        fig.update_yaxes(tickformat=tickformat)
+    return fig
+
+
+def create_heatmap_chart(matrix, labels, title: str):
+    """
+    Creates a heatmap of a correlation matrix.
+
+    Parameters:
+        matrix: Square matrix of values between -1 and 1.
+        labels: Names of the rows and columns.
+        title (str): Title of the chart.
+
+    Returns:
+        go.Figure: The heatmap.
+    """
+    fig = go.Figure(
+        data=go.Heatmap(
+            z=matrix,
+            x=labels,
+            y=labels,
+            zmin=-1,
+            zmax=1,
+            colorscale="RdBu",
+            reversescale=True,
+        )
+    )
+    fig.update_layout(title=title, height=700, yaxis_autorange="reversed")
+    return fig
+
+
+def create_peer_distribution_chart(peer_ranks, symbol: str, metric_label: str):
+    """
+    Creates a box plot of a metric among a fund's category peers, with the fund marked.
+
+    The box spans the 25th to 75th percentiles and the whiskers the 10th to
+    90th, from the precomputed category distribution.
+
+    Parameters:
+        peer_ranks: Row of `get_fund_category_ranks` for the metric.
+        symbol (str): The fund symbol.
+        metric_label (str): Display name of the metric.
+
+    Returns:
+        go.Figure: The box plot.
+    """
+    fig = go.Figure()
+    fig.add_trace(
+        go.Box(
+            name=peer_ranks["fund_category"],
+            q1=[peer_ranks["p25_value"]],
+            median=[peer_ranks["median_value"]],
+            q3=[peer_ranks["p75_value"]],
+            lowerfence=[peer_ranks["p10_value"]],
+            upperfence=[peer_ranks["p90_value"]],
+            orientation="h",
+            showlegend=False,
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=[peer_ranks["metric_value"]],
+            y=[peer_ranks["fund_category"]],
+            mode="markers",
+            marker=dict(size=14, color="red", symbol="diamond"),
+            name=symbol,
+        )
+    )
+    fig.update_layout(
+        title=f"{metric_label} among {int(peer_ranks['category_size'])} peers",
+        xaxis_title=metric_label,
+        height=300,
+    )
+    return fig
+
+
+def get_peer_distribution_chart(peer_ranks, symbol, metric_label, data_version):
+    """
+    Returns the peer distribution chart of a fund's metric, from the figure cache when possible.
+    """
+    return get_or_build_figure(
+        figure_key(
+            f"peer_distribution_{peer_ranks['metric']}",
+            symbol,
+            data_version=data_version,
+        ),
+        lambda: create_peer_distribution_chart(peer_ranks, symbol, metric_label),
+    )
+
+
+def get_holdings_chart(
+    df_top_10_holdings, df_percentage_of_net_assets, symbol, data_version
+):
+    """
+    Returns the top 10 holdings donut chart of a fund, from the figure cache when possible.
+
+    Parameters:
+    - df_top_10_holdings: The fund's top 10 holdings.
+    - df_percentage_of_net_assets: The share of net assets held by the top 10 holdings.
+    - symbol: The fund symbol.
+    - data_version: Version of the database the data comes from.
+
+    Returns:
+    - A Plotly figure object representing the donut chart.
+    """
+    return get_or_build_figure(
+        figure_key("holdings_donut", symbol, data_version=data_version),
+        lambda: create_donut_chart(
+            labels=df_top_10_holdings["Company"],
+            values=df_top_10_holdings["Portfolio Weight in %"],
+            hole_size=0.4,
+            title_text=f"Top 10 holdings as % of portfolio : {df_percentage_of_net_assets['% Net assets'].iloc[0]} % Net assets",
+        ),
+    )
+
+
+def get_sectors_chart(df_sectors, symbol, data_version):
+    """
+    Returns the sector allocation donut chart of a fund, from the figure cache when possible.
+
+    Parameters:
+    - df_sectors: The fund's sector weights.
+    - symbol: The fund symbol.
+    - data_version: Version of the database the data comes from.
+
+    Returns:
+    - A Plotly figure object representing the donut chart.
+    """
+    return get_or_build_figure(
+        figure_key("sectors_donut", symbol, data_version=data_version),
+        lambda: create_donut_chart(
+            labels=df_sectors["sector"],
+            values=df_sectors["Weight in %"],
+            hole_size=0.4,
+            title_text="",
+        ),
+    )
+
+
+def get_price_charts(price_store, symbol, start_date, end_date, data_version):
+    """
+    Returns the candlestick and volume charts of a fund over a date range, from the figure cache when possible.
+
+    Long ranges are drawn from the weekly, monthly or quarterly tiles of the
+    price store, so a chart never has more than MAX_CHART_POINTS candles.
+
+    Parameters:
+    - price_store: The PriceStore of the data version.
+    - symbol: The fund symbol.
+    - start_date: First day shown (datetime.date).
+    - end_date: Last day shown (datetime.date).
+    - data_version: Version of the database the data comes from.
+
+    Returns:
+    - A (candlestick figure, volume figure) tuple.
+    """
+    resolution = choose_resolution(start_date, end_date)
+
+    def prices_in_range():
+        return price_store.get_tile(symbol, start_date, end_date, resolution)
+
+    date_range = (start_date, end_date)
+    candlestick_fig = get_or_build_figure(
+        figure_key("candlestick", symbol, date_range, resolution, data_version),
+        lambda: create_candlestick_chart(prices_in_range()),
+    )
+    volume_fig = get_or_build_figure(
+        figure_key("volume", symbol, date_range, resolution, data_version),
+        lambda: create_volume_chart(prices_in_range()),
+    )
+    return candlestick_fig, volume_fig
+
+
+def display_export(
+    con, selected_symbol: str, symbols, start_date, end_date, fund_type="etf"
+) -> None:
+    """
+    Displays the sidebar export of fund data for the selected date range.
+
+    Parameters:
+        con: The database connection object.
+        selected_symbol (str): The symbol of the fund shown on the page.
+        symbols: The fund symbols that can be exported.
+        start_date (datetime.date): First day of the selected date range.
+        end_date (datetime.date): Last day of the selected date range.
+        fund_type (str): "etf" or "mutual_fund".
+    """
+    with st.sidebar.expander("Export data"):
+        export_all = st.checkbox("All funds")
+        export_symbols = st.multiselect(
+            "Funds", symbols, default=[selected_symbol], disabled=export_all
+        )
+        projection = st.selectbox("Data", list(FACT_PROJECTIONS[fund_type]))
+        fmt = st.selectbox("Format", get_available_formats())
+        no_funds = not export_all and not export_symbols
+        if st.button("Prepare export", disabled=no_funds):
+            mime, extension = EXPORT_FORMATS[fmt]
+            # Batches are streamed to disk, and the export abandoned once it
+            # outgrows what Streamlit may hold in memory
+            try:
+                with tempfile.TemporaryFile() as export_file:
+                    write_export(
+                        con,
+                        export_file,
+                        None if export_all else export_symbols,
+                        start_date,
+                        end_date,
+                        fmt,
+                        projection,
+                        fund_type,
+                        max_bytes=EXPORT_MAX_MB * 1024 * 1024,
+                    )
+                    export_file.seek(0)
+                    export_data = export_file.read()
+            except ExportTooLarge:
+                st.warning(
+                    f"This export is larger than {EXPORT_MAX_MB} MB. Download it from the /export endpoint of the API (api.py) instead."
+                )
+            else:
+                st.download_button(
+                    "Download",
+                    export_data,
+                    file_name=f"us_funds_{projection}_{start_date}_{end_date}.{extension}",
+                    mime=mime,
+                )
@@ -0,0 +1,193 @@
+"""
+Cache warm-up for the most popular funds after each dbt build.
+
+The page caches are keyed by data version, so a rebuilt database starts cold.
+This module preloads the query results and figures of the top symbols, either
+from a background thread inside the app process or from the command line:
+
+    python warmup.py --top 20
+    python warmup.py --symbols SPY QQQ
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from queries import (
+    connect_to_db,
+    get_data_version,
+    get_etf_facts,
+    get_etf_percentage_of_net_assets,
+    get_etf_sectors,
+    get_etf_top_10_holdings,
+    get_fund_category_ranks,
+    get_fund_profile,
+)
+from price_store import get_price_store
+from usage import get_most_viewed_symbols
+from utils import (
+    get_holdings_chart,
+    get_peer_distribution_chart,
+    get_price_charts,
+    get_sectors_chart,
+    PEER_METRIC_LABELS,
+)
+
+WARMUP_TOP_N = int(os.environ.get("US_FUNDS_WARMUP_TOP_N", "20"))
+WARMUP_SYMBOLS = [
+    s.strip()
+    for s in os.environ.get("US_FUNDS_WARMUP_SYMBOLS", "").split(",")
+    if s.strip()
+]
+WARMUP_POLL_SECONDS = int(os.environ.get("US_FUNDS_WARMUP_POLL_SECONDS", "30"))
+
+_watcher_started = False
+_watcher_lock = threading.Lock()
+
+
+def get_warmup_symbols(top_n: int = WARMUP_TOP_N) -> list:
+    """
+    Returns the symbols to warm up: the configured list first, then the most viewed ones.
+
+    Args:
+        top_n: The maximum number of symbols to return.
+
+    Returns:
+        A list of fund symbols.
+    """
+    symbols = list(WARMUP_SYMBOLS)
+    for symbol in get_most_viewed_symbols(top_n):
+        if symbol not in symbols:
+            symbols.append(symbol)
+    return symbols[:top_n]
+
+
+def warm_symbol(con, symbol: str, data_version: str) -> None:
+    """Load the results and figures the fund page needs for its default view.
+
+    Args:
+        con: The database connection object.
+        symbol: The fund symbol.
+        data_version: The data version the caches are keyed on.
+    """
+    df_profile = get_fund_profile(con, symbol, "etf")
+    if df_profile.empty or pd.isna(df_profile["first_price_date"].iloc[0]):
+        return
+
+    df_top_10_holdings = get_etf_top_10_holdings(con, symbol)
+    df_percentage_of_net_assets = get_etf_percentage_of_net_assets(con, symbol)
+    df_sectors = get_etf_sectors(con, symbol)
+    for projection in ("valuation", "risk"):
+        get_etf_facts(con, symbol, projection)
+    df_peer_ranks = get_fund_category_ranks(con, symbol, "etf")
+    price_store = get_price_store(con)
+
+    if not df_percentage_of_net_assets.empty:
+        get_holdings_chart(
+            df_top_10_holdings, df_percentage_of_net_assets, symbol, data_version
+        )
+    get_sectors_chart(df_sectors, symbol, data_version)
+    if not df_peer_ranks.empty:
+        # The page shows the distribution of the first metric by default
+        peer_ranks = df_peer_ranks.iloc[0]
+        get_peer_distribution_chart(
+            peer_ranks,
+            symbol,
+            PEER_METRIC_LABELS[peer_ranks["metric"]],
+            data_version,
+        )
+    if price_store.get_series(symbol, "etfs") is None:
+        return
+    # The page defaults to the fund's full date range
+    get_price_charts(
+        price_store,
+        symbol,
+        pd.to_datetime(df_profile["first_price_date"].iloc[0]).date(),
+        pd.to_datetime(df_profile["last_price_date"].iloc[0]).date(),
+        data_version,
+    )
+
+
+def warm_caches(symbols: list) -> str:
+    """Warm the result and figure caches for the given symbols.
+
+    Args:
+        symbols: The fund symbols to warm up.
+
+    Returns:
+        The data version that was warmed.
+    """
+    con = connect_to_db()
+    try:
+        data_version = get_data_version(con)
+        for symbol in symbols:
+            warm_symbol(con, symbol, data_version)
+    finally:
+        con.close()
+    return data_version
+
+
+def _watch(poll_seconds: int) -> None:
+    warmed_version = None
+    last_seen_version = None
+    while True:
+        try:
+            version = get_data_version()
+            # Only warm once the file has stopped changing between two polls,
+            # so a build that is still writing is not picked up half-way.
+            if version != warmed_version and (
+                warmed_version is None or version == last_seen_version
+            ):
+                warmed_version = warm_caches(get_warmup_symbols())
+            last_seen_version = version
+        except Exception:
+            logging.exception("Cache warm-up failed")
+        time.sleep(poll_seconds)
+
+
+def start_warmup_watcher(poll_seconds: int = WARMUP_POLL_SECONDS) -> None:
+    """Start, once per process, a daemon thread that warms the caches after each build.
+
+    The caches are warmed when the thread starts and again whenever the data
+    version changes.
+
+    Args:
+        poll_seconds: How often to check the data version.
+    """
+    global _watcher_started
+    with _watcher_lock:
+        if _watcher_started:
+            return
+        _watcher_started = True
+    threading.Thread(
+        target=_watch, args=(poll_seconds,), name="cache-warmup", daemon=True
+    ).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--top", type=int, default=WARMUP_TOP_N, help="Number of symbols to warm up."
+    )
+    parser.add_argument(
+        "--symbols",
+        nargs="*",
+        help="Symbols to warm up instead of the most viewed ones.",
+    )
+    args = parser.parse_args()
+
+    symbols = args.symbols or get_warmup_symbols(args.top)
+    start = time.perf_counter()
+    data_version = warm_caches(symbols)
+    print(
+        f"Warmed {len(symbols)} symbols for data version {data_version} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
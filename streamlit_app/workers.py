@@ -0,0 +1,168 @@
+"""
+Multi-worker mode: several app processes behind a local nginx load balancer.
+
+    python workers.py --workers 4 --port 8501
+
+Each worker is a `streamlit run etf_app.py` process listening on localhost,
+on the ports following --port. nginx listens on --port and spreads the
+browser sessions over the workers. Routing is sticky by client address,
+because a Streamlit session lives in the worker holding its websocket and a
+reconnecting browser must find it again. The workers share the on-disk cache
+of shared_cache.py, so adding workers adds throughput without adding cold
+cache misses. The price store is shared too, as memory maps of the same files.
+
+If a worker or nginx exits, the others are stopped and the exit code is passed
+on, so a container supervisor can restart the whole set.
+"""
+
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(APP_DIR)
+SHARED_CACHE_DIR = os.environ.get(
+    "US_FUNDS_SHARED_CACHE_DIR", os.path.join(REPO_ROOT, "shared_cache")
+)
+WORKERS = int(os.environ.get("US_FUNDS_WORKERS", str(os.cpu_count() or 1)))
+
+NGINX_CONFIG = """
+worker_processes auto;
+pid {run_dir}/nginx.pid;
+error_log stderr warn;
+
+events {{
+    worker_connections 4096;
+}}
+
+http {{
+    access_log off;
+    client_max_body_size 200m;
+    client_body_temp_path {run_dir}/client_body;
+    proxy_temp_path {run_dir}/proxy;
+    fastcgi_temp_path {run_dir}/fastcgi;
+    uwsgi_temp_path {run_dir}/uwsgi;
+    scgi_temp_path {run_dir}/scgi;
+
+    map $http_upgrade $connection_upgrade {{
+        default upgrade;
+        '' close;
+    }}
+
+    upstream streamlit_workers {{
+        # The whole client address: ip_hash only hashes its first 3 octets
+        hash $remote_addr consistent;
+{servers}
+    }}
+
+    server {{
+        listen {port};
+
+        location / {{
+            proxy_pass http://streamlit_workers;
+            proxy_http_version 1.1;
+            proxy_set_header Upgrade $http_upgrade;
+            proxy_set_header Connection $connection_upgrade;
+            proxy_set_header Host $host;
+            proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+            proxy_read_timeout 86400;
+            proxy_buffering off;
+        }}
+    }}
+}}
+"""
+
+
+def write_nginx_config(run_dir: str, port: int, worker_ports: list) -> str:
+    """
+    Writes the nginx configuration of the load balancer.
+
+    Parameters:
+        run_dir (str): Directory for the configuration, pid and temporary files.
+        port (int): Port the load balancer listens on.
+        worker_ports (list): Localhost ports of the workers.
+
+    Returns:
+        str: Path of the configuration file.
+    """
+    servers = "\n".join(f"        server 127.0.0.1:{p};" for p in worker_ports)
+    path = os.path.join(run_dir, "nginx.conf")
+    with open(path, "w") as f:
+        f.write(NGINX_CONFIG.format(run_dir=run_dir, port=port, servers=servers))
+    return path
+
+
+def start_worker(port: int, app: str) -> subprocess.Popen:
+    """
+    Starts one Streamlit worker on a localhost port, using the shared cache.
+    """
+    env = dict(os.environ, US_FUNDS_SHARED_CACHE_DIR=SHARED_CACHE_DIR)
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "streamlit",
+            "run",
+            os.path.join(APP_DIR, app),
+            "--server.address=127.0.0.1",
+            f"--server.port={port}",
+            "--server.headless=true",
+        ],
+        env=env,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--port", type=int, default=8501)
+    parser.add_argument("--app", default="etf_app.py")
+    args = parser.parse_args()
+
+    if shutil.which("nginx") is None:
+        parser.error("nginx is needed for the load balancer, install it first.")
+    os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+    run_dir = tempfile.mkdtemp(prefix="us-funds-workers-")
+    worker_ports = [args.port + 1 + i for i in range(args.workers)]
+    config_path = write_nginx_config(run_dir, args.port, worker_ports)
+
+    processes = [start_worker(p, args.app) for p in worker_ports]
+    processes.append(
+        subprocess.Popen(["nginx", "-c", config_path, "-g", "daemon off;"])
+    )
+    print(
+        f"Serving {args.workers} workers on port {args.port}, "
+        f"shared cache in {SHARED_CACHE_DIR}"
+    )
+
+    def stop(signum, frame):
+        raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    exit_code = 0
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+        exit_code = next(p.returncode for p in processes if p.poll() is not None)
+    except (KeyboardInterrupt, SystemExit) as e:
+        exit_code = e.code if isinstance(e, SystemExit) else 130
+    finally:
+        for p in processes:
+            if p.poll() is None:
+                p.terminate()
+        for p in processes:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        shutil.rmtree(run_dir, ignore_errors=True)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+{#
+    Watermarks written by the builds, which the query routing of
+    streamlit_app/queries.py compares to decide whether a materialization is
+    still up to date with the fact table it duplicates.
+
+    The fact tables store the id of the dbt invocation that built them, and
+    so does the fund profile, which also reads the staged funds: it is only
+    used when built together with the facts. The monthly rollup, computed
+    from the fact rows alone, keeps the build_id of the rows it aggregates.
+    The metrics snapshot is taken by a separate `dbt snapshot` invocation,
+    so its current rows are instead compared by content: their metrics_hash
+    must be the one the fund profile computed in the build.
+#}
+
+{% macro build_id() -%}
+    '{{ invocation_id }}'
+{%- endmacro %}
+
+
+{#- The fund metrics hashed into metrics_hash -#}
+{% macro fund_metric_columns() -%}
+    {{ return([
+        'fund_category',
+        'total_net_assets',
+        'fund_yield',
+        'fund_annual_report_net_expense_ratio',
+        'category_annual_report_net_expense_ratio',
+        'annual_holdings_turnover',
+        'asset_stocks',
+        'asset_bonds',
+        'fund_sector_basic_materials',
+        'fund_sector_communication_services',
+        'fund_sector_consumer_cyclical',
+        'fund_sector_consumer_defensive',
+        'fund_sector_energy',
+        'fund_sector_financial_services',
+        'fund_sector_healthcare',
+        'fund_sector_industrials',
+        'fund_sector_real_estate',
+        'fund_sector_technology',
+        'fund_sector_utilities',
+        'top10_holdings',
+        'top10_holdings_total_assets',
+        'fund_price_book_ratio',
+        'fund_price_cashflow_ratio',
+        'fund_price_earning_ratio',
+        'fund_price_sales_ratio',
+        'fund_bond_maturity',
+        'fund_bond_duration',
+        'returns_as_of_date',
+        'fund_return_ytd',
+        'fund_return_1year',
+        'fund_return_3years',
+        'fund_return_5years',
+        'fund_return_10years',
+        'fund_alpha_3years',
+        'fund_beta_3years',
+        'fund_r_squared_3years',
+        'fund_stdev_3years',
+        'fund_sharpe_ratio_3years',
+        'fund_treynor_ratio_3years',
+        'fund_alpha_5years',
+        'fund_beta_5years',
+        'fund_r_squared_5years',
+        'fund_stdev_5years',
+        'fund_sharpe_ratio_5years',
+        'fund_treynor_ratio_5years',
+        'fund_alpha_10years',
+        'fund_beta_10years',
+        'fund_r_squared_10years',
+        'fund_stdev_10years',
+        'fund_sharpe_ratio_10years',
+        'fund_treynor_ratio_10years',
+    ]) }}
+{%- endmacro %}
@@ -0,0 +1,56 @@
+{#
+    Change-data detection for the fund dimensions.
+
+    Each incremental dimension stores, on every row, a hash of the source
+    columns it is built from. On incremental runs only the funds whose hash
+    differs from the stored one are rebuilt (delete+insert on fund_symbol),
+    so the cost of a build follows the number of changed funds.
+#}
+
+{% macro fund_row_hash(columns) -%}
+    md5(cast(row({{ columns | join(', ') }}) as varchar))
+{%- endmacro %}
+
+
+{% macro changed_funds() -%}
+    {#- Tables built before hashing was introduced are rebuilt in full once -#}
+    {%- if is_incremental()
+        and 'source_row_hash' in adapter.get_columns_in_relation(this) | map(attribute='name') | list %}
+    anti join (
+        select distinct fund_symbol, source_row_hash from {{ this }}
+    ) as __built
+        using (fund_symbol, source_row_hash)
+    {%- endif %}
+{%- endmacro %}
+
+
+{% macro delete_removed_funds(source_relation) -%}
+    delete from {{ this }}
+    where fund_symbol not in (select fund_symbol from {{ source_relation }})
+{%- endmacro %}
+
+
+{#-
+    Pre-hook of the dimensions where a changed fund can have no rows at all,
+    e.g. holdings that became null or were all quarantined. delete+insert
+    only replaces the funds of the new batch, so it would keep the old rows
+    of such a fund: every built fund whose hash of the source columns is no
+    longer the stored one, or that left the source, is deleted first. Rows
+    of a table built before hashing have no hash, and are deleted by the run
+    after the one adding the column.
+-#}
+{% macro delete_changed_funds(source_relation, columns) -%}
+    {%- if is_incremental()
+        and 'source_row_hash' in adapter.get_columns_in_relation(this) | map(attribute='name') | list %}
+    delete from {{ this }} as __built
+    where not exists (
+        select 1
+        from (
+            select fund_symbol, {{ fund_row_hash(columns) }} as source_row_hash
+            from {{ source_relation }}
+        ) as __source
+        where __source.fund_symbol = __built.fund_symbol
+            and __source.source_row_hash = __built.source_row_hash
+    )
+    {%- endif %}
+{%- endmacro %}
@@ -0,0 +1,138 @@
+{#
+    Row-level data-quality checks.
+
+    Each check is a (name, severity, condition) tuple: a row fails the check
+    when the condition is true. Rows failing an 'error' check are copied to a
+    quarantine table of the quality schema and left out of the served tables.
+    'warn' checks are only reported. The conditions are plain column
+    expressions, so every check of a table is evaluated in a single scan.
+
+    Prices are deduplicated on (fund_symbol, price_date): the first row in
+    the order given to rank_price_duplicates() is kept, the others fail
+    duplicate_price_date.
+#}
+
+{% macro etf_price_checks() -%}
+    {{ return([
+        ('missing_key', 'error', 'fund_symbol is null or price_date is null'),
+        ('duplicate_price_date', 'error', '__duplicate_rank > 1'),
+        ('high_below_low', 'error', 'high < low'),
+        ('open_outside_range', 'error', 'open > high or open < low'),
+        ('close_outside_range', 'error', 'close > high or close < low'),
+        ('non_positive_price', 'error', 'least(open, high, low, close, adj_close) <= 0'),
+        ('negative_volume', 'error', 'volume < 0'),
+    ]) }}
+{%- endmacro %}
+
+
+{% macro mutual_fund_price_checks() -%}
+    {{ return([
+        ('missing_key', 'error', 'fund_symbol is null or price_date is null'),
+        ('duplicate_price_date', 'error', '__duplicate_rank > 1'),
+        ('non_positive_nav', 'error', 'nav_per_share <= 0'),
+    ]) }}
+{%- endmacro %}
+
+
+{% macro holding_checks() -%}
+    {{ return([
+        ('missing_holding_name', 'error', "holding_name is null or holding_name = ''"),
+        ('unparsed_weight', 'error', 'holding_weight is null'),
+        ('weight_out_of_range', 'error', 'holding_weight < 0 or holding_weight > 1'),
+    ]) }}
+{%- endmacro %}
+
+
+{#- Funds without any sector weight (e.g. bond funds) are not checked -#}
+{% macro sector_weight_checks() -%}
+    {{ return([
+        ('sector_weights_not_summing_to_1', 'warn', 'abs(sector_weight_total - 1) > 0.02'),
+    ]) }}
+{%- endmacro %}
+
+
+{#-
+    The prices of a relation with a __duplicate_rank column, 1 for the row
+    kept for each (fund_symbol, price_date). Only the rows of duplicated keys
+    are ranked: a window over every row costs more than all the checks
+    together, the aggregate finding the duplicated keys much less.
+-#}
+{% macro rank_price_duplicates(relation, order_columns) -%}
+    with __duplicate_keys as (
+        select
+            fund_symbol,
+            price_date
+        from {{ relation }}
+        group by all
+        having count(*) > 1
+    )
+
+    select
+        prices.*,
+        1 as __duplicate_rank
+    from {{ relation }} as prices
+    anti join __duplicate_keys
+        using (fund_symbol, price_date)
+    union all
+    select
+        prices.*,
+        row_number() over (
+            partition by fund_symbol, price_date
+            order by {{ order_columns | join(' desc nulls last, ') }} desc nulls last
+        ) as __duplicate_rank
+    from {{ relation }} as prices
+    semi join __duplicate_keys
+        using (fund_symbol, price_date)
+{%- endmacro %}
+
+
+{#- List of the names of the checks a row fails -#}
+{% macro failed_checks(checks) -%}
+    list_filter([
+        {%- for name, severity, condition in checks %}
+        case when {{ condition }} then '{{ name }}' end{{ "," if not loop.last }}
+        {%- endfor %}
+    ], check_name -> check_name is not null)
+{%- endmacro %}
+
+
+{#- True for the rows passing every 'error' check -#}
+{% macro passes_checks(checks) -%}
+    not coalesce(
+        {%- for name, severity, condition in checks if severity == 'error' %}
+        ({{ condition }}){{ " or" if not loop.last }}
+        {%- endfor %},
+        false
+    )
+{%- endmacro %}
+
+
+{#- One row per check of a table, for the data-quality summary -#}
+{% macro check_rows(table_name, checks) -%}
+    {%- for name, severity, condition in checks %}
+    ('{{ table_name }}', '{{ name }}', '{{ severity }}'){{ "," if not loop.last }}
+    {%- endfor %}
+{%- endmacro %}
+
+
+{#- on-run-end hook: logs the failed checks once the summary is rebuilt -#}
+{% macro report_data_quality(results) -%}
+    {%- if execute -%}
+        {%- set summary_built = results
+            | selectattr('node.name', 'equalto', 'data_quality_summary')
+            | selectattr('status', 'equalto', 'success')
+            | list -%}
+        {%- if summary_built -%}
+            {%- set summary = run_query(
+                "select table_name, check_name, severity, failed_rows, checked_rows
+                 from " ~ summary_built[0].node.relation_name ~ "
+                 where failed_rows > 0
+                 order by table_name, check_name") -%}
+            {{ log("Data quality: " ~ (summary.rows | length) ~ " failing checks", info=True) }}
+            {%- for row in summary.rows %}
+                {{ log("  " ~ row[0] ~ "." ~ row[1] ~ " (" ~ row[2] ~ "): "
+                    ~ row[3] ~ " of " ~ row[4] ~ " rows", info=True) }}
+            {%- endfor %}
+        {%- endif -%}
+    {%- endif -%}
+{%- endmacro %}
@@ -1,26 +1,36 @@
 {{ config(
-    materialized='table',
-    schema='etfs'
+    materialized='incremental',
+    schema='etfs',
+    unique_key='fund_symbol',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_removed_funds(ref('stg_etf')) }}"
     )
 }}
 
+{% set dim_columns = [
+    'fund_symbol',
+    'quote_type',
+    'region',
+    'fund_short_name',
+    'fund_long_name',
+    'currency',
+    'fund_category',
+    'fund_family',
+    'exchange_code',
+    'exchange_name',
+    'exchange_timezone',
+    'investment_strategy',
+    'investment_type',
+    'size_type'
+] %}
+
 with src_etf as (
     select
-        fund_symbol,
-        quote_type,
-        region,
-        fund_short_name,
-        fund_long_name,
-        currency,
-        fund_category,
-        fund_family,
-        exchange_code,
-        exchange_name,
-        exchange_timezone,
-        investment_strategy,
-        investment_type,
-        size_type
+        {{ dim_columns | join(',\n        ') }},
+        {{ fund_row_hash(dim_columns) }} as source_row_hash
     from {{ ref("stg_etf") }}
 )
 
-select * from src_etf
+select src_etf.* from src_etf
+{{ changed_funds() }}
@@ -1,93 +1,118 @@
 {{ config(
-    materialized='table',
-    schema='etfs'
+    materialized='incremental',
+    schema='etfs',
+    unique_key='fund_symbol',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_removed_funds(ref('stg_etf')) }}"
     )
 }}
 
-with __src AS (
+{% set sector_columns = [
+    'fund_sector_basic_materials',
+    'fund_sector_communication_services',
+    'fund_sector_consumer_cyclical',
+    'fund_sector_consumer_defensive',
+    'fund_sector_energy',
+    'fund_sector_financial_services',
+    'fund_sector_healthcare',
+    'fund_sector_industrials',
+    'fund_sector_real_estate',
+    'fund_sector_technology',
+    'fund_sector_utilities'
+] %}
+
+with __hashed AS (
     select
         fund_symbol,
-        fund_sector_basic_materials,
-        fund_sector_communication_services,
-        fund_sector_consumer_cyclical,
-        fund_sector_consumer_defensive,
-        fund_sector_energy,
-        fund_sector_financial_services,
-        fund_sector_healthcare,
-        fund_sector_industrials,
-        fund_sector_real_estate,
-        fund_sector_technology,
-        fund_sector_utilities
+        {{ sector_columns | join(',\n        ') }},
+        {{ fund_row_hash(sector_columns) }} as source_row_hash
     from {{ ref("stg_etf") }}
     group by all
 ),
 
+__src AS (
+    select __hashed.* from __hashed
+    {{ changed_funds() }}
+),
+
 __unioned AS (
 
     select
         fund_symbol,
         'Basic Materials' AS sector,
-        fund_sector_basic_materials AS weight
+        fund_sector_basic_materials AS weight,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Communication Services',
-        fund_sector_communication_services
+        fund_sector_communication_services,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Consumer Cyclical',
-        fund_sector_consumer_cyclical
+        fund_sector_consumer_cyclical,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Consumer Defensive',
-        fund_sector_consumer_defensive
+        fund_sector_consumer_defensive,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Energy',
-        fund_sector_energy
+        fund_sector_energy,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Financial Services',
-        fund_sector_financial_services
+        fund_sector_financial_services,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Healthcare',
-        fund_sector_healthcare
+        fund_sector_healthcare,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Industrials',
-        fund_sector_industrials
+        fund_sector_industrials,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Real Estate',
-        fund_sector_real_estate
+        fund_sector_real_estate,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Technology',
-        fund_sector_technology
+        fund_sector_technology,
+        source_row_hash
     from __src
     union all
     select
         fund_symbol,
         'Utilities',
-        fund_sector_utilities
+        fund_sector_utilities,
+        source_row_hash
     from __src
 
 )
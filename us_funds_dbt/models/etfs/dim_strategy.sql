@@ -1,6 +1,10 @@
 {{ config(
-    materialized='table',
-    schema='etfs'
+    materialized='incremental',
+    schema='etfs',
+    unique_key='fund_symbol',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_removed_funds(ref('stg_etf')) }}"
     )
 }}
 
@@ -10,8 +14,14 @@ with src_etf as (
         fund_symbol,
         investment_strategy,
         investment_type,
-        size_type
+        size_type,
+        {{ fund_row_hash([
+            'investment_strategy',
+            'investment_type',
+            'size_type'
+        ]) }} as source_row_hash
     from {{ ref("stg_etf") }}
 )
 
-select * from src_etf
+select src_etf.* from src_etf
+{{ changed_funds() }}
@@ -4,7 +4,12 @@
     )
 }}
 
-with src_etf_prices as (
+with __ranked_etf_prices as (
+    {{ rank_price_duplicates(ref('stg_etf_prices'), ['volume', 'adj_close']) }}
+),
+
+-- Rows failing a data-quality check are in quality.quarantine_etf_prices
+src_etf_prices as (
     select
         fund_symbol,
         price_date,
@@ -14,7 +19,8 @@ with src_etf_prices as (
         close,
         adj_close,
         volume
-    from {{ ref('stg_etf_prices') }}
+    from __ranked_etf_prices
+    where {{ passes_checks(etf_price_checks()) }}
 ),
 
 __src_etf as (
@@ -159,4 +165,8 @@ __joined as (
         on se.fund_symbol = sep.fund_symbol
 )
 
-select * from __joined
+-- build_id: see macros/build_watermarks.sql
+select
+    *,
+    {{ build_id() }} as build_id
+from __joined
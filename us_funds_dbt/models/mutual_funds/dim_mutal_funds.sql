@@ -1,29 +1,39 @@
 {{ config(
-    materialized='table',
-    schema='mutual_funds'
+    materialized='incremental',
+    schema='mutual_funds',
+    unique_key='fund_symbol',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_removed_funds(ref('stg_mutual_funds')) }}"
     )
 }}
 
+{% set dim_columns = [
+    'fund_symbol',
+    'quote_type',
+    'region',
+    'fund_short_name',
+    'fund_long_name',
+    'currency',
+    'subsequent_investment',
+    'fund_category',
+    'fund_family',
+    'exchange_code',
+    'exchange_name',
+    'exchange_timezone',
+    'management_name',
+    'management_bio',
+    'management_start_date',
+    'investment_strategy',
+    'investment_type'
+] %}
+
 with src_mutual_funds as (
     select
-        fund_symbol,
-        quote_type,
-        region,
-        fund_short_name,
-        fund_long_name,
-        currency,
-        subsequent_investment,
-        fund_category,
-        fund_family,
-        exchange_code,
-        exchange_name,
-        exchange_timezone,
-        management_name,
-        management_bio,
-        management_start_date,
-        investment_strategy,
-        investment_type
+        {{ dim_columns | join(',\n        ') }},
+        {{ fund_row_hash(dim_columns) }} as source_row_hash
     from {{ ref("stg_mutual_funds") }}
 )
 
-select * from src_mutual_funds
+select src_mutual_funds.* from src_mutual_funds
+{{ changed_funds() }}
@@ -1,28 +1,40 @@
 {{ config(
-    materialized='table',
-    schema='mutual_funds'
+    materialized='incremental',
+    schema='mutual_funds',
+    unique_key='fund_symbol',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    pre_hook="{{ delete_changed_funds(ref('stg_mutual_funds'), ['top10_holdings']) }}"
     )
 }}
 
 with src_etf as (
     select
         fund_symbol,
-        top10_holdings
+        top10_holdings,
+        {{ fund_row_hash(['top10_holdings']) }} as source_row_hash
     from {{ ref("stg_mutual_funds") }}
 ),
 
+__changed as (
+    select src_etf.* from src_etf
+    {{ changed_funds() }}
+),
+
 split_varchar as (
     select
         fund_symbol,
-        SPLIT(top10_holdings, ',') as holdings_array
-    from src_etf
+        SPLIT(top10_holdings, ',') as holdings_array,
+        source_row_hash
+    from __changed
 ),
 
 __unnesting as (
     select
         fund_symbol,
         TRIM(SPLIT_PART(holding, ':', 1)) as holding_name,
-        TRIM(SPLIT_PART(holding, ':', 2)) as holding_weight
+        TRIM(SPLIT_PART(holding, ':', 2)) as holding_weight,
+        source_row_hash
     from split_varchar, UNNEST(split_varchar.holdings_array) as t (holding)
 ),
 
@@ -30,8 +42,11 @@ __cleaned as (
     select
         fund_symbol,
         TRIM(REPLACE(holding_name, '"', '')) as holding_name,
-        TRY_CAST(holding_weight as double) as holding_weight
+        TRY_CAST(holding_weight as double) as holding_weight,
+        source_row_hash
     from __unnesting
 )
 
+-- Holdings failing a data-quality check are in quality.quarantine_holdings
 select * from __cleaned
+where {{ passes_checks(holding_checks()) }}
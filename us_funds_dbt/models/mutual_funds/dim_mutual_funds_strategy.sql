@@ -1,6 +1,10 @@
 {{ config(
-    materialized='table',
-    schema='mutual_funds'
+    materialized='incremental',
+    schema='mutual_funds',
+    unique_key='fund_symbol',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_removed_funds(ref('stg_mutual_funds')) }}"
     )
 }}
 
@@ -9,8 +13,14 @@ with stg_mutual_funds as (
         fund_symbol,
         investment_strategy,
         investment_type,
-        size_type
+        size_type,
+        {{ fund_row_hash([
+            'investment_strategy',
+            'investment_type',
+            'size_type'
+        ]) }} as source_row_hash
     from {{ ref("stg_mutual_funds") }}
 )
 
-select * from stg_mutual_funds
+select stg_mutual_funds.* from stg_mutual_funds
+{{ changed_funds() }}
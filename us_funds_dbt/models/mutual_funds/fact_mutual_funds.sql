@@ -4,12 +4,18 @@
     )
 }}
 
-with src_mutual_fund_prices as (
+with __ranked_mutual_fund_prices as (
+    {{ rank_price_duplicates(ref('stg_mutual_funds_prices'), ['nav_per_share']) }}
+),
+
+-- Rows failing a data-quality check are in quality.quarantine_mutual_fund_prices
+src_mutual_fund_prices as (
     select
         fund_symbol,
         price_date,
         nav_per_share
-    from {{ ref('stg_mutual_funds_prices') }}
+    from __ranked_mutual_fund_prices
+    where {{ passes_checks(mutual_fund_price_checks()) }}
 ),
 
 src_mutual_funds as (
@@ -305,4 +311,8 @@ __joined as (
         on smf.fund_symbol = smfp.fund_symbol
 )
 
-select * from __joined
+-- build_id: see macros/build_watermarks.sql
+select
+    *,
+    {{ build_id() }} as build_id
+from __joined
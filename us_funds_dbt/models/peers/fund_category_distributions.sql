@@ -0,0 +1,24 @@
+{{ config(
+    materialized='table',
+    schema='peers'
+    )
+}}
+
+-- Distribution of each metric among the funds of a type and category, so a
+-- fund page can draw its peers without reading every peer's value.
+select
+    fund_type,
+    fund_category,
+    metric,
+    count(*) as category_size,
+    min(metric_value) as min_value,
+    quantile_cont(metric_value, 0.1) as p10_value,
+    quantile_cont(metric_value, 0.25) as p25_value,
+    median(metric_value) as median_value,
+    quantile_cont(metric_value, 0.75) as p75_value,
+    quantile_cont(metric_value, 0.9) as p90_value,
+    max(metric_value) as max_value,
+    avg(metric_value) as mean_value
+from {{ ref('fund_category_ranks') }}
+group by fund_type, fund_category, metric
+order by fund_type, fund_category, metric
@@ -0,0 +1,101 @@
+{{ config(
+    materialized='table',
+    schema='peers'
+    )
+}}
+
+-- Rank of every fund among the funds of the same type and category, for
+-- each metric. Ranks start at 1 for the best fund: the highest value, or the
+-- lowest for metrics where lower is better (volatility, fees). Funds without
+-- a value for a metric are left out of its ranking.
+{% set metrics = [
+    ('fund_return_ytd', true),
+    ('fund_return_1month', true),
+    ('fund_return_3months', true),
+    ('fund_return_1year', true),
+    ('fund_return_3years', true),
+    ('fund_return_5years', true),
+    ('fund_return_10years', true),
+    ('fund_sharpe_ratio_3years', true),
+    ('fund_sharpe_ratio_5years', true),
+    ('fund_sharpe_ratio_10years', true),
+    ('fund_stdev_3years', false),
+    ('fund_stdev_5years', false),
+    ('fund_stdev_10years', false),
+    ('fund_yield', true),
+    ('fund_annual_report_net_expense_ratio', false),
+] %}
+
+{% set metric_columns %}
+        fund_symbol,
+        fund_category,
+        {%- for metric, _ in metrics %}
+        cast({{ metric }} as double) as {{ metric }}{{ "," if not loop.last }}
+        {%- endfor %}
+{% endset %}
+
+with __etfs as (
+    select
+        'etf' as fund_type,
+        {{ metric_columns }}
+    from {{ ref('stg_etf') }}
+    where fund_category is not null
+),
+
+__mutual_funds as (
+    select
+        'mutual_fund' as fund_type,
+        {{ metric_columns }}
+    from {{ ref('stg_mutual_funds') }}
+    where fund_category is not null
+),
+
+__unioned as (
+    select * from __etfs
+    union all
+    select * from __mutual_funds
+),
+
+-- One row per fund and metric, nulls are dropped by unpivot
+__values as (
+    unpivot __unioned
+    on {{ metrics | map(attribute=0) | join(', ') }}
+    into name metric value metric_value
+),
+
+__metrics as (
+    select *
+    from (
+        values
+        {%- for metric, higher_is_better in metrics %}
+        ('{{ metric }}', {{ loop.index }}, {{ higher_is_better }}){{ "," if not loop.last }}
+        {%- endfor %}
+    ) as m (metric, metric_order, higher_is_better)
+),
+
+__ranked as (
+    select
+        v.fund_symbol,
+        v.fund_type,
+        v.fund_category,
+        v.metric,
+        m.metric_order,
+        m.higher_is_better,
+        v.metric_value,
+        rank() over __peers as category_rank,
+        count(*) over (partition by v.fund_type, v.fund_category, v.metric) as category_size,
+        100 * (1 - percent_rank() over __peers) as category_percentile
+    from __values as v
+    join __metrics as m using (metric)
+    window __peers as (
+        partition by v.fund_type, v.fund_category, v.metric
+        order by case when m.higher_is_better then v.metric_value else -v.metric_value end desc
+    )
+)
+
+select
+    *,
+    -- "Top X% in category": rank 1 of 10 is the top 10%
+    cast(ceil(100.0 * category_rank / category_size) as integer) as category_top_percent
+from __ranked
+order by fund_symbol, metric_order
@@ -0,0 +1,93 @@
+{{ config(
+    materialized='table',
+    schema='profiles'
+    )
+}}
+
+-- One row per fund with everything a fund page header shows, the display
+-- fields already formatted. The header is then a point lookup that never
+-- reads the price history. The price date range comes from the served fact
+-- tables, so it excludes quarantined rows. metrics_hash is the hash the
+-- metrics snapshot stores for the current metrics of the fund.
+{% set profile_columns = [
+    'fund_symbol',
+    'fund_short_name',
+    'fund_long_name',
+    'fund_category',
+    'fund_family',
+    'currency',
+    'exchange_code',
+    'exchange_name',
+    'region',
+    'investment_strategy',
+    'inception_date',
+    'total_net_assets'
+] %}
+
+with __funds as (
+    select
+        'etf' as fund_type,
+        {{ profile_columns | join(',\n        ') }},
+        {{ fund_row_hash(fund_metric_columns()) }} as metrics_hash
+    from {{ ref('stg_etf') }}
+    union all
+    select
+        'mutual_fund' as fund_type,
+        {{ profile_columns | join(',\n        ') }},
+        {{ fund_row_hash(fund_metric_columns()) }} as metrics_hash
+    from {{ ref('stg_mutual_funds') }}
+),
+
+__price_dates as (
+    select
+        'etf' as fund_type,
+        fund_symbol,
+        min(price_date) as first_price_date,
+        max(price_date) as last_price_date
+    from {{ ref('fact_etfs') }}
+    group by all
+    union all
+    select
+        'mutual_fund' as fund_type,
+        fund_symbol,
+        min(price_date) as first_price_date,
+        max(price_date) as last_price_date
+    from {{ ref('fact_mutual_funds') }}
+    group by all
+)
+
+select
+    __funds.fund_type,
+    __funds.fund_symbol,
+    __funds.fund_short_name,
+    __funds.fund_long_name,
+    __funds.fund_category,
+    __funds.fund_family,
+    __funds.currency,
+    __funds.exchange_code,
+    __funds.exchange_name,
+    __funds.region,
+    __funds.investment_strategy,
+    __funds.inception_date,
+    __funds.total_net_assets,
+    __price_dates.first_price_date,
+    __price_dates.last_price_date,
+    coalesce(
+        __funds.fund_long_name, __funds.fund_short_name, __funds.fund_symbol
+    ) as display_name,
+    coalesce(
+        strftime(__funds.inception_date, '%Y-%m-%d'), 'N/A'
+    ) as inception_date_display,
+    coalesce(
+        '$' || format('{:,.2f}', __funds.total_net_assets), 'N/A'
+    ) as total_net_assets_display,
+    __funds.metrics_hash,
+    {{ build_id() }} as build_id
+from __funds
+left join __price_dates
+    using (fund_type, fund_symbol)
+-- The sources have one row per fund, this guards the point lookups
+qualify row_number() over (
+    partition by __funds.fund_type, __funds.fund_symbol
+    order by __funds.total_net_assets desc nulls last
+) = 1
@@ -0,0 +1,82 @@
+{{ config(
+    materialized='table',
+    schema='quality'
+    )
+}}
+
+-- Number of rows failing each data-quality check, out of the rows checked.
+-- Checks without failures are listed with 0.
+with __checks (table_name, check_name, severity) as (
+    values
+    {{ check_rows('etf_prices', etf_price_checks()) }},
+    {{ check_rows('mutual_fund_prices', mutual_fund_price_checks()) }},
+    {{ check_rows('holdings', holding_checks()) }},
+    {{ check_rows('sector_weights', sector_weight_checks()) }}
+),
+
+__failures as (
+    select
+        'etf_prices' as table_name,
+        unnest(failed_checks) as check_name
+    from {{ ref('quarantine_etf_prices') }}
+    union all
+    select
+        'mutual_fund_prices' as table_name,
+        unnest(failed_checks) as check_name
+    from {{ ref('quarantine_mutual_fund_prices') }}
+    union all
+    select
+        'holdings' as table_name,
+        unnest(failed_checks) as check_name
+    from {{ ref('quarantine_holdings') }}
+    union all
+    select
+        'sector_weights' as table_name,
+        unnest(failed_checks) as check_name
+    from {{ ref('quarantine_sector_weights') }}
+),
+
+__failed_rows as (
+    select
+        table_name,
+        check_name,
+        count(*) as failed_rows
+    from __failures
+    group by all
+),
+
+__checked_rows as (
+    select
+        'etf_prices' as table_name,
+        (select count(*) from {{ ref('stg_etf_prices') }}) as checked_rows
+    union all
+    select
+        'mutual_fund_prices' as table_name,
+        (select count(*) from {{ ref('stg_mutual_funds_prices') }}) as checked_rows
+    union all
+    select
+        'holdings' as table_name,
+        (select count(*) from {{ ref('dim_holdings') }})
+        + (select count(*) from {{ ref('dim_mutual_funds_holdings') }})
+        + (select count(*) from {{ ref('quarantine_holdings') }}) as checked_rows
+    union all
+    select
+        'sector_weights' as table_name,
+        (select count(*) from {{ ref('stg_etf') }})
+        + (select count(*) from {{ ref('stg_mutual_funds') }}) as checked_rows
+)
+
+select
+    __checks.table_name,
+    __checks.check_name,
+    __checks.severity,
+    coalesce(__failed_rows.failed_rows, 0) as failed_rows,
+    __checked_rows.checked_rows,
+    coalesce(__failed_rows.failed_rows, 0)
+    / nullif(__checked_rows.checked_rows, 0) as failed_share
+from __checks
+left join __failed_rows
+    using (table_name, check_name)
+inner join __checked_rows
+    using (table_name)
+order by __checks.table_name, __checks.check_name
@@ -0,0 +1,21 @@
+{{ config(
+    materialized='table',
+    schema='quality'
+    )
+}}
+
+-- ETF price rows failing a data-quality check, left out of fact_etfs. All the
+-- checks are evaluated in one scan of the staged prices.
+with __ranked as (
+    {{ rank_price_duplicates(ref('stg_etf_prices'), ['volume', 'adj_close']) }}
+),
+
+__checked as (
+    select
+        * exclude (__duplicate_rank),
+        {{ failed_checks(etf_price_checks()) }} as failed_checks
+    from __ranked
+)
+
+select * from __checked
+where len(failed_checks) > 0
@@ -0,0 +1,51 @@
+{{ config(
+    materialized='table',
+    schema='quality'
+    )
+}}
+
+-- Top 10 holdings failing a data-quality check, e.g. weights TRY_CAST could
+-- not parse. They are left out of dim_holdings and dim_mutual_funds_holdings,
+-- which parse the holdings the same way.
+with __funds as (
+    select
+        'etf' as fund_type,
+        fund_symbol,
+        top10_holdings
+    from {{ ref('stg_etf') }}
+    union all
+    select
+        'mutual_fund' as fund_type,
+        fund_symbol,
+        top10_holdings
+    from {{ ref('stg_mutual_funds') }}
+),
+
+__unnesting as (
+    select
+        fund_type,
+        fund_symbol,
+        TRIM(SPLIT_PART(holding, ':', 1)) as holding_name,
+        TRIM(SPLIT_PART(holding, ':', 2)) as raw_holding_weight
+    from __funds, UNNEST(SPLIT(__funds.top10_holdings, ',')) as t (holding)
+),
+
+__cleaned as (
+    select
+        fund_type,
+        fund_symbol,
+        TRIM(REPLACE(holding_name, '"', '')) as holding_name,
+        raw_holding_weight,
+        TRY_CAST(raw_holding_weight as double) as holding_weight
+    from __unnesting
+),
+
+__checked as (
+    select
+        *,
+        {{ failed_checks(holding_checks()) }} as failed_checks
+    from __cleaned
+)
+
+select * from __checked
+where len(failed_checks) > 0
@@ -0,0 +1,22 @@
+{{ config(
+    materialized='table',
+    schema='quality'
+    )
+}}
+
+-- Mutual fund price rows failing a data-quality check, left out of
+-- fact_mutual_funds. All the checks are evaluated in one scan of the staged
+-- prices.
+with __ranked as (
+    {{ rank_price_duplicates(ref('stg_mutual_funds_prices'), ['nav_per_share']) }}
+),
+
+__checked as (
+    select
+        * exclude (__duplicate_rank),
+        {{ failed_checks(mutual_fund_price_checks()) }} as failed_checks
+    from __ranked
+)
+
+select * from __checked
+where len(failed_checks) > 0
@@ -0,0 +1,49 @@
+{{ config(
+    materialized='table',
+    schema='quality'
+    )
+}}
+
+-- Funds whose sector weights do not sum to about 1. Only reported: the
+-- sector charts show the weights relative to each other.
+{% set sector_columns = [
+    'fund_sector_basic_materials',
+    'fund_sector_communication_services',
+    'fund_sector_consumer_cyclical',
+    'fund_sector_consumer_defensive',
+    'fund_sector_energy',
+    'fund_sector_financial_services',
+    'fund_sector_healthcare',
+    'fund_sector_industrials',
+    'fund_sector_real_estate',
+    'fund_sector_technology',
+    'fund_sector_utilities'
+] %}
+
+with __funds as (
+    select
+        'etf' as fund_type,
+        fund_symbol,
+        list_sum([{{ sector_columns | join(', ') }}]) as sector_weight_total
+    from {{ ref('stg_etf') }}
+    union all
+    select
+        'mutual_fund' as fund_type,
+        fund_symbol,
+        list_sum([{{ sector_columns | join(', ') }}]) as sector_weight_total
+    from {{ ref('stg_mutual_funds') }}
+),
+
+__checked as (
+    select
+        fund_type,
+        fund_symbol,
+        sector_weight_total,
+        {{ failed_checks(sector_weight_checks()) }} as failed_checks
+    from __funds
+    -- Funds without sector weights, e.g. bond funds, are not checked
+    where sector_weight_total > 0
+)
+
+select * from __checked
+where len(failed_checks) > 0
@@ -0,0 +1,29 @@
+{{ config(
+    materialized='table',
+    schema='rollups'
+    )
+}}
+
+-- Monthly OHLCV bars of the ETF prices, one row per fund and month labelled
+-- by the first day of the month. Queries over long ranges, or at a monthly
+-- or quarterly resolution, read these instead of the daily fact table (see
+-- the query routing of streamlit_app/queries.py). The rollup is only used
+-- while its build_id is still the fact table's.
+select
+    fund_symbol,
+    date_trunc('month', price_date)::date as price_date,
+    arg_min(open, price_date) as open,
+    max(high) as high,
+    min(low) as low,
+    arg_max(close, price_date) as close,
+    arg_max(adj_close, price_date) as adj_close,
+    sum(volume) as volume,
+    count(*) as trading_days,
+    min(price_date) as first_price_date,
+    max(price_date) as last_price_date,
+    -- The build of the fact rows it aggregates
+    max(build_id) as build_id
+from {{ ref('fact_etfs') }}
+where fund_symbol is not null and price_date is not null
+group by all
+order by fund_symbol, price_date
@@ -0,0 +1,36 @@
+{{ config(
+    materialized='table',
+    schema='search'
+    )
+}}
+
+with __etfs as (
+    select
+        fund_symbol,
+        'etf' as fund_type,
+        fund_short_name,
+        fund_long_name,
+        fund_family
+    from {{ ref("dim_etf") }}
+),
+
+__mutual_funds as (
+    select
+        fund_symbol,
+        'mutual_fund' as fund_type,
+        fund_short_name,
+        fund_long_name,
+        fund_family
+    from {{ ref("dim_mutal_funds") }}
+),
+
+__unioned as (
+    select * from __etfs
+    union all
+    select * from __mutual_funds
+)
+
+select
+    *,
+    lower(concat_ws(' ', fund_symbol, fund_short_name, fund_long_name, fund_family)) as search_text
+from __unioned
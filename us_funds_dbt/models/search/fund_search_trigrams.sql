@@ -0,0 +1,27 @@
+{{ config(
+    materialized='table',
+    schema='search'
+    )
+}}
+
+-- One row per distinct trigram of each fund's search text. A search splits
+-- the typed text into trigrams the same way and ranks funds by the number
+-- of trigrams they share with it.
+with __padded as (
+    select
+        fund_symbol,
+        fund_type,
+        '  ' || search_text || ' ' as padded_text
+    from {{ ref("fund_search") }}
+),
+
+__trigrams as (
+    select distinct
+        fund_symbol,
+        fund_type,
+        substring(padded_text, t.i, 3) as trigram
+    from __padded, range(1, length(padded_text) - 1) as t (i)
+)
+
+select * from __trigrams
+order by trigram
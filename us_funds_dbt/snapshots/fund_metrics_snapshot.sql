@@ -0,0 +1,38 @@
+{% snapshot fund_metrics_snapshot %}
+
+{{ config(
+    target_schema='snapshots',
+    unique_key='fund_key',
+    strategy='check',
+    check_cols=['metrics_hash'],
+    invalidate_hard_deletes=True
+    )
+}}
+
+-- History of the fund metrics the loads overwrite: costs, yield, allocation,
+-- holdings, valuation and risk. A fund gets a new row only when one of these
+-- columns changed since the last snapshot, valid from dbt_valid_from until
+-- dbt_valid_to (null for the current row).
+{% set metric_columns = fund_metric_columns() %}
+
+with __funds as (
+    select distinct
+        'etf' as fund_type,
+        fund_symbol,
+        {{ metric_columns | join(',\n        ') }}
+    from {{ ref('stg_etf') }}
+    union all
+    select distinct
+        'mutual_fund' as fund_type,
+        fund_symbol,
+        {{ metric_columns | join(',\n        ') }}
+    from {{ ref('stg_mutual_funds') }}
+)
+
+select
+    fund_type || ':' || fund_symbol as fund_key,
+    *,
+    {{ fund_row_hash(metric_columns) }} as metrics_hash
+from __funds
+
+{% endsnapshot %}
@@ -0,0 +1,9 @@
+-- Duplicate (fund_symbol, price_date) rows must have been quarantined
+select
+    fund_symbol,
+    price_date,
+    count(*) as n_rows
+from {{ ref('fact_etfs') }}
+where price_date is not null
+group by all
+having count(*) > 1
@@ -0,0 +1,15 @@
+-- Candles must have low <= open, close <= high and positive prices
+select
+    fund_symbol,
+    price_date,
+    open,
+    high,
+    low,
+    close,
+    adj_close
+from {{ ref('fact_etfs') }}
+where
+    high < low
+    or open > high or open < low
+    or close > high or close < low
+    or least(open, high, low, close, adj_close) <= 0
@@ -0,0 +1,14 @@
+-- Holdings whose weight could not be parsed must have been quarantined
+select
+    'etf' as fund_type,
+    fund_symbol,
+    holding_name
+from {{ ref('dim_holdings') }}
+where holding_weight is null
+union all
+select
+    'mutual_fund' as fund_type,
+    fund_symbol,
+    holding_name
+from {{ ref('dim_mutual_funds_holdings') }}
+where holding_weight is null
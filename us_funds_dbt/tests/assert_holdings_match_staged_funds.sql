@@ -0,0 +1,26 @@
+-- Holdings must come from the current top10_holdings of their fund: rows
+-- left from an older version, e.g. of a fund whose holdings are now null or
+-- all quarantined, fail
+select
+    'etf' as fund_type,
+    fund_symbol,
+    holding_name
+from {{ ref('dim_holdings') }} as __built
+where not exists (
+    select 1
+    from {{ ref('stg_etf') }} as __source
+    where __source.fund_symbol = __built.fund_symbol
+        and {{ fund_row_hash(['__source.top10_holdings']) }} = __built.source_row_hash
+)
+union all
+select
+    'mutual_fund' as fund_type,
+    fund_symbol,
+    holding_name
+from {{ ref('dim_mutual_funds_holdings') }} as __built
+where not exists (
+    select 1
+    from {{ ref('stg_mutual_funds') }} as __source
+    where __source.fund_symbol = __built.fund_symbol
+        and {{ fund_row_hash(['__source.top10_holdings']) }} = __built.source_row_hash
+)
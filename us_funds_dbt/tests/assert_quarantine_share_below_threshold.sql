@@ -0,0 +1,7 @@
+{{ config(severity='warn') }}
+
+-- A check failing on more than max_quarantine_share of the rows points to a
+-- broken load rather than a few bad rows
+select *
+from {{ ref('data_quality_summary') }}
+where failed_share > {{ var('max_quarantine_share', 0.01) }}